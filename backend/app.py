@@ -1,43 +1,89 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
-import os, json, csv, collections
+import os, json, csv, collections, hashlib
 from datetime import datetime, timedelta
 from io import StringIO, BytesIO
 
-from models.quiz_model import train_quiz_models, classify_difficulty, generate_mcqs
-from services.summary_service import generate_summary
-from models.nlp_utils import extract_keywords, generate_study_tips
+from config import Config
+from models.model_registry import registry
+from models.nlp_resources import missing_resources
 from models.feedback_model import generate_feedback_text
 from services.notes_service import parse_text, parse_pdf, parse_url, parse_youtube, parse_source
-from services.quiz_service import create_quiz_from_notes
 from services.schedule_service import generate_study_schedule_csv
 from services.resources_service import get_resources
+from services.resource_catalog import get_resource_index
 from services.subject_service import get_all_subjects, create_subject
+from services.attempt_store import get_attempt_store, SqliteAttemptStore, HISTORY_FILE
+from services import progress_aggregates as aggregates
+from services.result_cache import get_result_cache, cache_key, seed_from_key
+from services.nlp_executor import get_nlp_executor, TaskTimeout, PoolBusy
+from services import nlp_tasks
+from services.document_store import get_document_store, document_id
+from services.question_bank import get_question_bank
+from services.ability_engine import get_ability_store
+from services.search_index import get_search_index
+from services.related_notes import get_related_notes
+from services.difficulty_feedback import get_difficulty_feedback
+from services.review_scheduler import get_review_scheduler, CORRECT_GRADE, WRONG_GRADE
+from services.ingestion_jobs import get_ingestion_runner, job_events
+from services.batch_ingestion import discard_unclaimed, get_batch_ingestor, validate_items
+from services.pdf_extraction import spool_upload, extract_pdf
 
-UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), "data", "uploads")
-HISTORY_FILE  = os.path.join(os.path.dirname(__file__), "data", "quiz_history.json")
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(os.path.dirname(HISTORY_FILE), exist_ok=True)
 
-def load_history():
-    if os.path.exists(HISTORY_FILE):
-        with open(HISTORY_FILE) as f:
-            return json.load(f)
-    return {}
-
-def save_history(h):
-    with open(HISTORY_FILE, "w") as f:
-        json.dump(h, f)
+# Model work (scipy/scikit-learn) runs in the NLP process pool (see
+# services/nlp_executor.py), so web workers never import those.  They do import
+# numpy: the search index, related notes and resource catalog score queries
+# in-process over memory-mapped arrays.
 
 def create_app():
     app = Flask(__name__)
     CORS(app, origins="*")
-    train_quiz_models()
+    if Config.TRAIN_MODELS_ON_STARTUP:
+        from models.quiz_model import train_quiz_models
+        train_quiz_models()
+    nlp = get_nlp_executor()
+    if Config.WARM_MODELS_ON_STARTUP:
+        nlp.start()
+    store = get_attempt_store()
+    if isinstance(store, SqliteAttemptStore):
+        store.migrate_json_history(HISTORY_FILE)
+    cache = get_result_cache()
+    documents = get_document_store()
+    ingestion = get_ingestion_runner()
+    batch = get_batch_ingestor()
+    bank = get_question_bank()
+    abilities = get_ability_store()
+    search = get_search_index()
+    related = get_related_notes()
+    reviews = get_review_scheduler()
+    difficulty = get_difficulty_feedback()
+    get_resource_index()  # build the catalog index now rather than on the first request
+
+    def request_text(data):
+        """Body ``text``, or the stored document named by ``document_id`` (None if unknown)."""
+        if data.get("document_id"):
+            return documents.get_text(data["document_id"])
+        return data.get("text", "").strip()
+
+    def index_notes(user_id, subject, doc_id, text):
+        # Already indexed for this user (the usual cache hit): skip the ingestion pool altogether.
+        if not (search.has_document(user_id, subject, doc_id) and related.has_document(user_id, doc_id)):
+            ingestion.index(user_id, subject, doc_id, text)
+
+    @app.errorhandler(TaskTimeout)
+    def task_timeout(e):
+        return jsonify({"error": "Processing took too long, try a shorter text"}), 504
+
+    @app.errorhandler(PoolBusy)
+    def pool_busy(e):
+        return jsonify({"error": "Server busy, try again shortly"}), 503
 
     @app.route("/health")
     def health():
-        return jsonify({"status": "ok", "timestamp": datetime.now().isoformat()})
+        return jsonify({"status": "ok", "timestamp": datetime.now().isoformat(),
+                        "models": registry.versions(), "missing_nlp_resources": missing_resources()})
 
     @app.route("/api/subjects", methods=["GET"])
     def get_subjects_route():
@@ -55,66 +101,228 @@ def create_app():
     @app.route("/api/parse", methods=["POST"])
     def parse_content():
         source = request.form.get("source", "text")
-        text = ""
-        if source == "text":
-            text = parse_text(request.form.get("content", ""))
-        elif source == "pdf" and "file" in request.files:
-            text = parse_pdf(request.files["file"])
-        elif source == "youtube":
-            text = parse_youtube(request.form.get("url", ""))
-        elif source == "url":
-            text = parse_url(request.form.get("url", ""))
-        if not text:
-            return jsonify({"error": "Could not extract content"}), 400
-        keywords = extract_keywords(text)
-        return jsonify({"text": text, "word_count": len(text.split()), "keywords": keywords})
+        subject = request.form.get("subject", "General")
+        user_id = request.form.get("user_id", "default")
+        upload = request.files.get("file") if source == "pdf" else None
+        pages = request.form.get("pages")
+        pdf_path = digest = None
+        if upload is not None:
+            pdf_path, digest = spool_upload(upload.stream)
+            key = cache_key("parse", digest, source=source, pages=pages)
+        else:
+            key = cache_key("parse", request.form.get("content" if source == "text" else "url", ""), source=source)
+        try:
+            result = cache.get(key)
+            if result is not None:
+                # Re-store the (content-addressed) document in case it was evicted, and count the hit as a use.
+                result["document_id"] = documents.put(result["text"], subject, source, result["keywords"],
+                                                      page_count=result.get("pages"), upload=digest, pages=pages,
+                                                      cache_key=key)
+                index_notes(user_id, subject, result["document_id"], result["text"])
+                return jsonify(result)
+            doc = documents.find_upload(digest, pages) if digest else None
+            if doc is not None:
+                # Byte-identical upload: reuse its document instead of extracting again.
+                index_notes(user_id, subject, doc["id"], doc["text"])
+                return jsonify({"text": doc["text"], "word_count": doc["word_count"], "keywords": doc["keywords"],
+                                "document_id": doc["id"], "pages": doc["page_count"], "deduplicated": True})
+
+            text, report = "", None
+            if source == "text":
+                text = parse_text(request.form.get("content", ""))
+            elif pdf_path is not None:
+                try:
+                    text, report = extract_pdf(pdf_path, pages)
+                except ValueError as e:
+                    return jsonify({"error": str(e)}), 400
+            elif source == "youtube":
+                text = parse_youtube(request.form.get("url", ""))
+            elif source == "url":
+                text = parse_url(request.form.get("url", ""))
+            if text:
+                text, keywords = nlp.run(nlp_tasks.ingest, text, subject)
+            if not text:
+                return jsonify({"error": "Could not extract content"}), 400
+            if pdf_path is not None:
+                documents.store_upload(pdf_path, digest)
+        finally:
+            if pdf_path is not None and os.path.exists(pdf_path):
+                os.remove(pdf_path)
+        doc_id = documents.put(text, subject, source, keywords, page_count=report and report["pages"],
+                               upload=digest, pages=pages, cache_key=key)
+        index_notes(user_id, subject, doc_id, text)
+        result = {"text": text, "word_count": len(text.split()), "keywords": keywords, "document_id": doc_id}
+        if report is not None:
+            result.update(pages=report["pages"], failed_pages=report["failed"])
+        cache.set(key, result, ttl=Config.CACHE_URL_TTL_SECONDS if source in ("url", "youtube") else None)
+        return jsonify(result)
+
+    @app.route("/api/parse/jobs", methods=["POST"])
+    def create_parse_job():
+        source = request.form.get("source", "text")
+        subject = request.form.get("subject", "General")
+        pdf_path = digest = None
+        if source == "pdf":
+            upload = request.files.get("file")
+            if upload is None:
+                return jsonify({"error": "Missing file"}), 400
+            pdf_path, digest = spool_upload(upload.stream)
+        job_id = ingestion.submit(source, subject, content=request.form.get("content"),
+                                  url=request.form.get("url"), pdf_path=pdf_path,
+                                  pages=request.form.get("pages"), digest=digest,
+                                  user_id=request.form.get("user_id", "default"))
+        return jsonify({"job_id": job_id, "status_url": f"/api/parse/jobs/{job_id}",
+                        "events_url": f"/api/parse/jobs/{job_id}/events"}), 202
+
+    @app.route("/api/parse/batch", methods=["POST"])
+    def parse_batch():
+        """Parse many sources at once; streams one NDJSON line per item.
+
+        JSON ``{"items": [...], "subject": ...}``, or multipart with ``items``
+        as a JSON string and each PDF item naming its upload field in ``file``.
+        """
+        if request.is_json:
+            data = request.json or {}
+            raw = data.get("items")
+        else:
+            data = request.form
+            try:
+                raw = json.loads(data.get("items") or "null")
+            except ValueError:
+                return jsonify({"error": "items must be JSON"}), 400
+        try:
+            items = validate_items(raw, Config.BATCH_MAX_ITEMS)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        for item in items:
+            if item["source"] == "pdf":
+                upload = request.files.get(item.get("file") or "")
+                if upload is None:
+                    item["error"] = "Missing file"
+                else:
+                    item["pdf_path"], item["digest"] = spool_upload(upload.stream)
+        response = Response(batch.run(items, data.get("subject", "General"), data.get("user_id", "default")),
+                            mimetype="application/x-ndjson",
+                            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+        # A response closed before it is iterated never starts the batch, which would remove the spools.
+        response.call_on_close(lambda: discard_unclaimed(items))
+        return response
+
+    @app.route("/api/parse/jobs/<job_id>", methods=["GET"])
+    def parse_job_status(job_id):
+        job = ingestion.jobs.get(job_id)
+        if job is None:
+            return jsonify({"error": "Job not found"}), 404
+        return jsonify(job)
+
+    @app.route("/api/parse/jobs/<job_id>/events", methods=["GET"])
+    def parse_job_events(job_id):
+        if ingestion.jobs.get(job_id) is None:
+            return jsonify({"error": "Job not found"}), 404
+        return Response(stream_with_context(job_events(ingestion.jobs, job_id)),
+                        mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    @app.route("/api/search", methods=["GET"])
+    def search_notes():
+        query = request.args.get("q", "").strip()
+        if not query:
+            return jsonify({"error": "q required"}), 400
+        user_id = request.args.get("user_id", "default")
+        limit = min(request.args.get("limit", 10, type=int), 50)
+        results = search.search(user_id, query, subject=request.args.get("subject"), limit=limit,
+                                documents=documents)
+        return jsonify({"query": query, "results": results})
+
+    @app.route("/api/related", methods=["GET"])
+    def related_notes():
+        """Chunks of the user's notes related to a stored document (``document_id``) or to a ``topic``."""
+        doc_id = request.args.get("document_id")
+        topic = request.args.get("topic", "").strip()
+        if not doc_id and not topic:
+            return jsonify({"error": "document_id or topic required"}), 400
+        text = documents.get_text(doc_id) if doc_id else topic
+        if text is None:
+            return jsonify({"error": "Document not found"}), 404
+        user_id = request.args.get("user_id", "default")
+        limit = min(request.args.get("limit", 5, type=int), 50)
+        results = related.query(user_id, text, limit=limit, subject=request.args.get("subject"), exclude=doc_id,
+                                documents=documents)
+        return jsonify({"document_id": doc_id, "topic": topic or None, "results": results})
+
+    @app.route("/api/documents/<doc_id>", methods=["GET"])
+    def get_document(doc_id):
+        doc = documents.get(doc_id)
+        if doc is None:
+            return jsonify({"error": "Document not found"}), 404
+        return jsonify(doc)
 
     @app.route("/api/summarize", methods=["POST"])
     @app.route("/api/revision-summary", methods=["POST"])
     def summarize():
         data = request.json or {}
-        text = data.get("text", "").strip()
+        text = request_text(data)
+        if text is None:
+            return jsonify({"error": "Document not found"}), 404
         subject = data.get("subject", "General")
+        max_sentences = int(data.get("max_sentences", 3))
+        ratio = data.get("ratio")
+        ratio = float(ratio) if ratio is not None else None
         if len(text.split()) < 20:
             return jsonify({"error": "Text too short or empty"}), 400
-        summary, tips = generate_summary(text, subject)
-        keywords = extract_keywords(text)
-        return jsonify({"summary": summary, "tips": tips, "keywords": keywords})
+        if ratio is not None and not 0 < ratio <= 1:
+            return jsonify({"error": "ratio must be between 0 and 1"}), 400
+
+        key = cache_key("summarize", text, subject=subject, max_sentences=max_sentences, ratio=ratio)
+        return jsonify(cache.get_or_compute(
+            key, lambda: nlp.run(nlp_tasks.summarize, text, subject, max_sentences, ratio)))
 
     @app.route("/api/mcqs", methods=["POST"])
     @app.route("/api/notes-to-mcqs", methods=["POST"])
     def mcqs():
         data = request.json or {}
-        text = data.get("text", "").strip()
+        text = request_text(data)
+        if text is None:
+            return jsonify({"error": "Document not found"}), 404
         subject = data.get("subject", "General")
         num = int(data.get("num_questions", 5))
         if len(text.split()) < 20:
             return jsonify({"error": "Text too short or empty"}), 400
-        questions = generate_mcqs(text, num)
-        texts = [q.get("question", q.get("stem", "")) for q in questions]
-        difficulties = classify_difficulty(texts) if texts else []
-        for i, q in enumerate(questions):
-            q["difficulty"] = difficulties[i] if i < len(difficulties) else "medium"
-            q["subject"] = subject
+        key = cache_key("mcqs", text, subject=subject, num_questions=num)
+
+        questions = cache.get_or_compute(
+            key, lambda: nlp.run(nlp_tasks.mcqs, text, num, subject, seed=seed_from_key(key)))
+        # Difficulty is labelled per request, as the online model learns from submits.
+        labels = nlp.run(nlp_tasks.difficulties, [q["question"] for q in questions])
+        for i, (q, difficulty) in enumerate(zip(questions, labels)):
             q["id"] = f"q_{i}_{int(datetime.now().timestamp())}"
+            q["difficulty"] = difficulty
         return jsonify({"questions": questions, "count": len(questions)})
 
     @app.route("/api/quiz/adaptive", methods=["POST"])
     def adaptive_quiz():
         data = request.json or {}
-        text = data.get("text", "").strip()
+        text = request_text(data)
+        if text is None:
+            return jsonify({"error": "Document not found"}), 404
         subject = data.get("subject", "General")
         num = int(data.get("num_questions", 10))
         difficulty = data.get("difficulty", "easy")
-        if not text or len(text.split()) < 20:
+        if not text:
+            # No notes: draw from the questions already banked for the subject (and topic).
+            result = bank.sample(num, difficulty, subject=subject, topic=data.get("topic"))
+            if not result:
+                return jsonify({"error": "Text required to generate quiz"}), 400
+            return jsonify({"questions": result, "count": len(result)})
+        if len(text.split()) < 20:
             return jsonify({"error": "Text required to generate quiz"}), 400
-        questions = create_quiz_from_notes(text, subject, num)
-        easy_qs = [q for q in questions if q.get("difficulty") == "easy"]
-        med_qs  = [q for q in questions if q.get("difficulty") != "easy"]
-        ordered = (easy_qs + med_qs) if difficulty == "easy" else (med_qs + easy_qs)
-        result = (ordered + questions)[:num]
-        for i, q in enumerate(result):
-            q["id"] = f"aq_{i}_{int(datetime.now().timestamp())}"
+        doc_id = data.get("document_id") or document_id(text)
+        if bank.needs_generation(doc_id, num, difficulty):
+            source = bank.source(doc_id)
+            generated = nlp.run(nlp_tasks.adaptive_quiz, text, subject, max(num, Config.QUESTION_BANK_BATCH),
+                                seed=source["rounds"] if source else 0)
+            bank.add(generated, doc_id, subject)
+        result = bank.sample(num, difficulty, document_id=doc_id)
         return jsonify({"questions": result, "count": len(result)})
 
     @app.route("/api/quiz/submit", methods=["POST"])
@@ -130,32 +338,22 @@ def create_app():
         total   = len(answers)
         accuracy = round(correct / total, 4) if total else 0
 
-        history = load_history()
-        if user_id not in history:
-            history[user_id] = []
         attempt = {
             "subject": subject, "accuracy": accuracy,
             "correct": correct, "total": total,
             "timestamp": datetime.now().isoformat(),
             "answers": answers
         }
-        history[user_id].append(attempt)
-        save_history(history)
+        subject_agg = store.add_attempt(user_id, attempt)
+        bank.record_answers(answers)
+        ability = abilities.record_attempt(user_id, subject, answers, correct, total, attempt["timestamp"])
+        reviews.record_answers(user_id, subject, answers)
+        difficulty.record(answers)
 
         feedback_text = generate_feedback_text(subject, accuracy)
 
-        subject_attempts = [a for a in history[user_id] if a["subject"] == subject]
-        recent_accs = [a["accuracy"] for a in subject_attempts[-5:]]
-        ability = round(sum(recent_accs)/len(recent_accs), 4) if recent_accs else accuracy
-        trend = "improving" if (len(recent_accs)>1 and recent_accs[-1]>recent_accs[0]) else (
-                "declining" if (len(recent_accs)>1 and recent_accs[-1]<recent_accs[0]) else "stable")
-
-        all_accs = [a["accuracy"] for a in subject_attempts]
-        avg_acc  = sum(all_accs)/len(all_accs) if all_accs else accuracy
-        n = len(subject_attempts)
-        consistency = 1 - (max(all_accs)-min(all_accs)) if len(all_accs)>1 else 0.5
-        pred_score  = min(100, round(avg_acc*70 + consistency*15 + min(n,10)*1.5, 1))
-        readiness   = "High" if pred_score>=75 else ("Medium" if pred_score>=55 else "Low")
+        n = subject_agg["attempts"]
+        pred_score, readiness = aggregates.exam_prediction(subject_agg)
 
         topic_stats = collections.defaultdict(lambda: {"correct":0,"total":0})
         for a in answers:
@@ -179,7 +377,8 @@ def create_app():
             "feedback": feedback_text,
             "suggestions": suggestions,
             "weak_topics": weak_topics,
-            "knowledge": {"ability": round(ability*100,1), "trend": trend, "attempts_in_subject": n},
+            "knowledge": {"ability": ability["ability"], "ability_ci": ability["ability_ci"],
+                          "trend": ability["trend"], "attempts_in_subject": n},
             "exam_prediction": {"predicted_score": pred_score, "readiness": readiness, "confidence": min(100,n*10)},
             "concept_difficulty": concept_difficulty
         })
@@ -187,57 +386,54 @@ def create_app():
     @app.route("/api/progress", methods=["GET"])
     def progress():
         user_id = request.args.get("user_id", "default")
-        history = load_history()
-        user_data = history.get(user_id, [])
-        if not user_data:
+        subject_aggs = store.subject_aggregates(user_id)
+        if not subject_aggs:
             return jsonify({"averageAccuracy":0,"totalQuizAttempts":0,"subjectStats":[],
                            "knowledge":{},"exam_predictions":{},"concept_difficulty":{},"sessions_this_week":0})
-
-        by_subject = collections.defaultdict(list)
-        for a in user_data:
-            by_subject[a["subject"]].append(a)
+        topic_aggs = store.topic_aggregates(user_id)
+        ability_map = abilities.user_abilities(user_id)
 
         subject_stats, knowledge_map, exam_map, concept_map = [], {}, {}, {}
-        for subject, attempts in by_subject.items():
-            accs = [a["accuracy"] for a in attempts]
-            avg  = sum(accs)/len(accs)
+        for subject, agg in subject_aggs.items():
+            avg = aggregates.mean_accuracy(agg)
             subject_stats.append({
                 "subjectName": subject, "accuracy": round(avg*100,1),
-                "quizAttempts": len(attempts),
-                "correctAnswers": sum(a["correct"] for a in attempts),
-                "totalQuestions": sum(a["total"] for a in attempts)
+                "quizAttempts": agg["attempts"],
+                "correctAnswers": agg["correct"],
+                "totalQuestions": agg["total"]
             })
-            recent = accs[-5:]
-            trend = "improving" if (len(recent)>1 and recent[-1]>recent[0]) else (
-                    "declining" if (len(recent)>1 and recent[-1]<recent[0]) else "stable")
-            knowledge_map[subject] = {"ability": round(avg*100,1), "trend": trend, "attempts": len(attempts)}
-            consistency = 1-(max(accs)-min(accs)) if len(accs)>1 else 0.5
-            pred = min(100, round(avg*70+consistency*15+min(len(attempts),10)*1.5,1))
-            exam_map[subject] = {"predicted_score":pred,
-                                 "readiness":"High" if pred>=75 else ("Medium" if pred>=55 else "Low")}
-            ts = collections.defaultdict(lambda:{"correct":0,"total":0})
-            for att in attempts:
-                for a in att.get("answers",[]):
-                    t = a.get("topic", subject)
-                    ts[t]["total"] += 1
-                    if str(a.get("user_answer",""))==str(a.get("correct_answer","")):
-                        ts[t]["correct"] += 1
-            concept_map[subject] = {
-                t: round(1-(v["correct"]/v["total"]),2) if v["total"] else 1
-                for t,v in ts.items()
-            }
+            ability = ability_map.get(subject)
+            if ability is not None:
+                knowledge_map[subject] = {"ability": ability["ability"], "ability_ci": ability["ability_ci"],
+                                          "theta": ability["theta"], "trend": ability["trend"],
+                                          "attempts": agg["attempts"]}
+            else:
+                # History not replayed into the ability engine yet (see replay_ability.py)
+                knowledge_map[subject] = {"ability": round(avg*100,1), "trend": aggregates.trend(agg),
+                                          "attempts": agg["attempts"]}
+            pred, readiness = aggregates.exam_prediction(agg)
+            exam_map[subject] = {"predicted_score": pred, "readiness": readiness}
+            concept_map[subject] = aggregates.concept_difficulty(topic_aggs.get(subject, {}))
 
         total_acc = sum(s["accuracy"] for s in subject_stats)/len(subject_stats) if subject_stats else 0
         week_ago = (datetime.now()-timedelta(days=7)).isoformat()
-        sessions_week = sum(1 for a in user_data if a["timestamp"]>=week_ago)
+        sessions_week = store.count_since(user_id, week_ago)
 
         return jsonify({
-            "averageAccuracy": round(total_acc,1), "totalQuizAttempts": len(user_data),
+            "averageAccuracy": round(total_acc,1), "totalQuizAttempts": sum(a["attempts"] for a in subject_aggs.values()),
             "subjectStats": subject_stats, "knowledge": knowledge_map,
             "exam_predictions": exam_map, "concept_difficulty": concept_map,
             "sessions_this_week": sessions_week
         })
 
+    @app.route("/api/nlp/stats", methods=["GET"])
+    def nlp_stats():
+        return jsonify(nlp.info())
+
+    @app.route("/api/cache/stats", methods=["GET"])
+    def cache_stats():
+        return jsonify(cache.info())
+
     @app.route("/api/resources", methods=["POST"])
     def resources():
         data = request.json or {}
@@ -253,18 +449,46 @@ def create_app():
         subject = data.get("subject", "General")
         hours   = float(data.get("hours", 4))
         concept_weights = data.get("concept_difficulty", {})
-        csv_data = generate_study_schedule_csv(subject, hours, concept_weights)
+        due_reviews = reviews.due_count(data.get("user_id", "default"), subject)
+        csv_data = generate_study_schedule_csv(subject, hours, concept_weights, due_reviews)
         buf = BytesIO(csv_data.encode())
         buf.seek(0)
         return send_file(buf, mimetype="text/csv", as_attachment=True, download_name="study_schedule.csv")
 
+    @app.route("/api/reviews/due", methods=["GET"])
+    def reviews_due():
+        user_id = request.args.get("user_id", "default")
+        subject = request.args.get("subject")
+        limit = min(request.args.get("limit", 20, type=int), 200)
+        return jsonify({"items": reviews.due(user_id, subject, limit),
+                        "due_today": reviews.due_count(user_id, subject),
+                        "load": reviews.load()})
+
+    @app.route("/api/reviews", methods=["POST"])
+    def record_review():
+        data = request.json or {}
+        user_id = data.get("user_id", "default")
+        if not data.get("item_id"):
+            return jsonify({"error": "item_id required"}), 400
+        if "grade" in data:
+            try:
+                grade = int(data["grade"])
+            except (TypeError, ValueError, OverflowError):
+                return jsonify({"error": "grade must be 0-5"}), 400
+        elif "correct" in data:
+            grade = CORRECT_GRADE if data["correct"] else WRONG_GRADE
+        else:
+            return jsonify({"error": "grade (0-5) or correct required"}), 400
+        card = reviews.review(user_id, data["item_id"], grade)
+        if card is None:
+            return jsonify({"error": "Unknown review item"}), 404
+        return jsonify(card)
+
     @app.route("/api/dashboard", methods=["GET"])
     def dashboard():
         user_id = request.args.get("user_id", "default")
-        history = load_history()
-        user_data = history.get(user_id, [])
-        total = len(user_data)
-        avg = round(sum(a["accuracy"] for a in user_data)/total*100, 1) if user_data else 0
+        total, mean_acc = store.user_summary(user_id)
+        avg = round(mean_acc*100, 1) if total else 0
         subjects_list = get_all_subjects()
         return jsonify({"subjects": subjects_list, "total_quiz_attempts": total, "average_accuracy": avg})
 
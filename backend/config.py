@@ -7,6 +7,51 @@ class Config:
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     YOUTUBE_API_KEY = os.environ.get("YOUTUBE_API_KEY", "")
+    # Set to "false" to skip creating missing model artifacts (e.g. the seed difficulty model) on boot
+    TRAIN_MODELS_ON_STARTUP = os.environ.get("TRAIN_MODELS_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+    # Set to "false" (with the above) to defer loading scikit-learn and the models to the first request
+    WARM_MODELS_ON_STARTUP = os.environ.get("WARM_MODELS_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+    # Result cache for summaries / MCQs / keywords (disk tier lives in data/cache)
+    CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", 1024))
+    CACHE_MAX_BYTES = int(os.environ.get("CACHE_MAX_BYTES", 64 * 1024 * 1024))
+    CACHE_TTL_SECONDS = int(os.environ.get("CACHE_TTL_SECONDS", 24 * 3600))
+    CACHE_URL_TTL_SECONDS = int(os.environ.get("CACHE_URL_TTL_SECONDS", 3600))
+    CACHE_DISK = os.environ.get("CACHE_DISK", "false").lower() in ("1", "true", "yes")
+    CACHE_MAX_DISK_BYTES = int(os.environ.get("CACHE_MAX_DISK_BYTES", 512 * 1024 * 1024))
+    # Process pool for CPU-bound NLP (0 = run inline in the request thread)
+    NLP_POOL_WORKERS = int(os.environ.get("NLP_POOL_WORKERS", 2))
+    NLP_TASK_TIMEOUT = float(os.environ.get("NLP_TASK_TIMEOUT", 60))
+    NLP_POOL_MAX_TASKS = int(os.environ.get("NLP_POOL_MAX_TASKS", 100))
+    NLP_POOL_MAX_PENDING = int(os.environ.get("NLP_POOL_MAX_PENDING", 0)) or None
+    # Processes extracting PDF pages in parallel (1 = extract in the calling thread)
+    PDF_EXTRACT_WORKERS = int(os.environ.get("PDF_EXTRACT_WORKERS", min(4, os.cpu_count() or 1)))
+    # Web page fetching (responses cached in data/http_cache, revalidated with ETag/Last-Modified)
+    URL_FETCH_TIMEOUT = float(os.environ.get("URL_FETCH_TIMEOUT", 10))
+    URL_FETCH_MAX_BYTES = int(os.environ.get("URL_FETCH_MAX_BYTES", 5 * 1024 * 1024))
+    URL_FETCH_PER_HOST = int(os.environ.get("URL_FETCH_PER_HOST", 4))
+    URL_TEXT_MAX_CHARS = int(os.environ.get("URL_TEXT_MAX_CHARS", 100000))
+    URL_CACHE_MAX_BYTES = int(os.environ.get("URL_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+    # POST /api/parse/batch: extraction threads, concurrent fetches per host, whole-batch deadline
+    BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", 200))
+    BATCH_WORKERS = int(os.environ.get("BATCH_WORKERS", 8))
+    BATCH_PER_HOST = int(os.environ.get("BATCH_PER_HOST", 2))
+    BATCH_DEADLINE_SECONDS = float(os.environ.get("BATCH_DEADLINE_SECONDS", 120))
+    # Stored documents and raw uploads (data/uploads/blobs), evicted least recently used beyond this
+    DOCUMENT_STORE_MAX_BYTES = int(os.environ.get("DOCUMENT_STORE_MAX_BYTES", 1024 * 1024 * 1024))
+    # Questions generated per round when a document's question bank runs short
+    QUESTION_BANK_BATCH = int(os.environ.get("QUESTION_BANK_BATCH", 20))
+    # Estimated Jaccard similarity (MinHash) above which two questions count as near-duplicates
+    QUESTION_DUPLICATE_THRESHOLD = float(os.environ.get("QUESTION_DUPLICATE_THRESHOLD", 0.7))
+    # Resource catalog (CSV or JSON lines) served by /api/resources, reloaded when the file changes
+    RESOURCE_CATALOG_PATH = os.environ.get("RESOURCE_CATALOG_PATH",
+                                           os.path.join(os.path.dirname(__file__), "data", "resources.csv"))
+    # Quiz answers per online difficulty-model update, and the longest an answer waits for one
+    DIFFICULTY_BATCH_SIZE = int(os.environ.get("DIFFICULTY_BATCH_SIZE", 256))
+    DIFFICULTY_BATCH_SECONDS = float(os.environ.get("DIFFICULTY_BATCH_SECONDS", 30))
+    # Background threads per web worker running /api/parse/jobs
+    INGEST_JOB_WORKERS = int(os.environ.get("INGEST_JOB_WORKERS", 2))
+    # How long finished /api/parse/jobs records stay pollable before they are pruned
+    INGEST_JOB_TTL_SECONDS = int(os.environ.get("INGEST_JOB_TTL_SECONDS", 7 * 24 * 3600))
     # Local paths
     DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
     MODEL_DIR = os.path.join(os.path.dirname(__file__), "models", "artifacts")
@@ -0,0 +1,36 @@
+"""Bulk near-duplicate cleanup of the question bank.
+
+Re-checks every stored question with the MinHash/LSH index, in the order
+they were added: near-duplicates within one document are deleted (their
+usage counts move to the question kept), ones across documents are marked
+so subject-wide quizzes skip them.
+
+    python dedupe_questions.py                  # apply
+    python dedupe_questions.py --dry-run        # only report
+    python dedupe_questions.py --threshold 0.8  # stricter similarity
+"""
+import argparse
+import json
+import sys
+
+from config import Config
+from services.question_bank import QuestionBank
+from services.sqlite_db import default_db_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', default=None, help='SQLite file (default: the app database)')
+    parser.add_argument('--threshold', type=float, default=Config.QUESTION_DUPLICATE_THRESHOLD,
+                        help='estimated Jaccard similarity that counts as a duplicate')
+    parser.add_argument('--dry-run', action='store_true', help='report without changing the bank')
+    args = parser.parse_args(argv)
+
+    bank = QuestionBank(args.db or default_db_path(), threshold=args.threshold)
+    report = bank.dedupe(dry_run=args.dry_run)
+    print(json.dumps(dict(report, dry_run=args.dry_run)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""Boot-time report: how long importing ``app`` and calling ``create_app()`` take.
+
+Runs a fresh interpreter with ``-X importtime`` (so nothing is already
+imported), then summarises the raw output per top-level package.
+
+    python import_report.py                 # table of the slowest packages
+    python import_report.py --json          # machine-readable, for CI tracking
+    python import_report.py --budget-ms 300 # exit 1 if create_app() is slower
+
+Startup flags such as ``TRAIN_MODELS_ON_STARTUP`` / ``WARM_MODELS_ON_STARTUP``
+are read from the environment as usual.
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+LINE_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+MARKER = 'BOOT_TIMINGS '
+
+CHILD = f'''
+import json, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+app.create_app()
+t2 = time.perf_counter()
+print({MARKER!r} + json.dumps([(t1 - t0) * 1000, (t2 - t1) * 1000]))
+'''
+
+
+def parse_importtime(lines):
+    """``{package: self_us}`` and ``[(module, cumulative_us)]`` for direct imports."""
+    per_package = defaultdict(int)
+    top_level = []
+    for line in lines:
+        m = LINE_RE.match(line)
+        if not m:
+            continue
+        self_us, cumulative_us, indent, name = int(m.group(1)), int(m.group(2)), m.group(3), m.group(4)
+        per_package[name.split('.')[0]] += self_us
+        if len(indent) <= 1:
+            top_level.append((name, cumulative_us))
+    return dict(per_package), top_level
+
+
+def run_report(python=sys.executable):
+    proc = subprocess.run([python, '-X', 'importtime', '-c', CHILD], cwd=BACKEND_DIR,
+                          capture_output=True, text=True)
+    timings = [l for l in proc.stdout.splitlines() if l.startswith(MARKER)]
+    if proc.returncode != 0 or not timings:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else 'boot failed')
+    import_ms, create_app_ms = json.loads(timings[-1][len(MARKER):])
+    per_package, top_level = parse_importtime(proc.stderr.splitlines())
+    return {
+        'import_app_ms': round(import_ms, 1),
+        'create_app_ms': round(create_app_ms, 1),
+        'total_ms': round(import_ms + create_app_ms, 1),
+        'packages_ms': {k: round(v / 1000, 1) for k, v in
+                        sorted(per_package.items(), key=lambda kv: -kv[1])},
+        'imports_ms': {name: round(us / 1000, 1) for name, us in top_level},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--top', type=int, default=15, help='packages to list')
+    parser.add_argument('--json', action='store_true', help='print the full report as JSON')
+    parser.add_argument('--budget-ms', type=float, help='fail if import + create_app() exceeds this')
+    args = parser.parse_args(argv)
+
+    try:
+        report = run_report()
+    except RuntimeError as e:
+        print(f'Boot failed: {e}')
+        return 1
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"import app:   {report['import_app_ms']:8.1f} ms")
+        print(f"create_app(): {report['create_app_ms']:8.1f} ms")
+        print(f"total:        {report['total_ms']:8.1f} ms\n")
+        print(f"{'package':<30}{'self ms':>10}")
+        for name, ms in list(report['packages_ms'].items())[:args.top]:
+            print(f'{name:<30}{ms:>10.1f}')
+    if args.budget_ms is not None and report['total_ms'] > args.budget_ms:
+        print(f"Boot took {report['total_ms']} ms, over the {args.budget_ms:g} ms budget")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
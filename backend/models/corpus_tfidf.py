@@ -0,0 +1,159 @@
+"""Corpus-level IDF model for sentence scoring.
+
+Document frequencies are fitted offline from ``topic_training_data.csv`` and
+grown incrementally as notes are ingested, so scoring a request is
+transform-only: look up the IDF of the document's terms and apply it to the
+sentence-term count matrix in one sparse operation.
+
+Workers buffer new document frequencies locally and periodically merge them
+into ``corpus_tfidf.npz`` under a file lock; the model registry then picks
+up the new file in every worker.
+"""
+import csv
+import os
+import threading
+from collections import Counter
+
+import numpy as np
+
+from models.document_analysis import analyze_document
+from models.model_registry import registry
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: single process, no lock needed
+    fcntl = None
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'data')
+CORPUS_PATH = os.path.join(DATA_DIR, 'corpus_tfidf.npz')
+TRAINING_PATH = os.path.join(DATA_DIR, 'topic_training_data.csv')
+FLUSH_EVERY = 20
+
+
+def document_terms(text, analysis=None):
+    """Distinct content terms of one document."""
+    analysis = analysis or analyze_document(text)
+    return set(analysis.content_tokens)
+
+
+class CorpusTfidf:
+    def __init__(self, terms=(), df=(), n_docs=0):
+        self.terms = list(terms)
+        self.vocabulary = {t: i for i, t in enumerate(self.terms)}
+        self.df = np.asarray(df, dtype=np.int64)
+        self.n_docs = int(n_docs)
+
+    def partial_fit(self, term_sets):
+        """Add documents, given as iterables of their distinct terms."""
+        counts = Counter()
+        n = 0
+        for terms in term_sets:
+            counts.update(set(terms))
+            n += 1
+        self.merge(counts, n)
+        return self
+
+    def merge(self, counts, n_docs):
+        new_terms = [t for t in counts if t not in self.vocabulary]
+        for t in new_terms:
+            self.vocabulary[t] = len(self.terms)
+            self.terms.append(t)
+        if new_terms:
+            self.df = np.concatenate([self.df, np.zeros(len(new_terms), dtype=np.int64)])
+        if counts:
+            idx = np.fromiter((self.vocabulary[t] for t in counts), dtype=np.int64, count=len(counts))
+            self.df[idx] += np.fromiter(counts.values(), dtype=np.int64, count=len(counts))
+        self.n_docs += n_docs
+
+    def idf_for(self, terms):
+        """Smoothed IDF (as in scikit-learn) for each term; unseen terms get df=0."""
+        df = np.array([self.df[self.vocabulary[t]] if t in self.vocabulary else 0 for t in terms],
+                      dtype=np.float64)
+        return np.log((1 + self.n_docs) / (1 + df)) + 1
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{path}.{os.getpid()}.tmp.npz'
+        np.savez(tmp, terms=np.array(self.terms, dtype=str), df=self.df, n_docs=np.int64(self.n_docs))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['terms'].tolist(), data['df'], int(data['n_docs']))
+
+
+def fit_corpus_model(texts=None, path=CORPUS_PATH):
+    """Fit document frequencies from scratch (default: the topic training data)."""
+    if texts is None:
+        with open(TRAINING_PATH, 'r') as f:
+            texts = [row['text'] for row in csv.DictReader(f)]
+    model = CorpusTfidf().partial_fit(document_terms(t) for t in texts)
+    model.save(path)
+    return model
+
+
+def get_corpus_model():
+    return registry.get('corpus_tfidf')
+
+
+registry.register('corpus_tfidf', CORPUS_PATH, loader=CorpusTfidf.load, trainer=fit_corpus_model)
+
+_pending = Counter()
+_pending_docs = 0
+_pending_lock = threading.Lock()
+
+
+def add_documents(texts=(), analyses=(), flush_every=FLUSH_EVERY, path=CORPUS_PATH):
+    """Buffer newly ingested notes; merge into the persisted model every ``flush_every`` docs."""
+    global _pending_docs
+    with _pending_lock:
+        for text in texts:
+            _pending.update(document_terms(text))
+            _pending_docs += 1
+        for analysis in analyses:
+            _pending.update(document_terms(None, analysis))
+            _pending_docs += 1
+        due = _pending_docs >= flush_every
+    if due:
+        flush(path)
+
+
+def flush(path=CORPUS_PATH):
+    """Merge this worker's buffered document frequencies into the file on disk."""
+    global _pending_docs
+    with _pending_lock:
+        if not _pending_docs:
+            return
+        counts, n = Counter(_pending), _pending_docs
+        _pending.clear()
+        _pending_docs = 0
+    lock = open(path + '.lock', 'w')
+    try:
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        model = CorpusTfidf.load(path) if os.path.exists(path) else fit_corpus_model(path=path)
+        model.merge(counts, n)
+        model.save(path)
+    finally:
+        lock.close()
+
+
+def score_sentences(analysis, model=None):
+    """Importance of each sentence: sum of its L2-normalised TF-IDF weights.
+
+    Stopwords are ignored; IDF comes from the corpus model, so no fitting
+    happens per request.
+    """
+    model = model or get_corpus_model()
+    weights = model.idf_for(analysis.terms)
+    weights[~analysis.content_mask()] = 0
+    X = analysis.sentence_term_matrix.multiply(weights).tocsr()
+    norms = np.sqrt(np.asarray(X.multiply(X).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return np.asarray(X.sum(axis=1)).ravel() / norms
+
+
+if __name__ == '__main__':
+    model = fit_corpus_model()
+    print(f'Fitted corpus model: {model.n_docs} documents, {len(model.terms)} terms -> {CORPUS_PATH}')
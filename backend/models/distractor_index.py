@@ -0,0 +1,255 @@
+"""Per-subject term similarity index used to pick MCQ distractors.
+
+Terms are embedded with random indexing: every term owns a fixed sparse
+random "index vector", and a term's context vector is the sum of the index
+vectors of terms it shares a sentence with.  Context vectors are purely
+additive, so new notes update the index incrementally (and workers can merge
+their updates by summing).  Vectors live in one float32 matrix; nearest
+neighbours for a batch of answers are a single matrix product.
+"""
+import hashlib
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+from models.document_analysis import STOP_WORDS
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+INDEX_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', 'distractors')
+DIM = 128
+NONZEROS = 8
+FLUSH_EVERY = 10
+RELOAD_INTERVAL = 5.0
+
+
+def is_candidate_term(token):
+    """Content words that can serve as an answer or distractor."""
+    t = token.lower()
+    return len(t) >= 4 and t.isalpha() and t not in STOP_WORDS and not t.endswith('ly')
+
+
+_index_vectors = {}
+
+
+def index_vector(term):
+    """Deterministic sparse ternary vector for ``term`` (same in every process)."""
+    vec = _index_vectors.get(term)
+    if vec is None:
+        digest = hashlib.blake2b(term.encode('utf-8'), digest_size=2 * NONZEROS).digest()
+        vec = np.zeros(DIM, dtype=np.float32)
+        for i in range(NONZEROS):
+            vec[digest[2 * i] % DIM] += 1.0 if digest[2 * i + 1] & 1 else -1.0
+        _index_vectors[term] = vec
+    return vec
+
+
+class TermIndex:
+    def __init__(self, terms=(), vectors=None, counts=None):
+        self.terms = list(terms)
+        self.vocabulary = {t: i for i, t in enumerate(self.terms)}
+        n = len(self.terms)
+        capacity = max(64, n)
+        self._vectors = np.zeros((capacity, DIM), dtype=np.float32)
+        self._counts = np.zeros(capacity, dtype=np.int64)
+        if n:
+            self._vectors[:n] = vectors
+            self._counts[:n] = counts
+        self._unit = None
+
+    def __len__(self):
+        return len(self.terms)
+
+    @property
+    def vectors(self):
+        return self._vectors[:len(self.terms)]
+
+    @property
+    def counts(self):
+        return self._counts[:len(self.terms)]
+
+    def _ids(self, terms):
+        ids = []
+        for t in terms:
+            i = self.vocabulary.get(t)
+            if i is None:
+                i = len(self.terms)
+                if i == len(self._counts):
+                    self._vectors = np.concatenate([self._vectors, np.zeros_like(self._vectors)])
+                    self._counts = np.concatenate([self._counts, np.zeros_like(self._counts)])
+                self.vocabulary[t] = i
+                self.terms.append(t)
+            ids.append(i)
+        return np.array(ids, dtype=np.int64)
+
+    def add_sentences(self, sentences):
+        """Add co-occurrence evidence from sentences given as lists of lowercase tokens."""
+        for tokens in sentences:
+            terms = sorted({t for t in tokens if is_candidate_term(t)})
+            if not terms:
+                continue
+            ids = self._ids(terms)
+            index_vecs = np.stack([index_vector(t) for t in terms])
+            self._vectors[ids] += index_vecs.sum(axis=0) - index_vecs
+            self._counts[ids] += 1
+        self._unit = None
+
+    def add_analysis(self, analysis):
+        self.add_sentences(analysis.sentence_lower)
+
+    def merge(self, other):
+        ids = self._ids(other.terms)
+        self._vectors[ids] += other.vectors
+        self._counts[ids] += other.counts
+        self._unit = None
+
+    def _unit_vectors(self):
+        if self._unit is None:
+            v = self.vectors
+            norms = np.linalg.norm(v, axis=1)
+            norms[norms == 0] = 1
+            self._unit = v / norms[:, None]
+        return self._unit
+
+    def nearest(self, terms, k=10, min_count=1):
+        """Top-``k`` most similar indexed terms for each query term (``[]`` if unknown)."""
+        known = [(j, self.vocabulary[t]) for j, t in enumerate(terms) if t in self.vocabulary]
+        results = [[] for _ in terms]
+        if not known:
+            return results
+        unit = self._unit_vectors()
+        sims = unit @ unit[[i for _, i in known]].T  # (n_terms, n_queries)
+        sims[self.counts < min_count] = -np.inf
+        kk = min(k + 1, len(self.terms))
+        for col, (j, i) in enumerate(known):
+            s = sims[:, col]
+            s[i] = -np.inf
+            top = np.argpartition(-s, kk - 1)[:kk]
+            top = top[np.argsort(-s[top])]
+            results[j] = [self.terms[t] for t in top if np.isfinite(s[t]) and s[t] > 0][:k]
+        return results
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{path}.{os.getpid()}.tmp.npz'
+        np.savez(tmp, terms=np.array(self.terms, dtype=str), vectors=self.vectors, counts=self.counts)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['terms'].tolist(), data['vectors'], data['counts'])
+
+
+def subject_slug(subject):
+    return re.sub(r'[^a-z0-9]+', '-', (subject or 'general').lower()).strip('-') or 'general'
+
+
+class SubjectIndexes:
+    """Loaded subject indexes plus this worker's not-yet-persisted additions."""
+
+    def __init__(self, index_dir=INDEX_DIR, flush_every=FLUSH_EVERY):
+        self.index_dir = index_dir
+        self.flush_every = flush_every
+        self._lock = threading.Lock()
+        self._loaded = {}   # slug -> (TermIndex, mtime, checked_at)
+        self._pending = {}  # slug -> (TermIndex delta, docs)
+
+    def path(self, slug):
+        return os.path.join(self.index_dir, slug + '.npz')
+
+    def get(self, subject):
+        slug = subject_slug(subject)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._loaded.get(slug)
+            if entry and now - entry[2] < RELOAD_INTERVAL:
+                return entry[0]
+            path = self.path(slug)
+            mtime = os.path.getmtime(path) if os.path.exists(path) else None
+            if entry and entry[1] == mtime:
+                self._loaded[slug] = (entry[0], mtime, now)
+                return entry[0]
+            index = TermIndex.load(path) if mtime is not None else TermIndex()
+            pending = self._pending.get(slug)
+            if pending:
+                index.merge(pending[0])
+            self._loaded[slug] = (index, mtime, now)
+            return index
+
+    def add(self, subject, analysis):
+        slug = subject_slug(subject)
+        index = self.get(subject)
+        delta = TermIndex()
+        delta.add_analysis(analysis)
+        with self._lock:
+            index.merge(delta)
+            pending, docs = self._pending.get(slug, (TermIndex(), 0))
+            pending.merge(delta)
+            self._pending[slug] = (pending, docs + 1)
+            due = docs + 1 >= self.flush_every
+        if due:
+            self.flush(subject)
+
+    def flush(self, subject=None):
+        slugs = [subject_slug(subject)] if subject is not None else list(self._pending)
+        for slug in slugs:
+            with self._lock:
+                pending = self._pending.pop(slug, None)
+            if not pending:
+                continue
+            path = self.path(slug)
+            os.makedirs(self.index_dir, exist_ok=True)
+            lock = open(path + '.lock', 'w')
+            try:
+                if fcntl:
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                index = TermIndex.load(path) if os.path.exists(path) else TermIndex()
+                index.merge(pending[0])
+                index.save(path)
+            finally:
+                lock.close()
+            with self._lock:
+                self._loaded.pop(slug, None)
+
+
+subject_indexes = SubjectIndexes()
+
+
+def add_subject_notes(subject, analysis):
+    """Feed an ingested note into its subject's distractor index."""
+    subject_indexes.add(subject, analysis)
+
+
+def pick_distractors(answer, exclude, indexes, n=3, fallback=(), accept=None):
+    """Up to ``n`` plausible wrong options for ``answer``.
+
+    ``indexes`` are searched in order (e.g. subject index, then a
+    document-local one); ``fallback`` terms fill any remaining slots.
+    ``accept``, if given, is a predicate every option must pass.
+    Candidates sharing a 5-letter prefix with the answer are skipped so
+    plural/inflected forms of the answer do not appear as options.
+    """
+    key = answer.lower()
+    banned = {t.lower() for t in exclude} | {key}
+    chosen = []
+
+    def consider(term):
+        if len(chosen) < n and term not in banned and term[:5] != key[:5] \
+                and all(c[:5] != term[:5] for c in chosen) and (accept is None or accept(term)):
+            chosen.append(term)
+
+    for index in indexes:
+        for term in index.nearest([key], k=4 * n)[0]:
+            consider(term)
+    for term in fallback:
+        consider(term.lower())
+    if answer[:1].isupper():
+        chosen = [t.capitalize() for t in chosen]
+    return chosen
@@ -0,0 +1,79 @@
+"""Single-pass text analysis shared by the summarizer, keywords and MCQs.
+
+A request builds one ``DocumentAnalysis`` for its text and hands it to every
+model function, so sentence splitting, tokenization, stopword filtering and
+the sentence-term count matrix are computed exactly once.
+"""
+import re
+from collections import Counter
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from models.nlp_resources import load_stop_words
+
+# Sentence breaks: whitespace after terminal punctuation (and any closing quotes
+# or brackets), a blank line, or a line break before a line that starts a new
+# sentence.  A line break before a lowercase word is a hard wrap and is kept.
+SENTENCE_RE = re.compile(r"""(?:(?<=[.!?])|(?<=[.!?]["'”’)\]])|(?<=[.!?]["'”’)\]]{2}))\s+"""
+                         r"""|\s*\n\s*\n\s*"""
+                         r"""|\s*\n\s*(?=[A-Z0-9"'“‘(\[*•-])""")
+TOKEN_RE = re.compile(r'\w+')
+STOP_WORDS = load_stop_words()
+
+
+class DocumentAnalysis:
+    """Sentences, tokens, term frequencies and sentence-term counts for one text."""
+
+    def __init__(self, text):
+        self.text = text
+        self.sentences = [s for s in SENTENCE_RE.split(text.strip()) if s]
+        # Original-case tokens per sentence, and their lowercase forms.
+        self.sentence_tokens = [TOKEN_RE.findall(s) for s in self.sentences]
+        self.sentence_lower = [[t.lower() for t in toks] for toks in self.sentence_tokens]
+        self.tokens = [t for toks in self.sentence_lower for t in toks]
+        self.content_tokens = [t for t in self.tokens if t.isalnum() and t not in STOP_WORDS]
+        self.term_freq = Counter(self.tokens)
+        self.content_freq = Counter(self.content_tokens)
+
+        self.vocabulary = {}
+        rows, cols = [], []
+        for i, toks in enumerate(self.sentence_lower):
+            for t in toks:
+                rows.append(i)
+                cols.append(self.vocabulary.setdefault(t, len(self.vocabulary)))
+        self.terms = list(self.vocabulary)
+        self.sentence_term_matrix = csr_matrix(
+            (np.ones(len(rows), dtype=np.float64), (rows, cols)),
+            shape=(len(self.sentences), len(self.vocabulary)))
+        self.sentence_term_matrix.sum_duplicates()
+
+    @property
+    def word_count(self):
+        return len(self.tokens)
+
+    def term_vector(self, weights):
+        """Dense vector over this document's vocabulary from a {term: weight} mapping."""
+        return np.array([weights.get(t, 0.0) for t in self.terms], dtype=np.float64)
+
+    def content_mask(self):
+        """Boolean mask over the vocabulary: True for non-stopword alphanumeric terms."""
+        return np.array([t.isalnum() and t not in STOP_WORDS for t in self.terms], dtype=bool)
+
+    def project(self, vocabulary, rows=None):
+        """Re-express sentence term counts in another model's vocabulary.
+
+        ``vocabulary`` is a {term: column} mapping such as a fitted
+        ``CountVectorizer.vocabulary_``; terms it does not know are dropped.
+        """
+        X = self.sentence_term_matrix if rows is None else self.sentence_term_matrix[list(rows)]
+        colmap = np.array([vocabulary.get(t, -1) for t in self.terms], dtype=np.int64)
+        X = X.tocoo()
+        target = colmap[X.col] if X.nnz else np.empty(0, dtype=np.int64)
+        keep = target >= 0
+        return csr_matrix((X.data[keep], (X.row[keep], target[keep])),
+                          shape=(X.shape[0], len(vocabulary)))
+
+
+def analyze_document(text):
+    return DocumentAnalysis(text or '')
@@ -0,0 +1,85 @@
+"""Keyphrase extraction (RAKE/YAKE-style n-grams).
+
+Candidates are runs of content words between stopwords, punctuation and
+sentence boundaries; every n-gram of up to ``MAX_WORDS`` words inside a run
+is a candidate.  A phrase scores by how often it occurs times the mean
+frequency of its words, with a bonus for recurring multi-word phrases and
+for appearing early in the notes.  Returned phrases never share a word, so
+``light energy`` and ``light`` are not both returned.  Everything works off
+the shared ``DocumentAnalysis`` tokens, so no extra tokenization happens.
+"""
+import math
+from collections import Counter
+
+from models.document_analysis import STOP_WORDS, analyze_document
+
+MAX_WORDS = 3
+MIN_PHRASE_COUNT = 2
+PHRASE_BONUS = 1.2
+
+
+def _is_content(token):
+    return len(token) > 1 and token.isalnum() and not token.isdigit() and token not in STOP_WORDS
+
+
+def candidate_runs(analysis):
+    """Yield ``(sentence_index, run)`` for each maximal run of content words."""
+    for i, tokens in enumerate(analysis.sentence_lower):
+        run = []
+        for t in tokens:
+            if _is_content(t):
+                run.append(t)
+            elif run:
+                yield i, run
+                run = []
+        if run:
+            yield i, run
+
+
+def score_phrases(analysis, max_words=MAX_WORDS):
+    """``{word tuple: score}`` for every candidate n-gram of ``analysis``."""
+    counts = Counter()
+    first_seen = {}
+    word_freq = Counter()
+    for i, run in candidate_runs(analysis):
+        word_freq.update(run)
+        for n in range(1, min(max_words, len(run)) + 1):
+            for j in range(len(run) - n + 1):
+                gram = tuple(run[j:j + n])
+                counts[gram] += 1
+                first_seen.setdefault(gram, i)
+    if not counts:
+        return {}
+    n_sentences = max(1, len(analysis.sentences))
+    weight = {w: math.log1p(f) for w, f in word_freq.items()}
+    scores = {}
+    for gram, count in counts.items():
+        # Multi-word phrases must recur to count as a phrase rather than a coincidence.
+        if len(gram) > 1 and count < MIN_PHRASE_COUNT:
+            continue
+        position = 1.0 + 0.5 * (1.0 - first_seen[gram] / n_sentences)
+        bonus = PHRASE_BONUS if len(gram) > 1 else 1.0
+        scores[gram] = count * sum(weight[w] for w in gram) / len(gram) * bonus * position
+    return scores
+
+
+def extract_keyphrases(text, num_keywords=5, analysis=None, max_words=MAX_WORDS):
+    """Top ``num_keywords`` keyphrases, best first."""
+    analysis = analysis or analyze_document(text)
+    scores = score_phrases(analysis, max_words)
+    chosen, used = [], set()
+    # Ties go to the shorter phrase: "calvin cycle" over "calvin cycle fixes".
+    for gram in sorted(scores, key=lambda g: (-scores[g], len(g), g)):
+        if len(chosen) == num_keywords:
+            break
+        if used.isdisjoint(gram):
+            chosen.append(' '.join(gram))
+            used.update(gram)
+    return chosen
+
+
+def extract_keywords_batch(texts, num_keywords=5, analyses=None, max_words=MAX_WORDS):
+    """Keyphrases for many documents in one call (one list per text)."""
+    analyses = analyses or [None] * len(texts)
+    return [extract_keyphrases(text, num_keywords, analysis, max_words)
+            for text, analysis in zip(texts, analyses)]
@@ -0,0 +1,113 @@
+"""MinHash signatures and an LSH index for spotting near-duplicate questions.
+
+A question is reduced to the set of word bigrams of its sentence (answer
+filled back into the blank, so two blanks cut from one sentence match).  The
+signature keeps, for each of ``NUM_PERM`` hash functions, the minimum hash
+over the set; the fraction of equal positions estimates Jaccard similarity.
+The signature is cut into ``BANDS`` bands of ``ROWS`` values and each band is
+hashed into a bucket: only items sharing a bucket with a query are compared,
+so a lookup touches a handful of candidates instead of the whole bank.
+
+Signatures and band keys live in growable uint32/uint64 arrays; the buckets
+map a band key to the rows holding it.
+"""
+import hashlib
+import re
+
+import numpy as np
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE = 2
+PRIME = (1 << 31) - 1
+BLANK = '_____'
+
+_rng = np.random.RandomState(20240601)
+_A = _rng.randint(1, PRIME, size=NUM_PERM).astype(np.uint64)
+_B = _rng.randint(0, PRIME, size=NUM_PERM).astype(np.uint64)
+
+
+def question_shingles(question, answer=''):
+    """Word bigrams of the question's sentence."""
+    text = question.replace(BLANK, answer) if answer else question.replace(BLANK, ' ')
+    words = re.findall(r'[a-z0-9]+', text.lower())
+    if len(words) < SHINGLE:
+        return set(words)
+    return {' '.join(words[i:i + SHINGLE]) for i in range(len(words) - SHINGLE + 1)}
+
+
+def signature(shingles):
+    """MinHash signature (``NUM_PERM`` uint32 values) of a set of strings."""
+    if not shingles:
+        return np.full(NUM_PERM, PRIME, dtype=np.uint32)
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=4).digest(), 'little') for s in shingles),
+        dtype=np.uint64, count=len(shingles))
+    # (a * x + b) mod p stays below 2**63 for 32-bit x and 31-bit a, b.
+    return ((np.outer(hashes, _A) + _B) % PRIME).min(axis=0).astype(np.uint32)
+
+
+def question_signature(question, answer=''):
+    return signature(question_shingles(question, answer))
+
+
+def band_keys(sig):
+    """One 64-bit bucket key per band."""
+    bands = np.ascontiguousarray(sig, dtype=np.uint32).reshape(BANDS, ROWS)
+    return np.array([int.from_bytes(hashlib.blake2b(b.tobytes(), digest_size=8).digest(), 'little')
+                     for b in bands], dtype=np.uint64)
+
+
+def similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity of two signatures."""
+    return float(np.mean(sig_a == sig_b))
+
+
+class LshIndex:
+    def __init__(self, capacity=256):
+        self.ids = []
+        self._sigs = np.zeros((capacity, NUM_PERM), dtype=np.uint32)
+        self._keys = np.zeros((capacity, BANDS), dtype=np.uint64)
+        self._buckets = [{} for _ in range(BANDS)]
+        self._rows = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, item_id):
+        return item_id in self._rows
+
+    @property
+    def signatures(self):
+        return self._sigs[:len(self.ids)]
+
+    def add(self, item_id, sig):
+        if item_id in self._rows:
+            return
+        row = len(self.ids)
+        if row == len(self._sigs):
+            self._sigs = np.concatenate([self._sigs, np.zeros_like(self._sigs)])
+            self._keys = np.concatenate([self._keys, np.zeros_like(self._keys)])
+        self._sigs[row] = sig
+        self._keys[row] = keys = band_keys(sig)
+        for band, key in enumerate(keys.tolist()):
+            self._buckets[band].setdefault(key, []).append(row)
+        self.ids.append(item_id)
+        self._rows[item_id] = row
+
+    def candidates(self, sig):
+        """Rows sharing at least one band bucket with ``sig``."""
+        rows = set()
+        for band, key in enumerate(band_keys(sig).tolist()):
+            rows.update(self._buckets[band].get(key, ()))
+        return sorted(rows)
+
+    def query(self, sig, threshold=0.7):
+        """``[(id, similarity)]`` of indexed items at least ``threshold`` similar, most similar first."""
+        rows = self.candidates(sig)
+        if not rows:
+            return []
+        sims = (self._sigs[rows] == np.asarray(sig, dtype=np.uint32)).mean(axis=1)
+        hits = [(self.ids[r], float(s)) for r, s in zip(rows, sims) if s >= threshold]
+        return sorted(hits, key=lambda h: -h[1])
@@ -0,0 +1,122 @@
+"""In-process registry for model artifacts.
+
+Each artifact is loaded from disk once per process and then served from
+memory.  A cheap ``os.stat`` check (at most every ``check_interval``
+seconds) notices when a file has been replaced; the content hash is only
+computed when size/mtime changed, and a new hash hot-swaps the artifact and
+bumps its version without a restart.
+"""
+import hashlib
+import os
+import pickle
+import threading
+import time
+
+
+def dump_artifact(obj, path):
+    """Pickle ``obj`` to ``path`` atomically so readers never see a partial file."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        pickle.dump(obj, f)
+    os.replace(tmp, path)
+
+
+def load_pickles(*paths):
+    """Default loader: unpickle every path, returning one object or a tuple."""
+    objs = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            objs.append(pickle.load(f))
+    return objs[0] if len(objs) == 1 else tuple(objs)
+
+
+def _file_signature(paths):
+    return tuple((st.st_size, st.st_mtime_ns) for st in (os.stat(p) for p in paths))
+
+
+def _content_hash(paths):
+    h = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+    return h.hexdigest()
+
+
+class _Entry:
+    def __init__(self, name, paths, loader, trainer):
+        self.name = name
+        self.paths = paths
+        self.loader = loader
+        self.trainer = trainer
+        self.lock = threading.Lock()
+        self.value = None
+        self.version = 0
+        self.sha256 = None
+        self.signature = None
+        self.loaded_at = None
+        self.checked_at = 0.0
+
+
+class ModelRegistry:
+    """Named artifacts, loaded lazily and refreshed when their files change."""
+
+    def __init__(self, check_interval=2.0):
+        self.check_interval = check_interval
+        self._entries = {}
+
+    def register(self, name, paths, loader=load_pickles, trainer=None):
+        """Register an artifact made of one or more files.
+
+        Multi-file artifacts (e.g. a classifier and its vectorizer) are
+        hashed and swapped together so callers never see a mismatched pair.
+        ``trainer`` is called to produce the files when they do not exist.
+        """
+        if isinstance(paths, str):
+            paths = (paths,)
+        self._entries[name] = _Entry(name, tuple(paths), loader, trainer)
+
+    def get(self, name):
+        entry = self._entries[name]
+        now = time.monotonic()
+        if entry.value is not None and now - entry.checked_at < self.check_interval:
+            return entry.value
+        with entry.lock:
+            if entry.value is None or now - entry.checked_at >= self.check_interval:
+                self._refresh(entry)
+                entry.checked_at = time.monotonic()
+        return entry.value
+
+    def _refresh(self, entry):
+        if not all(os.path.exists(p) for p in entry.paths):
+            if entry.trainer is None:
+                raise FileNotFoundError(f"Artifact files missing for {entry.name!r}: {entry.paths}")
+            entry.trainer()
+        signature = _file_signature(entry.paths)
+        if entry.value is not None and signature == entry.signature:
+            return
+        digest = _content_hash(entry.paths)
+        if entry.value is not None and digest == entry.sha256:
+            entry.signature = signature
+            return
+        entry.value = entry.loader(*entry.paths)
+        entry.signature = signature
+        entry.sha256 = digest
+        entry.version += 1
+        entry.loaded_at = time.time()
+
+    def warm(self, *names):
+        """Load the given artifacts (all registered ones by default) now."""
+        for name in names or list(self._entries):
+            self.get(name)
+
+    def versions(self):
+        return {
+            name: {'version': e.version, 'sha256': e.sha256[:12] if e.sha256 else None,
+                   'loaded_at': e.loaded_at}
+            for name, e in self._entries.items()
+        }
+
+
+registry = ModelRegistry()
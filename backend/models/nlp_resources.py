@@ -0,0 +1,83 @@
+"""Offline lookup of NLTK data files.
+
+Nothing is downloaded at import or request time.  Resources are looked up
+in the vendored ``backend/nltk_data`` directory, then ``$NLTK_DATA`` and
+NLTK's standard locations, without importing NLTK itself.  Fetch them at
+build time with ``python -m models.nlp_resources --download``; run without
+arguments to check what is installed.
+"""
+import os
+import sys
+import zipfile
+
+NLTK_DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'nltk_data')
+FALLBACK_STOPWORDS_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'stopwords_english.txt')
+
+# NLTK package name -> path inside an nltk_data directory
+RESOURCES = {'stopwords': 'corpora/stopwords'}
+
+
+def search_paths():
+    """NLTK data directories in lookup order (the vendored one first)."""
+    paths = [NLTK_DATA_DIR]
+    paths += [p for p in os.environ.get('NLTK_DATA', '').split(os.pathsep) if p]
+    paths.append(os.path.expanduser('~/nltk_data'))
+    paths += [os.path.join(sys.prefix, d) for d in ('nltk_data', 'share/nltk_data', 'lib/nltk_data')]
+    paths += ['/usr/share/nltk_data', '/usr/local/share/nltk_data',
+              '/usr/lib/nltk_data', '/usr/local/lib/nltk_data']
+    return paths
+
+
+def find_resource(name):
+    """Path of the installed resource directory or zip, or None."""
+    rel = RESOURCES[name]
+    for root in search_paths():
+        for candidate in (os.path.join(root, rel), os.path.join(root, rel) + '.zip'):
+            if os.path.exists(candidate):
+                return candidate
+    return None
+
+
+def missing_resources():
+    return [name for name in RESOURCES if find_resource(name) is None]
+
+
+def read_resource_file(name, member):
+    """Text of ``member`` inside resource ``name`` (e.g. stopwords/english), or None."""
+    path = find_resource(name)
+    if path is None:
+        return None
+    try:
+        if path.endswith('.zip'):
+            with zipfile.ZipFile(path) as zf:
+                return zf.read(f'{name}/{member}').decode('utf-8')
+        with open(os.path.join(path, member), encoding='utf-8') as f:
+            return f.read()
+    except (OSError, KeyError, zipfile.BadZipFile):
+        return None
+
+
+def load_stop_words():
+    """NLTK's English stopwords if installed, else the bundled list."""
+    text = read_resource_file('stopwords', 'english')
+    if text is None:
+        with open(FALLBACK_STOPWORDS_PATH, encoding='utf-8') as f:
+            text = f.read()
+    return frozenset(w.strip() for w in text.splitlines() if w.strip())
+
+
+def download(target=NLTK_DATA_DIR):
+    """Fetch every resource into ``target`` (build step; needs network)."""
+    import nltk
+    os.makedirs(target, exist_ok=True)
+    return all(nltk.download(name, download_dir=target, quiet=True) for name in RESOURCES)
+
+
+if __name__ == '__main__':
+    if '--download' in sys.argv[1:]:
+        if not download():
+            print('Download failed')
+            sys.exit(1)
+    for name in RESOURCES:
+        print(f'{name}: {find_resource(name) or "missing"}')
+    sys.exit(1 if missing_resources() else 0)
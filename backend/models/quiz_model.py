@@ -1,136 +1,197 @@
-from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
-from sklearn.linear_model import LogisticRegression
-from sklearn.cluster import KMeans
-import pickle
 import os
 import random
-from nltk.tokenize import sent_tokenize, word_tokenize
-
-MODEL_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'quiz_model.pkl')
-VECTORIZER_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'vectorizer.pkl')
-KMEANS_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'kmeans_model.pkl')
-TFIDF_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'tfidf_vectorizer.pkl')
-
-def train_quiz_models():
-    """Train models for difficulty classification."""
-    easy = ["What is 2+2?", "What is the capital of France?", "Define photosynthesis?"]
-    medium = ["Explain evolution?", "Describe quantum mechanics?", "What is mitosis?"]
-    
-    all_texts = easy + medium
-    all_labels = [0]*len(easy) + [1]*len(medium)
-    
-    os.makedirs(os.path.dirname(MODEL_PATH), exist_ok=True)
-    
-    vectorizer = CountVectorizer(max_features=100)
-    X = vectorizer.fit_transform(all_texts)
-    model = LogisticRegression(random_state=42, max_iter=200)
-    model.fit(X, all_labels)
-    
-    with open(MODEL_PATH, 'wb') as f:
-        pickle.dump(model, f)
-    with open(VECTORIZER_PATH, 'wb') as f:
-        pickle.dump(vectorizer, f)
-    
-    return model, vectorizer
+import re
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: single process, no lock needed
+    fcntl = None
+
+from models.model_registry import registry, dump_artifact, load_pickles
+from models.document_analysis import analyze_document
+from models.corpus_tfidf import score_sentences, get_corpus_model
+from models.distractor_index import subject_indexes, TermIndex, pick_distractors, is_candidate_term
+from models.topic_model import assign_topics, load_kmeans_model, train_kmeans_model
+
+BLANK = "_____"
+
+DIFFICULTY_MODEL_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'difficulty_model.pkl')
+HASH_FEATURES = 2 ** 18
+EASY_BELOW = 0.35   # P(answered wrong) under which a question is easy
+HARD_FROM = 0.65    # ... and from which it is hard
+
+# Questions the model starts from before any answers come in (label 1: likely answered wrong).
+SEED_QUESTIONS = [("What is 2+2?", 0), ("What is the capital of France?", 0), ("Define photosynthesis?", 0),
+                  ("Explain evolution?", 1), ("Describe quantum mechanics?", 1), ("What is mitosis?", 1)]
+
+_vectorizer = None
+
+
+def question_features(questions):
+    """Hashed word unigram/bigram features; stateless, so nothing is fitted or stored."""
+    global _vectorizer
+    if _vectorizer is None:
+        from sklearn.feature_extraction.text import HashingVectorizer
+        _vectorizer = HashingVectorizer(n_features=HASH_FEATURES, ngram_range=(1, 2), alternate_sign=False)
+    return _vectorizer.transform(questions)
+
+
+def train_quiz_models(path=DIFFICULTY_MODEL_PATH, reset=False):
+    """Create the difficulty model from the seed questions, unless one is already learning."""
+    from sklearn.linear_model import SGDClassifier
+    if os.path.exists(path) and not reset:
+        return load_pickles(path)
+    model = SGDClassifier(loss='log_loss', alpha=1e-4, random_state=42)
+    texts, labels = zip(*SEED_QUESTIONS)
+    for _ in range(5):
+        model.partial_fit(question_features(texts), labels, classes=[0, 1])
+    dump_artifact(model, path)
+    return model
 
 def load_quiz_models():
-    """Load or train models."""
-    if not os.path.exists(MODEL_PATH):
-        return train_quiz_models()
-    with open(MODEL_PATH, 'rb') as f:
-        model = pickle.load(f)
-    with open(VECTORIZER_PATH, 'rb') as f:
-        vectorizer = pickle.load(f)
-    return model, vectorizer
-
-def classify_difficulty(questions):
-    """Classify difficulty of questions."""
+    """Return the difficulty classifier from the model registry."""
+    return registry.get('quiz')
+
+def learn_difficulty(questions, wrong, path=DIFFICULTY_MODEL_PATH):
+    """Fold answered questions (``wrong``: 1 if answered wrongly) into the model on disk.
+
+    Runs under a file lock so concurrent workers apply their batches one
+    after another; every worker's registry then picks up the new file.
+    """
+    lock = open(path + '.lock', 'w')
     try:
-        model, vectorizer = load_quiz_models()
-        X = vectorizer.transform(questions)
-        preds = model.predict(X)
-        return ["easy" if p == 0 else "medium" for p in preds]
-    except:
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        model = load_pickles(path) if os.path.exists(path) else train_quiz_models(path)
+        model.partial_fit(question_features(questions), wrong, classes=[0, 1])
+        dump_artifact(model, path)
+    finally:
+        lock.close()
+    return len(questions)
+
+def difficulty_label(p_wrong):
+    if p_wrong < EASY_BELOW:
+        return "easy"
+    return "medium" if p_wrong < HARD_FROM else "hard"
+
+def classify_difficulty(questions, model=None):
+    """Classify difficulty of questions from the model's P(answered wrong)."""
+    try:
+        model = model or load_quiz_models()
+        p_wrong = model.predict_proba(question_features(questions))[:, 1]
+        return [difficulty_label(p) for p in p_wrong]
+    except Exception:
         return ["easy"] * len(questions)
 
-def train_kmeans_model():
-    """Train KMeans for topic clustering using training data."""
-    import csv
-    data_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'topic_training_data.csv')
-    sample_texts = []
-    with open(data_path, 'r') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            sample_texts.append(row['text'])
-
-    tfidf = TfidfVectorizer(max_features=100, stop_words='english')
-    X = tfidf.fit_transform(sample_texts)
-
-    kmeans = KMeans(n_clusters=4, random_state=42)
-    kmeans.fit(X)
-
-    KMEANS_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'kmeans_model.pkl')
-    TFIDF_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'tfidf_vectorizer.pkl')
-
-    with open(KMEANS_PATH, 'wb') as f:
-        pickle.dump(kmeans, f)
-    with open(TFIDF_PATH, 'wb') as f:
-        pickle.dump(tfidf, f)
-
-    return kmeans, tfidf
-
-def load_kmeans_model():
-    """Load or train KMeans model."""
-    if not os.path.exists(KMEANS_PATH):
-        return train_kmeans_model()
-    with open(KMEANS_PATH, 'rb') as f:
-        kmeans = pickle.load(f)
-    with open(TFIDF_PATH, 'rb') as f:
-        tfidf = pickle.load(f)
-    return kmeans, tfidf
-
-def generate_mcqs(text, num_questions=5):
-    """Generate multiple choice questions from text."""
+registry.register('quiz', DIFFICULTY_MODEL_PATH, trainer=train_quiz_models)
+
+# Coarse word classes by ending, so distractors look like the answer.
+KIND_SUFFIXES = (('verb', ('ing', 'ed')), ('adjective', ('al', 'ic', 'ous', 'ive', 'ful', 'able', 'ar')),
+                 ('plural', ('s',)))
+
+
+def _proper_nouns(analysis):
+    """Lowercase forms of terms only ever written capitalized, at least once mid-sentence."""
+    mid, lower = set(), set()
+    for toks in analysis.sentence_tokens:
+        for i, t in enumerate(toks):
+            if t[:1].isupper():
+                if i:
+                    mid.add(t.lower())
+            else:
+                lower.add(t)
+    return mid - lower
+
+
+def _term_kind(term, proper):
+    """``(proper noun?, word class)`` of a lowercase term."""
+    kind = next((k for k, endings in KIND_SUFFIXES
+                 if term.endswith(endings) and not term.endswith(('ss', 'us', 'is'))), 'noun')
+    return term in proper, kind
+
+
+def _pick_answer(tokens, model, rng):
+    """Most informative candidate term of a sentence (highest corpus IDF)."""
+    candidates = list(dict.fromkeys(t for t in tokens if is_candidate_term(t)))
+    if not candidates:
+        return None
+    idf = model.idf_for([t.lower() for t in candidates])
+    best = [c for c, v in zip(candidates, idf) if v == idf.max()]
+    return rng.choice(best)
+
+def generate_mcqs(text, num_questions=5, analysis=None, seed=None, subject=None):
+    """Generate fill-in-the-blank multiple choice questions from text.
+
+    Distractors are the answer's nearest neighbours in the subject's term
+    index (see models.distractor_index), then in an index of this document,
+    then the document's highest-IDF terms, all of the answer's kind; a
+    sentence with fewer than three distractors yields no question.  Options
+    are lowercase unless the answer is a proper noun.  Pass ``seed`` to make
+    answer and option order reproducible.  Topics come from the topic model,
+    labelling all source sentences in one batch.
+    """
+    rng = random.Random(seed)
     try:
-        sentences = sent_tokenize(text)
+        analysis = analysis or analyze_document(text)
+        sentences = analysis.sentences
         if len(sentences) < 3:
             return []
 
-        # Extract key sentences
-        tfidf = TfidfVectorizer(max_features=50, stop_words='english')
-        tfidf_matrix = tfidf.fit_transform(sentences)
-        scores = tfidf_matrix.sum(axis=1).A1
+        # Extract key sentences (IDF from the pre-fitted corpus model)
+        corpus = get_corpus_model()
+        scores = score_sentences(analysis, corpus)
         top_indices = scores.argsort()[-min(num_questions*2, len(sentences)):][::-1]
 
+        indexes = [subject_indexes.get(subject or "General")]
+        local_index = None
+        proper = _proper_nouns(analysis)
+        terms = [t for t in analysis.content_freq if is_candidate_term(t)]
+        idf = corpus.idf_for(terms)
+        ranked = [terms[i] for i in sorted(range(len(terms)), key=lambda i: (-idf[i], terms[i]))]
+
         questions = []
-        for idx in top_indices[:num_questions]:
+        seen = set()
+        for idx in top_indices:
+            if len(questions) == num_questions:
+                break
             sentence = sentences[idx].strip()
-            if len(sentence.split()) < 5:
+            if len(sentence.split()) < 5 or sentence in seen:
                 continue
+            seen.add(sentence)
 
-            # Simple question generation
-            question_text = sentence.replace('.', '?')
-            if not question_text.endswith('?'):
-                question_text += '?'
-
-            # Generate options (simplified)
-            words = word_tokenize(sentence)
-            correct_answer = random.choice(words) if words else "Answer"
-
-            # Wrong options
-            wrong_options = ["Option A", "Option B", "Option C"]
-            options = [correct_answer] + wrong_options[:3]
-            random.shuffle(options)
+            token = _pick_answer(analysis.sentence_tokens[idx], corpus, rng)
+            if token is None:
+                continue
+            key = token.lower()
+            # Capitalized only at the start of a sentence: show it (and the distractors) in lowercase.
+            correct_answer = token if key in proper else key
+            question_text = re.sub(r'\b%s\b' % re.escape(token), BLANK, sentence, count=1)
+
+            if local_index is None:
+                local_index = TermIndex()
+                local_index.add_analysis(analysis)
+                indexes.append(local_index)
+            kind = _term_kind(key, proper)
+            wrong_options = pick_distractors(correct_answer, analysis.sentence_lower[idx], indexes, n=3,
+                                             fallback=ranked, accept=lambda t: _term_kind(t, proper) == kind)
+            if len(wrong_options) < 3:
+                continue
+            options = [correct_answer] + wrong_options
+            rng.shuffle(options)
 
             question = {
                 "id": f"q_{len(questions)+1}",
                 "question": question_text,
                 "options": options,
                 "answer": correct_answer,
-                "topic": "General"
+                "topic": "General",
+                "source_sentence": int(idx)
             }
             questions.append(question)
 
+        topics = assign_topics([sentences[q["source_sentence"]] for q in questions])
+        for question, topic in zip(questions, topics):
+            question["topic"] = topic
         return questions
 
     except Exception as e:
@@ -0,0 +1,115 @@
+"""Graph-based extractive summarization (LexRank + MMR).
+
+Sentences become L2-normalised TF-IDF rows (IDF from the corpus model), the
+sentence-similarity graph is one sparse product ``X @ X.T``, and centrality
+is a NumPy power iteration over it.  Maximal Marginal Relevance then picks
+central sentences that do not repeat each other.  Long documents are
+summarized map-reduce style in fixed-size chunks so the similarity matrix
+never grows beyond ``CHUNK_SENTENCES``².
+"""
+import numpy as np
+from scipy.sparse import diags
+
+from models.corpus_tfidf import get_corpus_model
+
+CHUNK_SENTENCES = 300
+SIMILARITY_THRESHOLD = 0.1
+DAMPING = 0.85
+MMR_LAMBDA = 0.7
+REDUNDANCY_THRESHOLD = 0.8
+
+
+def sentence_vectors(analysis, model=None):
+    """L2-normalised TF-IDF sentence rows over the document vocabulary."""
+    model = model or get_corpus_model()
+    weights = model.idf_for(analysis.terms)
+    weights[~analysis.content_mask()] = 0
+    X = (analysis.sentence_term_matrix @ diags(weights)).tocsr()
+    norms = np.sqrt(np.asarray(X.multiply(X).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return (diags(1 / norms) @ X).tocsr()
+
+
+def similarity_graph(X, threshold=SIMILARITY_THRESHOLD):
+    """Sparse cosine-similarity graph without self loops or weak edges."""
+    S = (X @ X.T).tocsr()
+    S.setdiag(0)
+    S.data[S.data < threshold] = 0
+    S.eliminate_zeros()
+    return S
+
+
+def lexrank(S, damping=DAMPING, tol=1e-6, max_iter=100):
+    """Stationary centrality of each node of a similarity graph."""
+    n = S.shape[0]
+    if n == 0:
+        return np.zeros(0)
+    out = np.asarray(S.sum(axis=1)).ravel()
+    dangling = out == 0
+    out[dangling] = 1
+    M = (diags(1 / out) @ S).T.tocsr()
+    p = np.full(n, 1.0 / n)
+    for _ in range(max_iter):
+        nxt = damping * (M @ p + p[dangling].sum() / n) + (1 - damping) / n
+        if np.abs(nxt - p).sum() < tol:
+            return nxt
+        p = nxt
+    return p
+
+
+def mmr_select(scores, S, k, lam=MMR_LAMBDA, redundancy=REDUNDANCY_THRESHOLD):
+    """Pick ``k`` indices trading centrality off against similarity to earlier picks.
+
+    Near-duplicates of a pick (similarity above ``redundancy``) are only
+    chosen once every other sentence has been used.
+    """
+    n = len(scores)
+    k = min(k, n)
+    rel = scores / scores.max() if n and scores.max() > 0 else np.zeros(n)
+    max_sim = np.zeros(n)
+    chosen = np.zeros(n, dtype=bool)
+    picks = []
+    for _ in range(k):
+        mmr = lam * rel - (1 - lam) * max_sim
+        mmr[max_sim > redundancy] -= 2
+        mmr[chosen] = -np.inf
+        j = int(np.argmax(mmr))
+        picks.append(j)
+        chosen[j] = True
+        max_sim = np.maximum(max_sim, S[j].toarray().ravel())
+    return picks
+
+
+def _rank(X, rows, k):
+    S = similarity_graph(X[rows])
+    picks = mmr_select(lexrank(S), S, k)
+    return [rows[i] for i in picks]
+
+
+def select_sentences(analysis, k, chunk_size=CHUNK_SENTENCES, model=None):
+    """Indices (document order) of the ``k`` summary sentences."""
+    n = len(analysis.sentences)
+    if n <= k:
+        return list(range(n))
+    X = sentence_vectors(analysis, model)
+    rows = list(range(n))
+    if n > chunk_size and 2 * k > chunk_size:
+        # Long summaries: split the budget across chunks in proportion to their size.
+        bounds = list(range(0, n, chunk_size)) + [n]
+        quotas = np.diff(np.round(k * np.array(bounds) / n).astype(int))
+        return sorted(i for start, end, q in zip(bounds, bounds[1:], quotas) if q
+                      for i in _rank(X, rows[start:end], int(q)))
+    # Map: shortlist candidates per chunk; reduce: rank the shortlist until it fits one chunk.
+    while len(rows) > chunk_size:
+        per_chunk = max(k, chunk_size // 10)
+        rows = [i for start in range(0, len(rows), chunk_size)
+                for i in _rank(X, rows[start:start + chunk_size], per_chunk)]
+        rows.sort()
+    return sorted(_rank(X, rows, k))
+
+
+def summary_length(n_sentences, max_sentences=3, ratio=None):
+    """Number of sentences to keep: ``ratio`` of the document if given, else ``max_sentences``."""
+    if ratio is not None:
+        return max(1, int(round(n_sentences * ratio)))
+    return max_sentences
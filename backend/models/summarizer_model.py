@@ -1,5 +1,7 @@
 import os
 import pickle
+from models.document_analysis import analyze_document
+from models.summarization_engine import select_sentences, summary_length
 
 MODEL_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'summarizer.pkl')
 
@@ -9,19 +11,13 @@ def train_dummy_summarizer():
     with open(MODEL_PATH, 'wb') as f:
         pickle.dump({'trained': True}, f)
 
-def summarize_text(text, max_sentences=3):
-    """Extractive summarization: select most important sentences by word frequency."""
-    import re
-    from collections import Counter
-    sentences = re.split(r'(?<=[.!?]) +', text)
-    if len(sentences) <= max_sentences:
-        return ' '.join(sentences)
-    # Tokenize and count word frequencies
-    words = re.findall(r'\w+', text.lower())
-    freq = Counter(words)
-    # Score sentences by sum of word frequencies
-    scored = [(sum(freq[w.lower()] for w in re.findall(r'\w+', s)), i, s) for i, s in enumerate(sentences)]
-    # Select top N scored sentences, preserving order
-    top = sorted(scored, reverse=True)[:max_sentences]
-    top_sorted = sorted(top, key=lambda x: x[1])
-    return ' '.join(s for _, _, s in top_sorted)
+def summarize_text(text, max_sentences=3, analysis=None, ratio=None):
+    """Extractive summarization: central, non-redundant sentences (LexRank + MMR).
+
+    ``ratio`` (e.g. 0.2) sizes the summary relative to the document and
+    overrides ``max_sentences``.
+    """
+    analysis = analysis or analyze_document(text)
+    sentences = analysis.sentences
+    k = summary_length(len(sentences), max_sentences, ratio)
+    return ' '.join(sentences[i] for i in select_sentences(analysis, k))
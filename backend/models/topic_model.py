@@ -0,0 +1,219 @@
+"""Topic clusters for labelling generated questions.
+
+A TF-IDF vocabulary and a ``MiniBatchKMeans`` over it are fitted offline
+(``train_topics.py``) from ``topic_training_data.csv`` plus chunks of the
+stored notes.  New notes are folded into the existing clusters with
+``partial_fit``; once the corpus has grown well past what the vocabulary was
+fitted on, vocabulary and clusters are rebuilt from scratch.
+
+Each cluster is named after the terms that set its centroid apart from the
+others, so ``assign_topics`` turns a batch of questions into labels with one
+``transform`` and one ``predict``.  Names are pickled with the clusters and
+kept across updates (a rebuilt cluster inherits the name of the old cluster
+it most resembles), since progress aggregates are keyed by them.  Both
+pickles carry the id of the fit that produced them, so a reader caught
+between the two files of a rebuild notices the mismatch.
+"""
+import csv
+import json
+import os
+import uuid
+
+import numpy as np
+
+from models.model_registry import registry, dump_artifact, load_pickles
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'data')
+KMEANS_PATH = os.path.join(DATA_DIR, 'kmeans_model.pkl')
+TFIDF_PATH = os.path.join(DATA_DIR, 'tfidf_vectorizer.pkl')
+STATE_PATH = os.path.join(DATA_DIR, 'topic_model_state.json')
+TRAINING_PATH = os.path.join(DATA_DIR, 'topic_training_data.csv')
+GENERAL = 'General'
+MIN_TOPICS = 4
+MAX_TOPICS = 32
+CHUNKS_PER_TOPIC = 200    # a rebuild picks about one cluster per this many chunks
+MAX_FEATURES = 5000
+LABEL_TERMS = 2
+REBUILD_GROWTH = 1.0      # rebuild once chunks added since the last rebuild exceed this share of it
+MATCH_SIMILARITY = 0.5    # centroid cosine above which a rebuilt cluster keeps an old cluster's name
+
+
+def training_texts():
+    with open(TRAINING_PATH, newline='', encoding='utf-8') as f:
+        return [row['text'] for row in csv.DictReader(f) if row.get('text')]
+
+
+def topic_count(n_chunks):
+    return int(min(MAX_TOPICS, max(MIN_TOPICS, round(n_chunks / CHUNKS_PER_TOPIC))))
+
+
+def fit_topic_model(texts, n_topics=None, random_state=42):
+    """Fit a fresh ``(kmeans, tfidf)`` pair on ``texts``."""
+    from sklearn.cluster import MiniBatchKMeans
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    texts = list(texts)
+    tfidf = TfidfVectorizer(max_features=MAX_FEATURES, stop_words='english', sublinear_tf=True,
+                            min_df=2 if len(texts) >= 1000 else 1)
+    X = tfidf.fit_transform(texts)
+    n_topics = min(n_topics or topic_count(len(texts)), X.shape[0])
+    kmeans = MiniBatchKMeans(n_clusters=n_topics, random_state=random_state, n_init=3, batch_size=1024)
+    kmeans.fit(X)
+    kmeans.fit_id_ = tfidf.fit_id_ = uuid.uuid4().hex
+    kmeans.topic_labels_ = centroid_labels(kmeans, tfidf)
+    return kmeans, tfidf
+
+
+def read_state():
+    try:
+        with open(STATE_PATH, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'trained_through': '', 'chunks': 0, 'rebuilt_chunks': 0}
+
+
+def save_model(kmeans, tfidf, state):
+    # The vectorizer goes first: workers check that the pair matches before using it.
+    dump_artifact(tfidf, TFIDF_PATH)
+    dump_artifact(kmeans, KMEANS_PATH)
+    tmp = STATE_PATH + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmp, STATE_PATH)
+
+
+def train_kmeans_model():
+    """Fit the seed topic model from the training CSV alone."""
+    texts = training_texts()
+    kmeans, tfidf = fit_topic_model(texts)
+    save_model(kmeans, tfidf, {'trained_through': '', 'chunks': len(texts), 'rebuilt_chunks': len(texts)})
+    return kmeans, tfidf
+
+
+def update_topic_model(chunks, trained_through, rebuild=False, corpus=None, n_topics=None):
+    """Fold new note ``chunks`` into the saved topic model; returns the new state.
+
+    ``trained_through`` is the newest document timestamp they cover.  When
+    ``rebuild`` is set, or the chunks added since the last rebuild outgrow
+    ``REBUILD_GROWTH``, the model is refitted on ``corpus()`` (every chunk,
+    seeds included) instead, picking a new vocabulary and topic count.
+    """
+    state = read_state()
+    chunks = list(chunks)
+    model = load_pickles(KMEANS_PATH, TFIDF_PATH) if os.path.exists(KMEANS_PATH) else None
+    if model is not None and not same_fit(*model):
+        model = None  # a rebuild died between the two files
+    grown = state['chunks'] + len(chunks) - state['rebuilt_chunks']
+    if (rebuild or model is None or not hasattr(model[0], 'partial_fit')
+            or grown > REBUILD_GROWTH * state['rebuilt_chunks']):
+        texts = training_texts() + list(corpus() if corpus else chunks)
+        kmeans, tfidf = fit_topic_model(texts, n_topics)
+        if model is not None:
+            kmeans.topic_labels_ = carried_labels(kmeans, tfidf, *model)
+        state = {'trained_through': trained_through, 'chunks': len(texts), 'rebuilt_chunks': len(texts)}
+    else:
+        kmeans, tfidf = model
+        if chunks:
+            # Cluster i stays cluster i, so it keeps its name.
+            kmeans.topic_labels_ = topic_labels(kmeans, tfidf)
+            kmeans.partial_fit(tfidf.transform(chunks))
+        state = dict(state, trained_through=trained_through, chunks=state['chunks'] + len(chunks))
+    save_model(kmeans, tfidf, state)
+    state['topics'] = topic_labels(kmeans, tfidf)
+    return state
+
+
+def load_kmeans_model():
+    """Return the (kmeans, tfidf) pair from the model registry."""
+    return registry.get('topics')
+
+
+registry.register('topics', (KMEANS_PATH, TFIDF_PATH), trainer=train_kmeans_model)
+
+def same_fit(kmeans, tfidf):
+    """Whether the clusters were fitted over this vectorizer's vocabulary."""
+    return getattr(kmeans, 'fit_id_', None) == getattr(tfidf, 'fit_id_', None)
+
+
+_labels = (None, None)
+
+
+def topic_labels(kmeans, tfidf):
+    """The name of each cluster, e.g. ``"Neural / Learning"``."""
+    global _labels
+    labels = getattr(kmeans, 'topic_labels_', None)
+    if labels is not None:
+        return labels
+    if _labels[0] is not kmeans:
+        _labels = (kmeans, centroid_labels(kmeans, tfidf))  # pickled before names were stored
+    return _labels[1]
+
+
+def centroid_labels(kmeans, tfidf, clusters=None, taken=()):
+    """Name ``clusters`` (all by default) after their most distinctive centroid terms, avoiding ``taken``."""
+    centers = np.asarray(kmeans.cluster_centers_)
+    terms = tfidf.get_feature_names_out()
+    k = len(centers)
+    # How much more weight each centroid gives a term than the other centroids do on average.
+    distinct = centers - (centers.sum(axis=0) - centers) / max(k - 1, 1)
+    labels, taken = {}, set(taken)
+    for c in range(k) if clusters is None else clusters:
+        ranked = [terms[i] for i in np.argsort(-distinct[c]) if centers[c, i] > 0]
+        n = LABEL_TERMS
+        label = ' / '.join(t.title() for t in ranked[:n]) or GENERAL
+        while label in taken and n < len(ranked):
+            n += 1
+            label = ' / '.join(t.title() for t in ranked[:n])
+        labels[c] = label
+        taken.add(label)
+    return [labels[c] for c in sorted(labels)]
+
+
+def carried_labels(kmeans, tfidf, old_kmeans, old_tfidf):
+    """Names for a rebuilt model: each cluster takes the name of the old cluster its centroid matches.
+
+    Old and new centroids are compared by cosine over the terms both
+    vocabularies share; clusters without a match above ``MATCH_SIMILARITY``
+    are named afresh.
+    """
+    old_labels = topic_labels(old_kmeans, old_tfidf)
+    old_columns = old_tfidf.vocabulary_
+    shared = [(i, old_columns[t]) for i, t in enumerate(tfidf.get_feature_names_out()) if t in old_columns]
+    labels = [None] * len(kmeans.cluster_centers_)
+    if shared:
+        new_cols, old_cols = (list(c) for c in zip(*shared))
+        new = np.asarray(kmeans.cluster_centers_)[:, new_cols]
+        old = np.asarray(old_kmeans.cluster_centers_)[:, old_cols]
+        new = new / np.maximum(np.linalg.norm(new, axis=1, keepdims=True), 1e-12)
+        old = old / np.maximum(np.linalg.norm(old, axis=1, keepdims=True), 1e-12)
+        similarity = new @ old.T
+        used = set()
+        # Best pairs first, each old name going to one cluster at most.
+        for flat in np.argsort(-similarity, axis=None):
+            i, j = divmod(int(flat), similarity.shape[1])
+            if similarity[i, j] < MATCH_SIMILARITY:
+                break
+            if labels[i] is None and j not in used:
+                labels[i] = old_labels[j]
+                used.add(j)
+    unnamed = [i for i, label in enumerate(labels) if label is None]
+    for i, label in zip(unnamed, centroid_labels(kmeans, tfidf, unnamed, taken=[l for l in labels if l])):
+        labels[i] = label
+    return labels
+
+
+def assign_topics(texts, model=None):
+    """Topic label of each text, from one vectorized transform and predict; ``General`` without a match."""
+    texts = list(texts)
+    if not texts:
+        return []
+    try:
+        kmeans, tfidf = model or load_kmeans_model()
+        if not same_fit(kmeans, tfidf):
+            return [GENERAL] * len(texts)  # caught between the two files of a rebuild
+        X = tfidf.transform(texts)
+        clusters = kmeans.predict(X)
+        labels = topic_labels(kmeans, tfidf)
+        matched = np.diff(X.indptr) > 0
+        return [labels[c] if m else GENERAL for c, m in zip(clusters, matched)]
+    except Exception:
+        return [GENERAL] * len(texts)
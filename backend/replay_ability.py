@@ -0,0 +1,44 @@
+"""Rebuild ability estimates by replaying past quiz attempts.
+
+Resets the ability engine's user and item state and folds every attempt in,
+oldest first, exactly as ``/api/quiz/submit`` would have, in one transaction.
+An empty history is refused rather than wiping the current estimates.
+
+    python replay_ability.py                                  # from the attempt store
+    python replay_ability.py --history data/quiz_history.json # from a legacy JSON export
+"""
+import argparse
+import json
+import sys
+
+from services.ability_engine import AbilityStore, load_history
+from services.attempt_store import HISTORY_FILE, get_attempt_store
+from services.sqlite_db import default_db_path
+
+
+def store_history():
+    store = get_attempt_store()
+    return {user_id: store.get_attempts(user_id) for user_id in store.user_ids()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--history', default=None,
+                        help=f'replay a quiz_history.json (e.g. {HISTORY_FILE}) instead of the attempt store')
+    parser.add_argument('--db', default=None, help='SQLite file for the ability state (default: the app database)')
+    args = parser.parse_args(argv)
+
+    history = load_history(args.history) if args.history else store_history()
+    if not any(history.values()):
+        print(f'Nothing to replay from {args.history or "the attempt store"}; estimates left unchanged.',
+              file=sys.stderr)
+        return 1
+    abilities = AbilityStore(args.db or default_db_path())
+    replayed = abilities.replay(history)
+    users = {user_id: abilities.user_abilities(user_id) for user_id in history}
+    print(json.dumps({'attempts': replayed, 'users': len(users)}))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
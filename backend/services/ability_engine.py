@@ -0,0 +1,219 @@
+"""Online ability estimation (1PL / Rasch model with uncertainty).
+
+P(correct) = sigmoid(theta - beta) for a user's ability ``theta`` in a
+subject and an item's difficulty ``beta``.  Both carry a variance; each
+answered question is one Laplace-approximate Bayesian update of the user and
+the item (an Elo update whose step size shrinks as evidence accumulates), so
+a submit costs O(1) per answer and never reads the user's history.  A little
+drift is added to the user's variance per attempt so the estimate can follow
+real learning.
+
+State is one row per (user, subject) and one per item.  Items are bank
+questions (``question_id``) or, for free-form answers, a hash of the question
+text and correct answer.
+"""
+import hashlib
+import json
+import math
+import os
+import threading
+from datetime import datetime
+
+from services.progress_aggregates import is_correct
+from services.sqlite_db import SqliteDatabase, default_db_path
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ability_users (
+    user_id    TEXT NOT NULL,
+    subject    TEXT NOT NULL,
+    theta      REAL NOT NULL,
+    variance   REAL NOT NULL,
+    theta_slow REAL NOT NULL,
+    answers    INTEGER NOT NULL,
+    attempts   INTEGER NOT NULL,
+    updated_at TEXT,
+    PRIMARY KEY (user_id, subject)
+);
+CREATE TABLE IF NOT EXISTS ability_items (
+    item_id  TEXT PRIMARY KEY,
+    subject  TEXT NOT NULL,
+    beta     REAL NOT NULL,
+    variance REAL NOT NULL,
+    answers  INTEGER NOT NULL,
+    correct  INTEGER NOT NULL
+);
+"""
+PRIOR_VARIANCE = 1.0
+ITEM_PRIOR_VARIANCE = 0.5
+MIN_VARIANCE = 0.02
+DRIFT = 0.02          # user variance added per attempt
+SLOW_RATE = 0.2       # weight of the newest theta in the trend baseline
+TREND_MARGIN = 0.1    # logits between theta and its baseline that count as a trend
+Z_95 = 1.96
+INITIAL_BETA = {'easy': -0.5, 'medium': 0.0, 'hard': 0.5}
+
+
+def sigmoid(x):
+    return 1.0 / (1.0 + math.exp(-x))
+
+
+def item_key(answer, subject):
+    if answer.get('question_id'):
+        return str(answer['question_id'])
+    text = f"{subject}\0{answer.get('question', '')}\0{answer.get('correct_answer', '')}"
+    return 'h_' + hashlib.sha256(text.encode('utf-8')).hexdigest()[:24]
+
+
+def new_user():
+    return {'theta': 0.0, 'variance': PRIOR_VARIANCE, 'theta_slow': 0.0, 'answers': 0, 'attempts': 0}
+
+
+def new_item(difficulty=None):
+    return {'beta': INITIAL_BETA.get(difficulty, 0.0), 'variance': ITEM_PRIOR_VARIANCE, 'answers': 0, 'correct': 0}
+
+
+def update(user, item, correct):
+    """Fold one answer into ``user`` and ``item`` in place; returns P(correct) before it."""
+    p = sigmoid(user['theta'] - item['beta'])
+    info = p * (1 - p)
+    residual = (1.0 if correct else 0.0) - p
+    user['variance'] = max(1.0 / (1.0 / user['variance'] + info), MIN_VARIANCE)
+    item['variance'] = max(1.0 / (1.0 / item['variance'] + info), MIN_VARIANCE)
+    user['theta'] += user['variance'] * residual
+    item['beta'] -= item['variance'] * residual
+    user['answers'] += 1
+    item['answers'] += 1
+    item['correct'] += int(bool(correct))
+    return p
+
+
+def start_attempt(user):
+    user['variance'] = min(user['variance'] + DRIFT, PRIOR_VARIANCE)
+
+
+def finish_attempt(user):
+    user['attempts'] += 1
+    user['theta_slow'] += SLOW_RATE * (user['theta'] - user['theta_slow'])
+
+
+def trend(user):
+    if user['attempts'] < 2:
+        return 'stable'
+    delta = user['theta'] - user['theta_slow']
+    if delta > TREND_MARGIN:
+        return 'improving'
+    if delta < -TREND_MARGIN:
+        return 'declining'
+    return 'stable'
+
+
+def summary(user):
+    """Ability as expected accuracy (%) on an average item, with a 95% interval."""
+    sd = math.sqrt(user['variance'])
+    return {
+        'ability': round(sigmoid(user['theta']) * 100, 1),
+        'ability_ci': [round(sigmoid(user['theta'] - Z_95 * sd) * 100, 1),
+                       round(sigmoid(user['theta'] + Z_95 * sd) * 100, 1)],
+        'theta': round(user['theta'], 3),
+        'theta_sd': round(sd, 3),
+        'trend': trend(user),
+        'answers': user['answers'],
+        'attempts': user['attempts'],
+    }
+
+
+class AbilityStore:
+    def __init__(self, path):
+        self.db = SqliteDatabase(path, SCHEMA)
+
+    @staticmethod
+    def _load_user(conn, user_id, subject):
+        row = conn.execute('SELECT theta, variance, theta_slow, answers, attempts FROM ability_users '
+                           'WHERE user_id = ? AND subject = ?', (user_id, subject)).fetchone()
+        return dict(row) if row else new_user()
+
+    def record_attempt(self, user_id, subject, answers, correct=0, total=0, timestamp=None):
+        """Update the user and items from one quiz attempt; returns ``summary(user)``.
+
+        An attempt without per-answer detail counts as ``total`` answers (of
+        which ``correct`` were right) to a fresh average item.
+        """
+        with self.db.transaction() as conn:
+            return self._record(conn, user_id, subject, answers, correct, total, timestamp)
+
+    def _record(self, conn, user_id, subject, answers, correct, total, timestamp):
+        user = self._load_user(conn, user_id, subject)
+        start_attempt(user)
+        items = {}
+        for a in answers:
+            key = item_key(a, subject)
+            if key not in items:
+                row = conn.execute('SELECT beta, variance, answers, correct FROM ability_items '
+                                   'WHERE item_id = ?', (key,)).fetchone()
+                items[key] = dict(row) if row else new_item(a.get('difficulty'))
+            update(user, items[key], is_correct(a))
+        if not answers:
+            for i in range(total):
+                update(user, new_item(), i < correct)
+        finish_attempt(user)
+        conn.execute(
+            'INSERT OR REPLACE INTO ability_users (user_id, subject, theta, variance, theta_slow, answers, '
+            'attempts, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (user_id, subject, user['theta'], user['variance'], user['theta_slow'], user['answers'],
+             user['attempts'], timestamp or datetime.now().isoformat()))
+        conn.executemany(
+            'INSERT OR REPLACE INTO ability_items (item_id, subject, beta, variance, answers, correct) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            [(key, subject, it['beta'], it['variance'], it['answers'], it['correct'])
+             for key, it in items.items()])
+        return summary(user)
+
+    def user_abilities(self, user_id):
+        """``{subject: summary}`` for every subject the user has answered in."""
+        rows = self.db.connect().execute(
+            'SELECT subject, theta, variance, theta_slow, answers, attempts FROM ability_users WHERE user_id = ?',
+            (user_id,)).fetchall()
+        return {r['subject']: summary(dict(r)) for r in rows}
+
+    def item(self, item_id):
+        row = self.db.connect().execute('SELECT * FROM ability_items WHERE item_id = ?', (item_id,)).fetchone()
+        return dict(row) if row else None
+
+    def replay(self, history):
+        """Rebuild all state from ``{user_id: [attempt, ...]}``, oldest attempt first.
+
+        The reset and the replay are one transaction, so live submits wait
+        for it rather than interleave.  An empty history raises ``ValueError``
+        instead of wiping every estimate.
+        """
+        attempts = sorted(((a.get('timestamp') or '', user_id, a) for user_id, items in history.items()
+                           for a in items), key=lambda t: t[0])
+        if not attempts:
+            raise ValueError('no attempts to replay')
+        with self.db.transaction() as conn:
+            conn.execute('DELETE FROM ability_users')
+            conn.execute('DELETE FROM ability_items')
+            for timestamp, user_id, a in attempts:
+                self._record(conn, user_id, a.get('subject', 'General'), a.get('answers') or [],
+                             a.get('correct', 0), a.get('total', 0), timestamp or None)
+        return len(attempts)
+
+
+def load_history(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_ability_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = AbilityStore(default_db_path())
+    return _store
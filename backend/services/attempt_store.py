@@ -0,0 +1,398 @@
+"""Quiz attempt persistence.
+
+Attempts used to live in one ``quiz_history.json`` blob that every submit
+parsed and rewrote.  The store interface below keeps that layout available
+(``JsonAttemptStore``) but the default backend is SQLite: one row per
+attempt, WAL journaling so concurrent gunicorn workers do not clobber each
+other, and an index on (user_id, subject, timestamp) so per-user reads never
+touch other users' history.
+
+The SQLite store also keeps the materialized aggregates from
+``services.progress_aggregates`` up to date in the same transaction as the
+attempt insert.
+"""
+import json
+import os
+import threading
+
+from config import Config
+from services import progress_aggregates as agg_lib
+from services.sqlite_db import SqliteDatabase, sqlite_path_from_uri
+
+BACKEND_DIR = os.path.join(os.path.dirname(__file__), '..')
+HISTORY_FILE = os.path.join(BACKEND_DIR, 'data', 'quiz_history.json')
+AGGREGATES_VERSION = '1'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS attempts (
+    id        INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id   TEXT    NOT NULL,
+    subject   TEXT    NOT NULL,
+    accuracy  REAL    NOT NULL,
+    correct   INTEGER NOT NULL,
+    total     INTEGER NOT NULL,
+    timestamp TEXT    NOT NULL,
+    answers   TEXT    NOT NULL DEFAULT '[]'
+);
+CREATE INDEX IF NOT EXISTS idx_attempts_user_subject_ts
+    ON attempts (user_id, subject, timestamp);
+CREATE INDEX IF NOT EXISTS idx_attempts_user_ts
+    ON attempts (user_id, timestamp);
+CREATE TABLE IF NOT EXISTS subject_aggregates (
+    user_id        TEXT    NOT NULL,
+    subject        TEXT    NOT NULL,
+    attempts       INTEGER NOT NULL,
+    sum_accuracy   REAL    NOT NULL,
+    correct        INTEGER NOT NULL,
+    total          INTEGER NOT NULL,
+    min_accuracy   REAL,
+    max_accuracy   REAL,
+    recent         TEXT    NOT NULL,
+    last_timestamp TEXT,
+    PRIMARY KEY (user_id, subject)
+);
+CREATE TABLE IF NOT EXISTS topic_aggregates (
+    user_id TEXT    NOT NULL,
+    subject TEXT    NOT NULL,
+    topic   TEXT    NOT NULL,
+    correct INTEGER NOT NULL,
+    total   INTEGER NOT NULL,
+    PRIMARY KEY (user_id, subject, topic)
+);
+CREATE TABLE IF NOT EXISTS store_meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class AttemptStore:
+    """Interface shared by all attempt backends."""
+
+    def add_attempt(self, user_id, attempt):
+        """Persist one attempt and return the updated subject aggregate."""
+        raise NotImplementedError
+
+    def add_attempts(self, user_id, attempts):
+        for attempt in attempts:
+            self.add_attempt(user_id, attempt)
+
+    def get_attempts(self, user_id, subject=None):
+        """Return a user's attempts (optionally for one subject), oldest first."""
+        raise NotImplementedError
+
+    def user_summary(self, user_id):
+        """Return (attempt_count, mean_accuracy) for a user."""
+        attempts = self.get_attempts(user_id)
+        if not attempts:
+            return 0, 0.0
+        return len(attempts), sum(a['accuracy'] for a in attempts) / len(attempts)
+
+    def count_since(self, user_id, since):
+        """Count a user's attempts with an ISO timestamp >= ``since``."""
+        return sum(1 for a in self.get_attempts(user_id) if a['timestamp'] >= since)
+
+    def user_ids(self):
+        raise NotImplementedError
+
+    def subject_aggregates(self, user_id):
+        """Return {subject: aggregate} for a user."""
+        aggregates = {}
+        for a in self.get_attempts(user_id):
+            agg_lib.fold_attempt(aggregates.setdefault(a['subject'], agg_lib.empty_aggregate()), a)
+        return aggregates
+
+    def subject_aggregate(self, user_id, subject):
+        return self.subject_aggregates(user_id).get(subject) or agg_lib.empty_aggregate()
+
+    def topic_aggregates(self, user_id):
+        """Return {subject: {topic: {correct, total}}} for a user."""
+        topics = {}
+        for a in self.get_attempts(user_id):
+            agg_lib.merge_topic_counts(topics.setdefault(a['subject'], {}),
+                                       agg_lib.topic_counts(a.get('answers', []), a['subject']))
+        return topics
+
+
+class JsonAttemptStore(AttemptStore):
+    """Legacy single-file store; every write rewrites the whole file."""
+
+    def __init__(self, path=HISTORY_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                return json.load(f)
+        return {}
+
+    def _save(self, history):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(history, f)
+        os.replace(tmp, self.path)
+
+    def add_attempt(self, user_id, attempt):
+        self.add_attempts(user_id, [attempt])
+        return self.subject_aggregate(user_id, attempt['subject'])
+
+    def add_attempts(self, user_id, attempts):
+        with self._lock:
+            history = self._load()
+            history.setdefault(user_id, []).extend(attempts)
+            self._save(history)
+
+    def get_attempts(self, user_id, subject=None):
+        attempts = self._load().get(user_id, [])
+        if subject is not None:
+            attempts = [a for a in attempts if a['subject'] == subject]
+        return attempts
+
+    def user_ids(self):
+        return list(self._load().keys())
+
+
+class SqliteAttemptStore(AttemptStore):
+    """One row per attempt in SQLite (WAL mode), indexed per user."""
+
+    def __init__(self, path):
+        self.path = path
+        self.db = SqliteDatabase(path, SCHEMA)
+        with self.db.transaction() as conn:
+            row = conn.execute("SELECT value FROM store_meta WHERE key = 'aggregates_version'").fetchone()
+            if not row or row[0] != AGGREGATES_VERSION:
+                self._rebuild_aggregates(conn)
+
+    def close(self):
+        self.db.close()
+
+    def journal_mode(self):
+        return self.db.connect().execute('PRAGMA journal_mode').fetchone()[0]
+
+    @staticmethod
+    def _row_values(user_id, attempt):
+        return (
+            user_id, attempt['subject'], float(attempt['accuracy']),
+            int(attempt['correct']), int(attempt['total']), attempt['timestamp'],
+            json.dumps(attempt.get('answers', [])),
+        )
+
+    def add_attempt(self, user_id, attempt):
+        with self.db.transaction() as conn:
+            return self._insert(conn, user_id, attempt)
+
+    def add_attempts(self, user_id, attempts):
+        with self.db.transaction() as conn:
+            for attempt in attempts:
+                self._insert(conn, user_id, attempt)
+
+    def _insert(self, conn, user_id, attempt):
+        conn.execute(
+            'INSERT INTO attempts (user_id, subject, accuracy, correct, total, timestamp, answers) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            self._row_values(user_id, attempt))
+        subject = attempt['subject']
+        row = conn.execute('SELECT * FROM subject_aggregates WHERE user_id = ? AND subject = ?',
+                           (user_id, subject)).fetchone()
+        agg = agg_lib.fold_attempt(self._to_aggregate(row) if row else agg_lib.empty_aggregate(), attempt)
+        self._write_aggregate(conn, user_id, subject, agg)
+        counts = agg_lib.topic_counts(attempt.get('answers', []), subject)
+        conn.executemany(
+            'INSERT INTO topic_aggregates (user_id, subject, topic, correct, total) VALUES (?, ?, ?, ?, ?) '
+            'ON CONFLICT (user_id, subject, topic) DO UPDATE SET '
+            'correct = correct + excluded.correct, total = total + excluded.total',
+            [(user_id, subject, t, c['correct'], c['total']) for t, c in counts.items()])
+        return agg
+
+    @staticmethod
+    def _to_aggregate(row):
+        return {
+            'attempts': row['attempts'], 'sum_accuracy': row['sum_accuracy'],
+            'correct': row['correct'], 'total': row['total'],
+            'min_accuracy': row['min_accuracy'], 'max_accuracy': row['max_accuracy'],
+            'recent': json.loads(row['recent']), 'last_timestamp': row['last_timestamp'],
+        }
+
+    @staticmethod
+    def _write_aggregate(conn, user_id, subject, agg):
+        conn.execute(
+            'INSERT OR REPLACE INTO subject_aggregates (user_id, subject, attempts, sum_accuracy, correct, '
+            'total, min_accuracy, max_accuracy, recent, last_timestamp) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (user_id, subject, agg['attempts'], agg['sum_accuracy'], agg['correct'], agg['total'],
+             agg['min_accuracy'], agg['max_accuracy'], json.dumps(agg['recent']), agg['last_timestamp']))
+
+    @staticmethod
+    def _to_attempt(row):
+        return {
+            'subject': row['subject'], 'accuracy': row['accuracy'],
+            'correct': row['correct'], 'total': row['total'],
+            'timestamp': row['timestamp'], 'answers': json.loads(row['answers']),
+        }
+
+    def get_attempts(self, user_id, subject=None):
+        conn = self.db.connect()
+        if subject is None:
+            rows = conn.execute(
+                'SELECT * FROM attempts WHERE user_id = ? ORDER BY timestamp, id', (user_id,))
+        else:
+            rows = conn.execute(
+                'SELECT * FROM attempts WHERE user_id = ? AND subject = ? ORDER BY timestamp, id',
+                (user_id, subject))
+        return [self._to_attempt(r) for r in rows]
+
+    def user_summary(self, user_id):
+        count, total = self.db.connect().execute(
+            'SELECT SUM(attempts), SUM(sum_accuracy) FROM subject_aggregates WHERE user_id = ?',
+            (user_id,)).fetchone()
+        return (count, total / count) if count else (0, 0.0)
+
+    def count_since(self, user_id, since):
+        return self.db.connect().execute(
+            'SELECT COUNT(*) FROM attempts WHERE user_id = ? AND timestamp >= ?',
+            (user_id, since)).fetchone()[0]
+
+    def user_ids(self):
+        return [r[0] for r in self.db.connect().execute('SELECT DISTINCT user_id FROM attempts')]
+
+    def subject_aggregates(self, user_id):
+        rows = self.db.connect().execute(
+            'SELECT * FROM subject_aggregates WHERE user_id = ? ORDER BY rowid', (user_id,))
+        return {r['subject']: self._to_aggregate(r) for r in rows}
+
+    def subject_aggregate(self, user_id, subject):
+        row = self.db.connect().execute(
+            'SELECT * FROM subject_aggregates WHERE user_id = ? AND subject = ?', (user_id, subject)).fetchone()
+        return self._to_aggregate(row) if row else agg_lib.empty_aggregate()
+
+    def topic_aggregates(self, user_id):
+        topics = {}
+        for r in self.db.connect().execute(
+                'SELECT subject, topic, correct, total FROM topic_aggregates WHERE user_id = ?', (user_id,)):
+            topics.setdefault(r['subject'], {})[r['topic']] = {'correct': r['correct'], 'total': r['total']}
+        return topics
+
+    def _replay(self, conn):
+        """Yield (user_id, subject, aggregate, topic_counts) recomputed from raw attempts."""
+        current, agg, topics = None, None, None
+        rows = conn.execute('SELECT * FROM attempts ORDER BY user_id, subject, timestamp, id')
+        for row in rows:
+            key = (row['user_id'], row['subject'])
+            if key != current:
+                if current is not None:
+                    yield current[0], current[1], agg, topics
+                current, agg, topics = key, agg_lib.empty_aggregate(), {}
+            attempt = self._to_attempt(row)
+            agg_lib.fold_attempt(agg, attempt)
+            agg_lib.merge_topic_counts(topics, agg_lib.topic_counts(attempt['answers'], attempt['subject']))
+        if current is not None:
+            yield current[0], current[1], agg, topics
+
+    def _rebuild_aggregates(self, conn):
+        # Materialize first: the replay cursor must be exhausted before we write.
+        groups = list(self._replay(conn))
+        conn.execute('DELETE FROM subject_aggregates')
+        conn.execute('DELETE FROM topic_aggregates')
+        for user_id, subject, agg, topics in groups:
+            self._write_aggregate(conn, user_id, subject, agg)
+            conn.executemany(
+                'INSERT INTO topic_aggregates (user_id, subject, topic, correct, total) VALUES (?, ?, ?, ?, ?)',
+                [(user_id, subject, t, c['correct'], c['total']) for t, c in topics.items()])
+        conn.execute("INSERT OR REPLACE INTO store_meta (key, value) VALUES ('aggregates_version', ?)",
+                     (AGGREGATES_VERSION,))
+        return len(groups)
+
+    def rebuild_aggregates(self):
+        """Recompute every aggregate from the raw attempts; returns groups rebuilt."""
+        with self.db.transaction() as conn:
+            return self._rebuild_aggregates(conn)
+
+    def check_aggregates(self):
+        """Compare stored aggregates with a fresh replay; returns drifted (user_id, subject) keys."""
+        conn = self.db.connect()
+        drifted = []
+        seen = set()
+        for user_id, subject, agg, topics in self._replay(conn):
+            seen.add((user_id, subject))
+            stored = self.subject_aggregates(user_id).get(subject)
+            stored_topics = self.topic_aggregates(user_id).get(subject, {})
+            if stored is None or agg_lib.aggregates_differ(stored, agg) or stored_topics != topics:
+                drifted.append((user_id, subject))
+        for r in conn.execute('SELECT user_id, subject FROM subject_aggregates'):
+            if (r['user_id'], r['subject']) not in seen:
+                drifted.append((r['user_id'], r['subject']))
+        return drifted
+
+    def get_meta(self, key):
+        row = self.db.connect().execute('SELECT value FROM store_meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def migrate_json_history(self, history_file=HISTORY_FILE):
+        """One-shot import of ``quiz_history.json``; returns rows imported.
+
+        The import and its "done" marker are written in a single transaction,
+        so two workers booting at once cannot import the file twice.
+        """
+        if not os.path.exists(history_file):
+            return 0
+        with self.db.transaction() as conn:
+            if conn.execute("SELECT 1 FROM store_meta WHERE key = 'json_migrated'").fetchone():
+                return 0
+            with open(history_file) as f:
+                history = json.load(f)
+            rows = [self._row_values(user_id, a)
+                    for user_id, attempts in history.items() for a in attempts]
+            conn.executemany(
+                'INSERT INTO attempts (user_id, subject, accuracy, correct, total, timestamp, answers) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+            conn.execute("INSERT INTO store_meta (key, value) VALUES ('json_migrated', ?)",
+                         (os.path.abspath(history_file),))
+            self._rebuild_aggregates(conn)
+            return len(rows)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def create_attempt_store(uri=None):
+    """Build the store configured by ``ATTEMPT_STORE`` / ``SQLALCHEMY_DATABASE_URI``."""
+    if os.environ.get('ATTEMPT_STORE', 'sqlite') == 'json':
+        return JsonAttemptStore()
+    return SqliteAttemptStore(sqlite_path_from_uri(uri or Config.SQLALCHEMY_DATABASE_URI))
+
+
+def get_attempt_store():
+    """Process-wide attempt store singleton."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = create_attempt_store()
+    return _store
+
+
+if __name__ == '__main__':
+    import sys
+    command = sys.argv[1] if len(sys.argv) > 1 else ''
+    if command not in ('migrate', 'rebuild-aggregates', 'check-aggregates'):
+        print('usage: python -m services.attempt_store migrate [quiz_history.json]\n'
+              '       python -m services.attempt_store rebuild-aggregates\n'
+              '       python -m services.attempt_store check-aggregates')
+        sys.exit(1)
+    store = create_attempt_store()
+    if not isinstance(store, SqliteAttemptStore):
+        print('This command needs the SQLite store')
+        sys.exit(1)
+    if command == 'migrate':
+        source = sys.argv[2] if len(sys.argv) > 2 else HISTORY_FILE
+        print(f'Imported {store.migrate_json_history(source)} attempts into {store.path}')
+    elif command == 'rebuild-aggregates':
+        print(f'Rebuilt aggregates for {store.rebuild_aggregates()} user/subject pairs')
+    else:
+        drifted = store.check_aggregates()
+        for user_id, subject in drifted:
+            print(f'drift: user={user_id} subject={subject}')
+        print(f'{len(drifted)} drifted aggregate(s)')
+        sys.exit(1 if drifted else 0)
@@ -0,0 +1,224 @@
+"""Batch ingestion of reading lists (``POST /api/parse/batch``).
+
+Items of mixed types are extracted concurrently by a shared thread pool with
+``parse_source``; URLs to the same host take turns through a per-host
+semaphore, and the whole batch shares one deadline.  Results are yielded as
+NDJSON lines in completion order, one per item, followed by a summary line.
+Items go through the same result cache as ``/api/parse``, so a source parsed
+either way is not fetched again while its entry is live, and PDFs already in
+the document store are not extracted again.  Stored notes are queued for
+search and related-notes indexing on the ingestion runner's pool.
+
+Spooled PDF uploads belong to ``run`` once it starts; the route discards
+those of a response that is closed before it is iterated.
+"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FutureTimeout
+from urllib.parse import urlsplit
+
+from config import Config
+from services.result_cache import cache_key
+
+SOURCES = ('text', 'url', 'youtube', 'pdf')
+ITEM_FIELDS = ('source', 'url', 'content', 'file', 'pages')
+
+
+def validate_items(raw, max_items):
+    """Normalize a request's ``items``; a bare string is a URL item."""
+    if not isinstance(raw, list) or not raw:
+        raise ValueError('items must be a non-empty list')
+    if len(raw) > max_items:
+        raise ValueError(f'At most {max_items} items per batch')
+    items = []
+    for i, item in enumerate(raw):
+        if isinstance(item, str):
+            item = {'source': 'url', 'url': item}
+        if not isinstance(item, dict) or item.get('source', 'text') not in SOURCES:
+            raise ValueError(f'Item {i}: source must be one of {", ".join(SOURCES)}')
+        # Only client fields: pdf_path/digest/error are set by the server.
+        item = {k: item[k] for k in ITEM_FIELDS if item.get(k) is not None}
+        items.append(dict(item, source=item.get('source', 'text')))
+    return items
+
+
+def item_host(item):
+    if item['source'] in ('url', 'youtube'):
+        return urlsplit(item.get('url') or '').netloc.lower() or None
+    return None
+
+
+def item_cache_key(item):
+    """The ``/api/parse`` cache key for an item (PDFs need their upload ``digest``)."""
+    if item['source'] == 'pdf':
+        return cache_key('parse', item.get('digest', ''), source='pdf', pages=item.get('pages'))
+    value = item.get('content', '') if item['source'] == 'text' else item.get('url', '')
+    return cache_key('parse', value, source=item['source'])
+
+
+def discard_spool(item):
+    """Remove an item's spooled upload, if it still has one."""
+    if item.get('pdf_path'):
+        try:
+            os.remove(item['pdf_path'])
+        except OSError:
+            pass
+
+
+def discard_unclaimed(items):
+    """Remove the spooled uploads of items no ``run`` has taken over."""
+    for item in items:
+        if not item.get('claimed'):
+            discard_spool(item)
+
+
+class BatchIngestor:
+    def __init__(self, nlp, documents, cache=None, workers=8, per_host=2, deadline=120.0, indexer=None):
+        self.nlp = nlp
+        self.documents = documents
+        self.cache = cache
+        self.indexer = indexer  # an IngestionRunner: ``index(user_id, subject, doc_id, text)`` queues the notes
+        self.per_host = per_host
+        self.deadline = deadline
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='batch')
+        self._hosts = {}  # host -> [semaphore, items holding or waiting on it]
+        self._hosts_lock = threading.Lock()
+
+    def _enter_host(self, host):
+        with self._hosts_lock:
+            entry = self._hosts.setdefault(host, [threading.BoundedSemaphore(self.per_host), 0])
+            entry[1] += 1
+            return entry[0]
+
+    def _leave_host(self, host):
+        # Hosts are only tracked while items for them are in flight, so the map stays small.
+        with self._hosts_lock:
+            entry = self._hosts[host]
+            entry[1] -= 1
+            if not entry[1]:
+                del self._hosts[host]
+
+    def _extract(self, item):
+        """``(text, page_count)``; the page count is None unless the item is a PDF."""
+        from services.notes_service import parse_source
+        from services.pdf_extraction import extract_pdf
+        if item.get('pdf_path'):
+            text, report = extract_pdf(item['pdf_path'], item.get('pages'))
+            return text, report['pages']
+        return parse_source(item['source'], notes=item.get('content'), url=item.get('url'),
+                            youtube_url=item.get('url')), None
+
+    def _ingest(self, item, subject, deadline_at):
+        """Parse and index one item; returns the ``/api/parse`` result dict."""
+        from services import nlp_tasks
+        if item.get('error'):
+            raise ValueError(item['error'])
+        key = item_cache_key(item)
+        result = self.cache.get(key) if self.cache else None
+        if result is not None:
+            # As in /api/parse: bring back the document if it was evicted, and count the hit as a use.
+            result['document_id'] = self.documents.put(result['text'], subject, item['source'], result['keywords'],
+                                                       upload=item.get('digest'), pages=item.get('pages'),
+                                                       cache_key=key)
+            return result
+        doc = self.documents.find_upload(item['digest'], item.get('pages')) if item.get('digest') else None
+        if doc is not None:
+            return {'text': doc['text'], 'word_count': doc['word_count'], 'keywords': doc['keywords'],
+                    'document_id': doc['id']}
+        host = item_host(item)
+        if host:
+            slot = self._enter_host(host)
+            try:
+                if not slot.acquire(timeout=max(deadline_at - time.monotonic(), 0)):
+                    raise TimeoutError('Batch deadline exceeded')
+                try:
+                    text, page_count = self._extract(item)
+                finally:
+                    slot.release()
+            finally:
+                self._leave_host(host)
+        else:
+            text, page_count = self._extract(item)
+        if time.monotonic() > deadline_at:
+            raise TimeoutError('Batch deadline exceeded')
+        if text:
+            text, keywords = self.nlp.run(nlp_tasks.ingest, text, subject)
+        if not text:
+            raise ValueError('Could not extract content')
+        if item.get('digest'):
+            self.documents.store_upload(item['pdf_path'], item['digest'])
+        doc_id = self.documents.put(text, subject, item['source'], keywords, page_count=page_count,
+                                    upload=item.get('digest'), pages=item.get('pages'), cache_key=key)
+        result = {'text': text, 'word_count': len(text.split()), 'keywords': keywords, 'document_id': doc_id}
+        if self.cache:
+            self.cache.set(key, result,
+                           ttl=Config.CACHE_URL_TTL_SECONDS if item['source'] in ('url', 'youtube') else None)
+        return result
+
+    def _timed(self, item, subject, deadline_at, user_id):
+        start = time.perf_counter()
+        try:
+            result = self._ingest(item, subject, deadline_at)
+        finally:
+            discard_spool(item)
+        if self.indexer:
+            self.indexer.index(user_id, subject, result['document_id'], result['text'])
+        return result, round(time.perf_counter() - start, 3)
+
+    def run(self, items, subject='General', user_id='default'):
+        """Yield NDJSON lines: one per item as it finishes, then a summary."""
+        start = time.monotonic()
+        deadline_at = start + self.deadline
+        for item in items:
+            item['claimed'] = True
+        futures = {self._pool.submit(self._timed, item, subject, deadline_at, user_id): i
+                   for i, item in enumerate(items)}
+        counts = {'ok': 0, 'failed': 0}
+        try:
+            try:
+                for future in as_completed(futures, timeout=self.deadline):
+                    i = futures.pop(future)
+                    line = {'index': i, 'source': items[i]['source']}
+                    try:
+                        result, seconds = future.result()
+                        line.update(status='ok', seconds=seconds, document_id=result['document_id'],
+                                    word_count=result['word_count'], keywords=result['keywords'])
+                        counts['ok'] += 1
+                    except Exception as e:
+                        line.update(status='error', error=str(e) or type(e).__name__)
+                        counts['failed'] += 1
+                    yield json.dumps(line) + '\n'
+            except FutureTimeout:
+                for future, i in sorted(futures.items(), key=lambda kv: kv[1]):
+                    future.cancel()
+                    counts['failed'] += 1
+                    yield json.dumps({'index': i, 'source': items[i]['source'], 'status': 'error',
+                                      'error': 'Batch deadline exceeded'}) + '\n'
+            yield json.dumps(dict(counts, done=True, total=len(items),
+                                  seconds=round(time.monotonic() - start, 3))) + '\n'
+        finally:
+            # Items already running remove their own spool file when they finish.
+            for future, i in futures.items():
+                if future.cancel():
+                    discard_spool(items[i])
+
+
+_ingestor = None
+_ingestor_lock = threading.Lock()
+
+
+def get_batch_ingestor():
+    global _ingestor
+    if _ingestor is None:
+        with _ingestor_lock:
+            if _ingestor is None:
+                from services.document_store import get_document_store
+                from services.ingestion_jobs import get_ingestion_runner
+                from services.nlp_executor import get_nlp_executor
+                from services.result_cache import get_result_cache
+                _ingestor = BatchIngestor(get_nlp_executor(), get_document_store(), get_result_cache(),
+                                          workers=Config.BATCH_WORKERS, per_host=Config.BATCH_PER_HOST,
+                                          deadline=Config.BATCH_DEADLINE_SECONDS, indexer=get_ingestion_runner())
+    return _ingestor
@@ -0,0 +1,136 @@
+"""Feeds quiz answers back into the online difficulty classifier.
+
+``/api/quiz/submit`` hands every answer to ``DifficultyFeedback.record``,
+which only appends ``(question, answered wrong)`` to an in-memory buffer.  A
+background thread sends the buffer to the NLP pool as one
+``nlp_tasks.learn_difficulty`` micro-batch once ``batch_size`` answers are
+waiting or ``interval`` seconds have passed, so a submit never waits on
+scikit-learn and the model on disk is rewritten once per batch, not per
+answer.  While the pool is busy the batch goes back to the queue until the
+next tick; answers beyond ``max_pending`` are dropped oldest first.
+
+After the model has learned, the same thread walks the question bank
+``relabel_rows`` questions per tick and stores their new difficulty, so
+adaptive quizzes (which filter on the stored label) follow the model.
+"""
+import atexit
+import logging
+import threading
+from collections import deque
+
+from config import Config
+from services.nlp_executor import PoolBusy
+from services.progress_aggregates import is_correct
+
+log = logging.getLogger(__name__)
+
+
+class DifficultyFeedback:
+    def __init__(self, nlp, bank=None, batch_size=256, interval=30.0, max_pending=100000, relabel_rows=2000):
+        self.nlp = nlp
+        self.bank = bank
+        self.batch_size = batch_size
+        self.interval = interval
+        self.relabel_rows = relabel_rows
+        self._pending = deque(maxlen=max_pending)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._relabel_from = None  # bank rowid the current relabel pass continues after
+        self._relabel_due = False  # the model learned since the current pass started
+        self.stats = {'recorded': 0, 'learned': 0, 'batches': 0, 'failed_batches': 0, 'busy': 0, 'relabelled': 0}
+
+    def record(self, answers):
+        """Queue the outcome of every answer that carries its question text; returns how many."""
+        outcomes = [(a['question'], int(not is_correct(a))) for a in answers if a.get('question')]
+        with self._lock:
+            self._pending.extend(outcomes)
+            self.stats['recorded'] += len(outcomes)
+            due = len(self._pending) >= self.batch_size
+            if outcomes and self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='difficulty-feedback', daemon=True)
+                self._thread.start()
+        if due:
+            self._wake.set()
+        return len(outcomes)
+
+    def _loop(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+            try:
+                self.relabel()
+            except PoolBusy:
+                pass  # carry on from the same row next tick
+            except Exception:
+                log.exception('Relabelling bank questions failed')
+
+    def flush(self):
+        """Send everything queued to the model now, one batch at a time; returns how many were learned.
+
+        Stops early (keeping the batch queued) when the NLP pool is busy.
+        """
+        from services import nlp_tasks
+        learned = 0
+        while True:
+            with self._lock:
+                batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+            if not batch:
+                return learned
+            questions, wrong = zip(*batch)
+            try:
+                n = self.nlp.run(nlp_tasks.learn_difficulty, list(questions), list(wrong))
+            except PoolBusy:
+                with self._lock:
+                    self._pending.extendleft(reversed(batch))
+                    self.stats['busy'] += 1
+                return learned
+            except Exception:
+                log.exception('Difficulty model update failed; dropped %d answers', len(batch))
+                with self._lock:
+                    self.stats['failed_batches'] += 1
+                continue
+            learned += n
+            with self._lock:
+                self.stats['learned'] += n
+                self.stats['batches'] += 1
+                self._relabel_due = True
+
+    def relabel(self):
+        """Re-classify the next ``relabel_rows`` bank questions; returns how many changed label."""
+        from services import nlp_tasks
+        with self._lock:
+            if self.bank is None or (self._relabel_from is None and not self._relabel_due):
+                return 0
+            if self._relabel_from is None:
+                self._relabel_from, self._relabel_due = 0, False
+            start = self._relabel_from
+        rows = self.bank.questions_after(start, self.relabel_rows)
+        changed = 0
+        if rows:
+            labels = self.nlp.run(nlp_tasks.difficulties, [r[2] for r in rows])
+            changed = self.bank.set_difficulties([(label, r[1]) for r, label in zip(rows, labels) if label != r[3]])
+        with self._lock:
+            self.stats['relabelled'] += changed
+            # At the end of the bank the pass is over; another starts if the model has learned since.
+            self._relabel_from = rows[-1][0] if len(rows) == self.relabel_rows else None
+        return changed
+
+
+_feedback = None
+_feedback_lock = threading.Lock()
+
+
+def get_difficulty_feedback():
+    global _feedback
+    if _feedback is None:
+        with _feedback_lock:
+            if _feedback is None:
+                from services.nlp_executor import get_nlp_executor
+                from services.question_bank import get_question_bank
+                _feedback = DifficultyFeedback(get_nlp_executor(), bank=get_question_bank(),
+                                               batch_size=Config.DIFFICULTY_BATCH_SIZE,
+                                               interval=Config.DIFFICULTY_BATCH_SECONDS)
+                atexit.register(_feedback.flush)
+    return _feedback
@@ -0,0 +1,274 @@
+"""Extracted notes and raw uploads, stored once and referenced by SHA-256.
+
+A document's id is the SHA-256 of its normalized text, so parsing the same
+notes twice yields the same id.  Summaries, MCQs and adaptive quizzes accept
+``document_id`` in place of the full ``text`` body.
+
+Raw uploads are kept as blobs named by the SHA-256 of their bytes (under
+``data/uploads/blobs``), and each (upload, page range) is linked to the
+document extracted from it, so a byte-identical re-upload finds its document
+without being extracted again.  Documents and blobs are evicted least recently
+used first once their total size exceeds ``max_bytes``; the search index,
+related notes and question bank are told which documents went so they stop
+returning them, and the cached parse results that named them are dropped.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from datetime import datetime, timedelta
+
+from config import Config
+from services.result_cache import get_result_cache, normalize_text
+from services.sqlite_db import SqliteDatabase, default_db_path
+
+log = logging.getLogger(__name__)
+
+BLOB_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', 'uploads', 'blobs')
+TOUCH_INTERVAL = 60  # seconds between last_used_at updates of one row
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id           TEXT PRIMARY KEY,
+    subject      TEXT NOT NULL,
+    source       TEXT NOT NULL,
+    text         TEXT NOT NULL,
+    word_count   INTEGER NOT NULL,
+    keywords     TEXT NOT NULL DEFAULT '[]',
+    created_at   TEXT NOT NULL,
+    page_count   INTEGER,
+    token_count  INTEGER NOT NULL DEFAULT 0,
+    size_bytes   INTEGER NOT NULL DEFAULT 0,
+    last_used_at TEXT
+);
+CREATE TABLE IF NOT EXISTS uploads (
+    sha256       TEXT PRIMARY KEY,
+    source       TEXT NOT NULL,
+    size_bytes   INTEGER NOT NULL,
+    created_at   TEXT NOT NULL,
+    last_used_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS upload_documents (
+    upload      TEXT NOT NULL,
+    pages       TEXT NOT NULL DEFAULT '',
+    document_id TEXT NOT NULL,
+    PRIMARY KEY (upload, pages)
+);
+CREATE TABLE IF NOT EXISTS document_cache_keys (
+    document_id TEXT NOT NULL,
+    cache_key   TEXT NOT NULL,
+    PRIMARY KEY (document_id, cache_key)
+);
+"""
+ADDED_COLUMNS = {'page_count': 'INTEGER', 'token_count': 'INTEGER NOT NULL DEFAULT 0',
+                 'size_bytes': 'INTEGER NOT NULL DEFAULT 0', 'last_used_at': 'TEXT'}
+
+
+def document_id(text):
+    return hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest()
+
+
+def count_tokens(text):
+    return len(re.findall(r'\w+', text))
+
+
+def _pages_key(pages):
+    return ''.join(str(pages or '').split())
+
+
+class DocumentStore:
+    def __init__(self, path, blob_dir=BLOB_DIR, max_bytes=1 << 30, on_evict=None, cache=None):
+        self.db = SqliteDatabase(path, SCHEMA)
+        self.db.add_columns('documents', ADDED_COLUMNS)
+        self.db.connect().execute("UPDATE documents SET size_bytes = length(CAST(text AS BLOB)) "
+                                  "WHERE size_bytes = 0 AND text != ''")
+        self.blob_dir = blob_dir
+        self.max_bytes = max_bytes
+        self.on_evict = on_evict  # called with the ids of the documents each gc evicts
+        self.cache = cache  # ResultCache holding the parse results linked with ``cache_key``
+        self._bytes = None
+        self._lock = threading.Lock()
+
+    def put(self, text, subject='General', source='text', keywords=(), page_count=None, upload=None, pages=None,
+            cache_key=None):
+        """Store extracted text (or mark it used if already stored) and return its id.
+
+        ``upload`` is the SHA-256 of the raw file the text came from (with the
+        ``pages`` range extracted), which links future re-uploads to it.
+        ``cache_key`` names a cached parse result holding the id; it is dropped
+        from ``cache`` when the document is evicted.
+        """
+        doc_id = document_id(text)
+        now = datetime.now().isoformat()
+        size = len(text.encode('utf-8'))
+        with self.db.transaction() as conn:
+            added = conn.execute(
+                'INSERT OR IGNORE INTO documents (id, subject, source, text, word_count, keywords, created_at, '
+                'page_count, token_count, size_bytes, last_used_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (doc_id, subject, source, text, len(text.split()), json.dumps(list(keywords)), now,
+                 page_count, count_tokens(text), size, now)).rowcount
+            if not added:
+                stale = (datetime.now() - timedelta(seconds=TOUCH_INTERVAL)).isoformat()
+                conn.execute('UPDATE documents SET last_used_at = ? WHERE id = ? '
+                             'AND (last_used_at IS NULL OR last_used_at < ?)', (now, doc_id, stale))
+            if cache_key:
+                conn.execute('INSERT OR IGNORE INTO document_cache_keys (document_id, cache_key) VALUES (?, ?)',
+                             (doc_id, cache_key))
+            if upload:
+                conn.execute('INSERT OR REPLACE INTO upload_documents (upload, pages, document_id) VALUES (?, ?, ?)',
+                             (upload, _pages_key(pages), doc_id))
+        if added:
+            self._grew(size)
+        return doc_id
+
+    def get(self, doc_id):
+        row = self.db.connect().execute('SELECT * FROM documents WHERE id = ?', (doc_id,)).fetchone()
+        if row is None:
+            return None
+        self._touch('documents', 'id', doc_id, row['last_used_at'])
+        doc = dict(row)
+        doc['keywords'] = json.loads(doc['keywords'])
+        return doc
+
+    def get_text(self, doc_id):
+        row = self.db.connect().execute('SELECT text, last_used_at FROM documents WHERE id = ?',
+                                        (doc_id,)).fetchone()
+        if row is None:
+            return None
+        self._touch('documents', 'id', doc_id, row['last_used_at'])
+        return row['text']
+
+    def iter_texts(self, created_after=''):
+        """``(created_at, text)`` of documents stored after ``created_after``, oldest first."""
+        cursor = self.db.connect().execute('SELECT created_at, text FROM documents WHERE created_at > ? '
+                                           'ORDER BY created_at', (created_after,))
+        for row in cursor:
+            yield row['created_at'], row['text']
+
+    def _touch(self, table, key, value, last_used_at):
+        now = datetime.now()
+        if last_used_at and (now - datetime.fromisoformat(last_used_at)).total_seconds() < TOUCH_INTERVAL:
+            return
+        self.db.connect().execute(f'UPDATE {table} SET last_used_at = ? WHERE {key} = ?',
+                                  (now.isoformat(), value))
+
+    # -- raw uploads -----------------------------------------------------------
+    def blob_path(self, digest):
+        return os.path.join(self.blob_dir, digest[:2], digest)
+
+    def find_upload(self, digest, pages=None):
+        """The document already extracted from this upload and page range, if any."""
+        row = self.db.connect().execute(
+            'SELECT u.document_id, b.last_used_at FROM upload_documents u JOIN uploads b ON b.sha256 = u.upload '
+            'WHERE u.upload = ? AND u.pages = ?', (digest, _pages_key(pages))).fetchone()
+        if row is None:
+            return None
+        self._touch('uploads', 'sha256', digest, row['last_used_at'])
+        return self.get(row['document_id'])
+
+    def store_upload(self, spool_path, digest, source='pdf'):
+        """Move a spooled upload into the blob store (dropping it if already there)."""
+        path = self.blob_path(digest)
+        size = os.path.getsize(spool_path)
+        now = datetime.now().isoformat()
+        with self.db.transaction() as conn:
+            added = conn.execute(
+                'INSERT OR IGNORE INTO uploads (sha256, source, size_bytes, created_at, last_used_at) '
+                'VALUES (?, ?, ?, ?, ?)', (digest, source, size, now, now)).rowcount
+        if os.path.exists(path):
+            os.remove(spool_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(spool_path, path)
+        if added:
+            self._grew(size)
+        return path
+
+    # -- garbage collection ------------------------------------------------------
+    def usage(self):
+        conn = self.db.connect()
+        docs = conn.execute('SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM documents').fetchone()
+        blobs = conn.execute('SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM uploads').fetchone()
+        return {'documents': docs[0], 'document_bytes': docs[1], 'uploads': blobs[0], 'upload_bytes': blobs[1],
+                'max_bytes': self.max_bytes}
+
+    def _grew(self, size):
+        with self._lock:
+            if self._bytes is None:
+                usage = self.usage()
+                self._bytes = usage['document_bytes'] + usage['upload_bytes']
+            else:
+                self._bytes += size
+            over = self._bytes > self.max_bytes
+        if over:
+            self.gc()
+
+    def gc(self, max_bytes=None):
+        """Evict least recently used documents and uploads down to 90% of ``max_bytes``."""
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        removed_docs, removed_blobs, cache_keys = [], [], []
+        with self.db.transaction() as conn:
+            # Other workers share the database, so measure inside the write lock.
+            entries = conn.execute(
+                "SELECT last_used_at, 'documents', id, size_bytes FROM documents UNION ALL "
+                "SELECT last_used_at, 'uploads', sha256, size_bytes FROM uploads").fetchall()
+            total = sum(e[3] for e in entries)
+            if total > max_bytes:
+                for last_used, table, key, size in sorted(entries, key=lambda e: e[0] or ''):
+                    if total <= max_bytes * 0.9:
+                        break
+                    if table == 'documents':
+                        conn.execute('DELETE FROM documents WHERE id = ?', (key,))
+                        conn.execute('DELETE FROM upload_documents WHERE document_id = ?', (key,))
+                        cache_keys.extend(r[0] for r in conn.execute(
+                            'SELECT cache_key FROM document_cache_keys WHERE document_id = ?', (key,)))
+                        conn.execute('DELETE FROM document_cache_keys WHERE document_id = ?', (key,))
+                        removed_docs.append(key)
+                    else:
+                        conn.execute('DELETE FROM uploads WHERE sha256 = ?', (key,))
+                        conn.execute('DELETE FROM upload_documents WHERE upload = ?', (key,))
+                        removed_blobs.append(key)
+                    total -= size
+        for digest in removed_blobs:
+            try:
+                os.remove(self.blob_path(digest))
+            except OSError:
+                pass
+        with self._lock:
+            self._bytes = total
+        if self.cache is not None:
+            for key in cache_keys:
+                self.cache.delete(key)
+        if removed_docs and self.on_evict:
+            try:
+                self.on_evict(removed_docs)
+            except Exception:
+                log.exception('Forgetting %d evicted documents failed', len(removed_docs))
+        return {'documents': len(removed_docs), 'uploads': len(removed_blobs), 'bytes': total}
+
+
+def _forget_evicted(document_ids):
+    from services.question_bank import get_question_bank
+    from services.related_notes import get_related_notes
+    from services.search_index import get_search_index
+    for index in (get_search_index(), get_related_notes(), get_question_bank()):
+        try:
+            index.forget(document_ids)
+        except Exception:
+            log.exception('%s could not forget %d evicted documents', type(index).__name__, len(document_ids))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_document_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = DocumentStore(default_db_path(), max_bytes=Config.DOCUMENT_STORE_MAX_BYTES,
+                                       on_evict=_forget_evicted, cache=get_result_cache())
+    return _store
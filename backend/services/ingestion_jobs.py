@@ -0,0 +1,295 @@
+"""Background ingestion jobs for large notes, PDFs, URLs and videos.
+
+``POST /api/parse/jobs`` records a job and returns immediately; a small
+thread pool in the web process runs it through its stages:
+
+    queued -> extracting (page by page for PDFs) -> analyzing -> indexing -> done | failed
+
+Job state lives in SQLite, so any web worker can answer status polls or
+stream progress over Server-Sent Events, whichever worker runs the job.  The
+extracted text is saved in the document store and the job reports its
+``document_id``.
+
+Each job records the boot token of the process running it, and that process
+refreshes the job's ``updated_at`` while it is queued or running.  A job
+owned by another boot that has not been refreshed for ``stale_after``
+seconds lost its process (e.g. a worker restart) and is failed.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from config import Config
+from services.sqlite_db import SqliteDatabase, default_db_path
+
+log = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ingest_jobs (
+    id          TEXT PRIMARY KEY,
+    source      TEXT NOT NULL,
+    subject     TEXT NOT NULL,
+    status      TEXT NOT NULL,
+    stage       TEXT NOT NULL,
+    done        INTEGER NOT NULL DEFAULT 0,
+    total       INTEGER NOT NULL DEFAULT 0,
+    error       TEXT,
+    document_id TEXT,
+    result      TEXT,
+    owner       TEXT,
+    version     INTEGER NOT NULL DEFAULT 0,
+    created_at  TEXT NOT NULL,
+    updated_at  TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_ingest_jobs_updated ON ingest_jobs (updated_at);
+"""
+FINAL_STATUSES = ('done', 'failed')
+PRUNE_INTERVAL = 3600  # seconds between prunes of finished jobs by one store
+HEARTBEAT_INTERVAL = 30  # seconds between refreshes of a runner's unfinished jobs
+STALE_AFTER = 120  # seconds without a refresh before another boot's job counts as orphaned
+BOOT_TOKEN = uuid.uuid4().hex  # identifies this process's runners in the jobs they own
+ORPHAN_ERROR = 'Interrupted by a server restart, please resubmit'
+
+
+class JobStore:
+    def __init__(self, path, ttl=None, stale_after=STALE_AFTER):
+        self.db = SqliteDatabase(path, SCHEMA)
+        self.ttl = ttl
+        self.stale_after = stale_after
+        self._pruned_at = self._swept_at = time.monotonic()
+
+    def create(self, source, subject):
+        if self.ttl and time.monotonic() - self._pruned_at > PRUNE_INTERVAL:
+            self.prune(self.ttl)
+        if time.monotonic() - self._swept_at > self.stale_after:
+            self.fail_orphans()
+        job_id = uuid.uuid4().hex
+        now = datetime.now().isoformat()
+        with self.db.transaction() as conn:
+            conn.execute(
+                'INSERT INTO ingest_jobs (id, source, subject, status, stage, owner, created_at, updated_at) '
+                "VALUES (?, ?, ?, 'queued', 'queued', ?, ?, ?)",
+                (job_id, source, subject, BOOT_TOKEN, now, now))
+        return job_id
+
+    def update(self, job_id, **fields):
+        if 'result' in fields:
+            fields['result'] = json.dumps(fields['result'])
+        fields['updated_at'] = datetime.now().isoformat()
+        assignments = ', '.join(f'{k} = ?' for k in fields)
+        with self.db.transaction() as conn:
+            conn.execute(f'UPDATE ingest_jobs SET {assignments}, version = version + 1 WHERE id = ?',
+                         (*fields.values(), job_id))
+
+    def touch(self, job_ids):
+        """Refresh ``updated_at`` of unfinished jobs this process runs (no version bump, so no event)."""
+        now = datetime.now().isoformat()
+        with self.db.transaction() as conn:
+            conn.executemany("UPDATE ingest_jobs SET updated_at = ? WHERE id = ? AND status NOT IN ('done', 'failed')",
+                             [(now, job_id) for job_id in job_ids])
+
+    def get(self, job_id):
+        conn = self.db.connect()
+        row = conn.execute('SELECT * FROM ingest_jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        if row['status'] not in FINAL_STATUSES and row['owner'] != BOOT_TOKEN and row['updated_at'] < self._cutoff():
+            self.fail_orphans()  # polled while its process is gone: report it failed now
+            row = conn.execute('SELECT * FROM ingest_jobs WHERE id = ?', (job_id,)).fetchone()
+        job = dict(row)
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        del job['owner']
+        return job
+
+    def _cutoff(self):
+        return (datetime.now() - timedelta(seconds=self.stale_after)).isoformat()
+
+    def fail_orphans(self):
+        """Fail unfinished jobs of other boots that nobody has refreshed lately; returns how many."""
+        self._swept_at = time.monotonic()
+        now = datetime.now().isoformat()
+        with self.db.transaction() as conn:
+            return conn.execute(
+                "UPDATE ingest_jobs SET status = 'failed', stage = 'failed', error = ?, updated_at = ?, "
+                "version = version + 1 WHERE status NOT IN ('done', 'failed') AND owner IS NOT ? AND updated_at < ?",
+                (ORPHAN_ERROR, now, BOOT_TOKEN, self._cutoff())).rowcount
+
+    def prune(self, max_age):
+        """Delete finished jobs last updated more than ``max_age`` seconds ago; returns how many."""
+        self._pruned_at = time.monotonic()
+        cutoff = (datetime.now() - timedelta(seconds=max_age)).isoformat()
+        with self.db.transaction() as conn:
+            return conn.execute("DELETE FROM ingest_jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+                                (cutoff,)).rowcount
+
+
+def extract_text(source, update, content=None, url=None, pdf_path=None, pages=None):
+    """Run the extraction stage, reporting progress through ``update(**fields)``.
+
+    Returns ``(text, report)``; for PDFs the report has the number of
+    ``pages`` extracted and the ``failed`` ones, otherwise it is None.
+    """
+    from services.notes_service import parse_text, parse_url, parse_youtube
+    if source == 'pdf':
+        from services.pdf_extraction import iter_pages
+        texts, failed = [], []
+        total = []
+        for done, page in enumerate(iter_pages(pdf_path, pages, on_count=total.append), 1):
+            if page.text:
+                texts.append(page.text)
+            if page.error:
+                failed.append({'page': page.index + 1, 'error': page.error})
+            update(done=done, total=total[0])
+        return '\n'.join(texts), {'pages': total[0] if total else 0, 'failed': failed}
+    update(done=0, total=1)
+    if source == 'url':
+        text = parse_url(url or '')
+    elif source == 'youtube':
+        text = parse_youtube(url or '')
+    else:
+        text = parse_text(content or '')
+    update(done=1, total=1)
+    return text, None
+
+
+class IngestionRunner:
+    def __init__(self, jobs, documents, nlp, workers=2, search=None, related=None):
+        self.jobs = jobs
+        self.documents = documents
+        self.nlp = nlp
+        self.search = search
+        self.related = related
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ingest')
+        self._active = set()  # ids of this runner's queued or running jobs
+        self._active_lock = threading.Lock()
+        self._heartbeat = None
+
+    def submit(self, source, subject, content=None, url=None, pdf_path=None, pages=None, digest=None,
+               user_id='default'):
+        """Queue a job; ``digest`` is the SHA-256 of the spooled PDF at ``pdf_path``."""
+        job_id = self.jobs.create(source, subject)
+        with self._active_lock:
+            self._active.add(job_id)
+            if self._heartbeat is None:
+                self._heartbeat = threading.Thread(target=self._heartbeat_loop, name='ingest-heartbeat',
+                                                   daemon=True)
+                self._heartbeat.start()
+        self._pool.submit(self._run, job_id, source, subject, content, url, pdf_path, pages, digest, user_id)
+        return job_id
+
+    def _heartbeat_loop(self):
+        # Runs while this runner has unfinished jobs, so other workers can tell they are alive.
+        while True:
+            time.sleep(HEARTBEAT_INTERVAL)
+            with self._active_lock:
+                job_ids = list(self._active)
+                if not job_ids:
+                    self._heartbeat = None
+                    return
+            try:
+                self.jobs.touch(job_ids)
+            except Exception:
+                log.exception('Refreshing %d ingestion jobs failed', len(job_ids))
+
+    def index(self, user_id, subject, doc_id, text):
+        """Queue stored notes for search and related-notes indexing, off the request thread."""
+        if self.search or self.related:
+            self._pool.submit(self._index_logged, user_id, subject, doc_id, text)
+
+    def _index_logged(self, user_id, subject, doc_id, text):
+        try:
+            self._index(user_id, subject, doc_id, text)
+        except Exception:
+            log.exception('Indexing document %s failed', doc_id)
+
+    def _index(self, user_id, subject, doc_id, text):
+        if self.search:
+            self.search.add_text(user_id, subject, doc_id, text)
+        if self.related:
+            self.related.add_text(user_id, subject, doc_id, text)
+
+    def _run(self, job_id, source, subject, content, url, pdf_path, pages, digest, user_id):
+        from services import nlp_tasks
+        try:
+            doc = self.documents.find_upload(digest, pages) if digest else None
+            if doc is not None:
+                self._index(user_id, subject, doc['id'], doc['text'])
+                self.jobs.update(job_id, status='done', stage='done', document_id=doc['id'],
+                                 result={'word_count': doc['word_count'], 'keywords': doc['keywords'],
+                                         'failed_pages': [], 'deduplicated': True})
+                return
+            self.jobs.update(job_id, status='running', stage='extracting')
+            text, report = extract_text(source, lambda **f: self.jobs.update(job_id, **f),
+                                        content=content, url=url, pdf_path=pdf_path, pages=pages)
+            if not text or not text.strip():
+                self.jobs.update(job_id, status='failed', stage='failed', error='Could not extract content')
+                return
+            self.jobs.update(job_id, stage='analyzing')
+            text, keywords = self.nlp.run(nlp_tasks.ingest, text, subject)
+            if digest:
+                self.documents.store_upload(pdf_path, digest)
+            doc_id = self.documents.put(text, subject, source, keywords, page_count=report and report['pages'],
+                                        upload=digest, pages=pages)
+            if self.search or self.related:
+                self.jobs.update(job_id, stage='indexing')
+                self._index(user_id, subject, doc_id, text)
+            self.jobs.update(job_id, status='done', stage='done', document_id=doc_id,
+                             result={'word_count': len(text.split()), 'keywords': keywords,
+                                     'failed_pages': report['failed'] if report else []})
+        except Exception as e:
+            self.jobs.update(job_id, status='failed', stage='failed', error=str(e) or type(e).__name__)
+        finally:
+            with self._active_lock:
+                self._active.discard(job_id)
+            if pdf_path:
+                try:
+                    os.remove(pdf_path)  # gone already if moved into the blob store
+                except OSError:
+                    pass
+
+
+def job_events(jobs, job_id, poll=0.25, heartbeat=15.0):
+    """Server-Sent Events stream of a job's state until it finishes."""
+    last_version, last_sent = None, time.monotonic()
+    while True:
+        job = jobs.get(job_id)
+        if job is None:
+            yield 'event: error\ndata: {"error": "Job not found"}\n\n'
+            return
+        if job['version'] != last_version:
+            last_version, last_sent = job['version'], time.monotonic()
+            event = job['status'] if job['status'] in FINAL_STATUSES else 'progress'
+            yield f'event: {event}\ndata: {json.dumps(job)}\n\n'
+            if job['status'] in FINAL_STATUSES:
+                return
+        elif time.monotonic() - last_sent > heartbeat:
+            last_sent = time.monotonic()
+            yield ': keep-alive\n\n'
+        time.sleep(poll)
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def get_ingestion_runner():
+    global _runner
+    if _runner is None:
+        with _runner_lock:
+            if _runner is None:
+                from services.document_store import get_document_store
+                from services.nlp_executor import get_nlp_executor
+                from services.related_notes import get_related_notes
+                from services.search_index import get_search_index
+                jobs = JobStore(default_db_path(), ttl=Config.INGEST_JOB_TTL_SECONDS)
+                jobs.fail_orphans()
+                jobs.prune(Config.INGEST_JOB_TTL_SECONDS)
+                _runner = IngestionRunner(jobs, get_document_store(), get_nlp_executor(),
+                                          workers=Config.INGEST_JOB_WORKERS, search=get_search_index(),
+                                          related=get_related_notes())
+    return _runner
@@ -0,0 +1,181 @@
+"""Bounded process pool for CPU-bound NLP tasks.
+
+Request threads submit a task from ``services.nlp_tasks`` and wait for its
+result, so a long summarization occupies a pool worker rather than a web
+worker.  The pool:
+
+* admits at most ``max_pending`` tasks at a time (``PoolBusy`` beyond that),
+* enforces a per-task timeout inside the worker with ``SIGALRM`` (the worker
+  survives and takes the next task) plus a backstop wait in the caller,
+* recycles each worker after ``max_tasks_per_child`` tasks to cap memory,
+  flushing its buffered index updates on the way out,
+* preloads the model artifacts in every new worker.
+
+With ``NLP_POOL_WORKERS=0`` tasks run inline in the calling thread.
+"""
+import atexit
+import multiprocessing
+import os
+import signal
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from config import Config
+
+BACKSTOP_GRACE = 5.0
+PRELOAD_MODULES = ['services.nlp_tasks', 'models.quiz_model', 'models.summarization_engine',
+                   'models.nlp_utils', 'services.quiz_service', 'services.summary_service',
+                   'services.pdf_extraction', 'PyPDF2']
+
+
+class TaskTimeout(Exception):
+    pass
+
+
+class PoolBusy(Exception):
+    pass
+
+
+class _Alarm(BaseException):
+    """Raised inside a task at its deadline; not an ``Exception``, so the
+    task's own ``except Exception`` handlers cannot swallow it."""
+
+
+def _alarm(signum, frame):
+    raise _Alarm()
+
+
+def _init_worker():
+    from multiprocessing.util import Finalize
+    from services.nlp_tasks import flush_indexes, warm_models
+    # Ctrl-C goes to the parent; workers are shut down by the executor.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    Finalize(None, flush_indexes, exitpriority=10)
+    try:
+        warm_models()
+    except Exception:
+        pass  # load lazily on first use instead
+
+
+def _run(fn, args, kwargs, timeout):
+    armed = timeout and hasattr(signal, 'setitimer')
+    if armed:
+        signal.signal(signal.SIGALRM, _alarm)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return fn(*args, **kwargs)
+    except _Alarm:
+        raise TaskTimeout() from None
+    finally:
+        if armed:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+def pool_context():
+    # Worker recycling is not supported with 'fork'.  The fork server imports
+    # the NLP stack once, so recycled workers start without re-importing it.
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('spawn')
+    ctx = multiprocessing.get_context('forkserver')
+    ctx.set_forkserver_preload(PRELOAD_MODULES)
+    return ctx
+
+
+class NlpExecutor:
+    def __init__(self, workers=2, timeout=60.0, max_tasks_per_child=100, max_pending=None):
+        self.workers = workers
+        self.timeout = timeout
+        self.max_tasks_per_child = max_tasks_per_child
+        self.max_pending = max_pending or 4 * max(workers, 1)
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pid = None
+        self.stats = {'submitted': 0, 'completed': 0, 'timeouts': 0, 'rejected': 0, 'restarts': 0}
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=pool_context(), initializer=_init_worker,
+                    max_tasks_per_child=self.max_tasks_per_child)
+                self._pid = os.getpid()
+            return self._pool
+
+    def _discard(self, pool):
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+                self.stats['restarts'] += 1
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def start(self):
+        """Start the workers (which load their models) ahead of the first request."""
+        if self.workers <= 0:
+            from services.nlp_tasks import warm_models
+            warm_models()
+            return
+        pool = self._executor()
+        for _ in range(self.workers):
+            pool.submit(os.getpid)
+
+    def run(self, fn, *args, timeout=None, **kwargs):
+        """Run ``fn(*args, **kwargs)`` in the pool and return its result."""
+        timeout = self.timeout if timeout is None else timeout
+        if self.workers <= 0:
+            return fn(*args, **kwargs)
+        if not self._slots.acquire(timeout=timeout):
+            self.stats['rejected'] += 1
+            raise PoolBusy()
+        try:
+            self.stats['submitted'] += 1
+            for attempt in range(2):
+                pool = self._executor()
+                try:
+                    future = pool.submit(_run, fn, args, kwargs, timeout)
+                    result = future.result(timeout=timeout + BACKSTOP_GRACE if timeout else None)
+                    break
+                except BrokenProcessPool:
+                    # A worker died (e.g. out of memory): start a fresh pool and retry once.
+                    self._discard(pool)
+                    if attempt:
+                        raise
+                except (TaskTimeout, FutureTimeout):
+                    self.stats['timeouts'] += 1
+                    raise TaskTimeout()
+            self.stats['completed'] += 1
+            return result
+        finally:
+            self._slots.release()
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def info(self):
+        return dict(self.stats, workers=self.workers, max_pending=self.max_pending,
+                    max_tasks_per_child=self.max_tasks_per_child, timeout=self.timeout)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_nlp_executor():
+    """Process-wide executor configured from ``Config``."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = NlpExecutor(
+                    workers=Config.NLP_POOL_WORKERS, timeout=Config.NLP_TASK_TIMEOUT,
+                    max_tasks_per_child=Config.NLP_POOL_MAX_TASKS, max_pending=Config.NLP_POOL_MAX_PENDING)
+                atexit.register(_executor.shutdown)
+    return _executor
+
+
+def run_task(fn, *args, **kwargs):
+    return get_nlp_executor().run(fn, *args, **kwargs)
@@ -0,0 +1,91 @@
+"""CPU-bound NLP work, packaged as top-level functions for the NLP process pool.
+
+Every task takes and returns plain picklable values so it can run either in
+a pool worker or inline (``NLP_POOL_WORKERS=0``).
+"""
+
+
+def warm_models():
+    """Load the model artifacts a worker needs before its first task."""
+    from models.model_registry import registry
+    from models.corpus_tfidf import get_corpus_model
+    import models.quiz_model  # noqa: F401  (registers 'quiz' and 'topics')
+    import models.summarization_engine  # noqa: F401
+    registry.warm('quiz', 'topics')
+    get_corpus_model()
+
+
+def flush_indexes():
+    """Persist this process's buffered corpus IDF and distractor-index updates."""
+    from models.corpus_tfidf import flush
+    from models.distractor_index import subject_indexes
+    flush()
+    subject_indexes.flush()
+
+
+def ingest(text, subject):
+    """Index extracted notes; returns ``(text, keywords)``."""
+    from models.corpus_tfidf import add_documents
+    from models.distractor_index import add_subject_notes
+    from models.document_analysis import analyze_document
+    from models.nlp_utils import extract_keywords
+    if not text:
+        return '', []
+    analysis = analyze_document(text)
+    keywords = extract_keywords(text, analysis=analysis)
+    add_documents(analyses=[analysis])
+    add_subject_notes(subject, analysis)
+    return text, keywords
+
+
+def learn_difficulty(questions, wrong):
+    """Update the online difficulty model with one micro-batch of answer outcomes."""
+    from models.quiz_model import learn_difficulty
+    return learn_difficulty(questions, wrong)
+
+
+def maintain_related():
+    """Merge or re-cluster the related-notes index segments if due (see services/related_notes.py)."""
+    from services.related_notes import get_related_notes
+    return get_related_notes().maintain()
+
+
+def merge_search(user_id, subject):
+    """Merge a search partition's segments if due (see services/search_index.py)."""
+    from services.search_index import get_search_index
+    return get_search_index().merge(user_id, subject)
+
+
+def summarize(text, subject, max_sentences=3, ratio=None):
+    from models.document_analysis import analyze_document
+    from models.nlp_utils import extract_keywords
+    from services.summary_service import generate_summary
+    analysis = analyze_document(text)
+    keywords = extract_keywords(text, analysis=analysis)
+    summary, tips = generate_summary(text, subject, max_sentences, analysis=analysis, ratio=ratio,
+                                     keywords=keywords)
+    return {"summary": summary, "tips": tips, "keywords": keywords}
+
+
+def mcqs(text, num, subject, seed=None):
+    """Generated questions without ``difficulty``, which the online model keeps changing
+    (label them with ``difficulties`` when serving)."""
+    from models.document_analysis import analyze_document
+    from models.quiz_model import generate_mcqs
+    analysis = analyze_document(text)
+    questions = generate_mcqs(text, num, analysis=analysis, seed=seed, subject=subject)
+    for q in questions:
+        q["subject"] = subject
+        del q["source_sentence"]  # only the question bank keeps it
+    return questions
+
+
+def difficulties(questions):
+    """Current difficulty label of each question text."""
+    from models.quiz_model import classify_difficulty
+    return classify_difficulty(questions) if questions else []
+
+
+def adaptive_quiz(text, subject, num, seed=None):
+    from services.quiz_service import create_quiz_from_notes
+    return create_quiz_from_notes(text, subject, num, seed=seed)
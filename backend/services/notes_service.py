@@ -1,34 +1,30 @@
-import requests
-from PyPDF2 import PdfReader
-from io import BytesIO
 import os
 import re
 
 def parse_text(notes):
     return notes if notes else ""
 
-def parse_pdf(file):
-    """Extract text from PDF."""
+def parse_pdf(file, pages=None):
+    """Extract text from PDF ("" if the file is not a readable PDF)."""
+    from services.pdf_extraction import extract_pdf_stream, PdfExtractionError
     try:
-        pdf = PdfReader(BytesIO(file.read()))
-        text = ""
-        for page in pdf.pages:
-            text += page.extract_text()
-        return text
-    except:
+        text, _ = extract_pdf_stream(file, pages)
+    except PdfExtractionError:
         return ""
+    return text
 
 def parse_url(url):
-    """Extract text from URL."""
+    """Extract the main text of a web page ("" if it cannot be fetched)."""
+    from config import Config
+    from services.url_fetcher import FetchError, get_url_fetcher
     try:
-        resp = requests.get(url, timeout=5)
-        # Simple extraction - just get first 500 chars of content
-        return resp.text[:500]
-    except:
+        return get_url_fetcher().fetch_text(url, max_chars=Config.URL_TEXT_MAX_CHARS)
+    except (FetchError, ValueError):
         return ""
 
 def parse_youtube(youtube_url):
     """Extract transcript/title/description from YouTube using API key."""
+    import requests
     api_key = os.environ.get('YOUTUBE_API_KEY', '')
     video_id = None
     match = re.search(r'v=([\w-]+)', youtube_url)
@@ -47,12 +43,15 @@ def parse_youtube(youtube_url):
             return snippet.get('title', '') + ' ' + snippet.get('description', '')
     return ''
 
-def parse_source(source_type, notes=None, url=None, youtube_url=None, file=None):
-    """Parse different source types."""
+def parse_source(source_type, notes=None, url=None, youtube_url=None, file=None, pdf_path=None, pages=None):
+    """Parse different source types (a PDF as an upload stream or a spooled ``pdf_path``)."""
     if source_type == "text":
         return parse_text(notes)
+    elif source_type == "pdf" and pdf_path:
+        from services.pdf_extraction import extract_pdf
+        return extract_pdf(pdf_path, pages)[0]
     elif source_type == "pdf":
-        return parse_pdf(file) if file else ""
+        return parse_pdf(file, pages) if file else ""
     elif source_type == "url":
         return parse_url(url)
     elif source_type == "youtube":
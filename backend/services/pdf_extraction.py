@@ -0,0 +1,189 @@
+"""Page-aware PDF text extraction.
+
+Uploads are spooled to disk in chunks (never held in memory whole) and
+every reader memory-maps the file, so the OS pages it in on demand.  Large
+documents are split into page ranges that worker processes extract in
+parallel; ``iter_pages`` yields ``PageResult`` objects in page order as the
+ranges finish, with per-page timing and the error (if any) for pages that
+failed.  A bad page is recorded and skipped rather than failing the
+document.
+"""
+import hashlib
+import mmap
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from config import Config
+
+UPLOAD_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', 'uploads')
+CHUNK_PAGES = 16
+COPY_BUFFER = 1 << 20
+
+PageResult = namedtuple('PageResult', 'index text seconds error')
+
+
+class PdfExtractionError(ValueError):
+    """The file could not be opened as a PDF at all."""
+
+
+def spool_upload(stream, directory=UPLOAD_DIR, suffix='.pdf'):
+    """Copy an upload stream to a temp file; returns ``(path, sha256 hex)``."""
+    os.makedirs(directory, exist_ok=True)
+    digest = hashlib.sha256()
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=directory)
+    with os.fdopen(fd, 'wb') as out:
+        while True:
+            block = stream.read(COPY_BUFFER)
+            if not block:
+                break
+            digest.update(block)
+            out.write(block)
+    return path, digest.hexdigest()
+
+
+class _MappedPdf:
+    """A ``PdfReader`` over a read-only memory map of ``path``."""
+
+    def __init__(self, path):
+        from PyPDF2 import PdfReader
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.reader = PdfReader(self._map)
+            self.page_count = len(self.reader.pages)
+        except Exception as e:
+            self.close()
+            raise PdfExtractionError(f'Could not read PDF: {e}') from e
+
+    def close(self):
+        if getattr(self, '_map', None) is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def parse_page_ranges(spec, count):
+    """Zero-based page indices for a 1-based spec like ``"1-3,7,10-"`` (None = all)."""
+    if spec is None or str(spec).strip() == '':
+        return list(range(count))
+    pages = []
+    for part in str(spec).split(','):
+        m = re.fullmatch(r'\s*(\d*)\s*(-?)\s*(\d*)\s*', part)
+        if not m or not (m.group(1) or m.group(3)):
+            raise ValueError(f'Invalid page range: {part!r}')
+        start = int(m.group(1)) if m.group(1) else 1
+        end = (int(m.group(3)) if m.group(3) else count) if m.group(2) else start
+        if start < 1 or end < start:
+            raise ValueError(f'Invalid page range: {part!r}')
+        pages.extend(range(start - 1, min(end, count)))
+    return sorted(set(pages))
+
+
+_worker_pdf = None  # (file identity, _MappedPdf): a pool worker's reader, reused across chunks
+
+
+def _worker_reader(path):
+    global _worker_pdf
+    st = os.stat(path)
+    key = (path, st.st_ino, st.st_size, st.st_mtime_ns)
+    if _worker_pdf is None or _worker_pdf[0] != key:
+        if _worker_pdf is not None:
+            _worker_pdf[1].close()
+        _worker_pdf = (key, _MappedPdf(path))
+    return _worker_pdf[1]
+
+
+def extract_page_range(path, indices, pdf=None):
+    """Extract the given pages of ``path`` (in a pool worker unless ``pdf`` is given)."""
+    pdf = pdf or _worker_reader(path)
+    results = []
+    for i in indices:
+        start = time.perf_counter()
+        try:
+            text, error = pdf.reader.pages[i].extract_text() or '', None
+        except Exception as e:
+            text, error = '', f'{type(e).__name__}: {e}'
+        results.append(PageResult(i, text, round(time.perf_counter() - start, 4), error))
+    return results
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def _extraction_pool():
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            from services.nlp_executor import pool_context
+            _pool = ProcessPoolExecutor(max_workers=Config.PDF_EXTRACT_WORKERS, mp_context=pool_context())
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def iter_pages(path, pages=None, workers=None, chunk_pages=CHUNK_PAGES, on_count=None):
+    """Yield a ``PageResult`` per selected page, in page order.
+
+    ``pages`` is a page-range spec (see ``parse_page_ranges``).  Chunks of
+    ``chunk_pages`` pages are extracted by the process pool, so the calling
+    (web) thread only waits, unless ``workers`` is 1 or we are already in a
+    daemon process.  ``on_count`` is called with the number of selected
+    pages before the first one is yielded.
+    """
+    workers = Config.PDF_EXTRACT_WORKERS if workers is None else workers
+    with _MappedPdf(path) as pdf:
+        indices = parse_page_ranges(pages, pdf.page_count)
+        chunks = [indices[i:i + chunk_pages] for i in range(0, len(indices), chunk_pages)]
+        if on_count is not None:
+            on_count(len(indices))
+        if workers <= 1 or multiprocessing.current_process().daemon:
+            for chunk in chunks:
+                yield from extract_page_range(path, chunk, pdf)
+            return
+    pool = _extraction_pool()
+    futures = [pool.submit(extract_page_range, path, chunk) for chunk in chunks]
+    try:
+        for future in futures:
+            yield from future.result()
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def extract_pdf(path, pages=None, workers=None):
+    """Full text of the selected pages plus an extraction report."""
+    start = time.perf_counter()
+    texts, report_pages, failed = [], [], []
+    for page in iter_pages(path, pages, workers):
+        texts.append(page.text)
+        report_pages.append({'page': page.index + 1, 'seconds': page.seconds, 'chars': len(page.text)})
+        if page.error:
+            failed.append({'page': page.index + 1, 'error': page.error})
+    report = {'pages': len(report_pages), 'failed': failed, 'page_timings': report_pages,
+              'seconds': round(time.perf_counter() - start, 3)}
+    return '\n'.join(t for t in texts if t), report
+
+
+def extract_pdf_stream(stream, pages=None, workers=None):
+    """Spool a file-like upload to disk, extract it and remove the spool file."""
+    path, _ = spool_upload(stream)
+    try:
+        return extract_pdf(path, pages, workers)
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,104 @@
+"""Running per-user/per-subject quiz aggregates.
+
+Each submit folds one attempt into a small fixed-size record (running sums,
+min/max accuracy, ring buffer of the last few accuracies, per-topic
+counters), so the analytics in ``/api/quiz/submit`` and ``/api/progress``
+never need to rescan a user's history.
+"""
+
+RECENT_WINDOW = 5
+
+
+def empty_aggregate():
+    return {
+        'attempts': 0, 'sum_accuracy': 0.0, 'correct': 0, 'total': 0,
+        'min_accuracy': None, 'max_accuracy': None, 'recent': [], 'last_timestamp': None,
+    }
+
+
+def is_correct(answer):
+    return str(answer.get('user_answer', '')) == str(answer.get('correct_answer', ''))
+
+
+def topic_counts(answers, default_topic):
+    """Per-topic {correct, total} counters for one attempt's answers."""
+    counts = {}
+    for a in answers:
+        c = counts.setdefault(a.get('topic', default_topic), {'correct': 0, 'total': 0})
+        c['total'] += 1
+        if is_correct(a):
+            c['correct'] += 1
+    return counts
+
+
+def fold_attempt(agg, attempt):
+    """Update ``agg`` in place with one attempt and return it."""
+    acc = attempt['accuracy']
+    agg['attempts'] += 1
+    agg['sum_accuracy'] += acc
+    agg['correct'] += attempt['correct']
+    agg['total'] += attempt['total']
+    agg['min_accuracy'] = acc if agg['min_accuracy'] is None else min(agg['min_accuracy'], acc)
+    agg['max_accuracy'] = acc if agg['max_accuracy'] is None else max(agg['max_accuracy'], acc)
+    agg['recent'] = (agg['recent'] + [acc])[-RECENT_WINDOW:]
+    agg['last_timestamp'] = attempt['timestamp']
+    return agg
+
+
+def merge_topic_counts(into, counts):
+    for topic, c in counts.items():
+        t = into.setdefault(topic, {'correct': 0, 'total': 0})
+        t['correct'] += c['correct']
+        t['total'] += c['total']
+    return into
+
+
+def mean_accuracy(agg):
+    return agg['sum_accuracy'] / agg['attempts'] if agg['attempts'] else 0.0
+
+
+def trend(agg):
+    recent = agg['recent']
+    if len(recent) > 1 and recent[-1] > recent[0]:
+        return 'improving'
+    if len(recent) > 1 and recent[-1] < recent[0]:
+        return 'declining'
+    return 'stable'
+
+
+def recent_ability(agg):
+    recent = agg['recent']
+    return sum(recent) / len(recent) if recent else 0.0
+
+
+def consistency(agg):
+    if agg['attempts'] > 1:
+        return 1 - (agg['max_accuracy'] - agg['min_accuracy'])
+    return 0.5
+
+
+def exam_prediction(agg):
+    pred = min(100, round(mean_accuracy(agg) * 70 + consistency(agg) * 15 + min(agg['attempts'], 10) * 1.5, 1))
+    readiness = 'High' if pred >= 75 else ('Medium' if pred >= 55 else 'Low')
+    return pred, readiness
+
+
+def concept_difficulty(counts):
+    """Map topic -> difficulty score (1 - accuracy) from topic counters."""
+    return {t: round(1 - (v['correct'] / v['total']), 2) if v['total'] else 1
+            for t, v in counts.items()}
+
+
+def aggregates_differ(a, b, tol=1e-6):
+    """True if two aggregate records disagree beyond float rounding."""
+    for key in ('attempts', 'correct', 'total', 'last_timestamp'):
+        if a[key] != b[key]:
+            return True
+    for key in ('sum_accuracy', 'min_accuracy', 'max_accuracy'):
+        if (a[key] is None) != (b[key] is None):
+            return True
+        if a[key] is not None and abs(a[key] - b[key]) > tol:
+            return True
+    if len(a['recent']) != len(b['recent']):
+        return True
+    return any(abs(x - y) > tol for x, y in zip(a['recent'], b['recent']))
@@ -0,0 +1,325 @@
+"""Persistent bank of generated MCQs that adaptive quizzes are assembled from.
+
+Generated questions are stored once, with their subject, topic, difficulty,
+source document and usage counters, and indexed by (subject, topic,
+difficulty) and by (document, difficulty).  ``/api/quiz/adaptive`` samples
+from the bank (least served first) and only asks the NLP pool for new
+questions when a document's bucket is short, so assembling a quiz is a few
+indexed SQLite reads and never loads the NLP stack in the web process.
+
+New questions are checked against a per-subject MinHash/LSH index
+(``models.minhash_lsh``) before they are stored: a near-duplicate of another
+question from the same document is dropped, and one from a different
+document is stored (that document's quizzes need it) but marked
+``duplicate_of`` the first, so subject-wide quizzes skip it.
+
+Questions of documents the document store evicts are deleted with them.
+"""
+import hashlib
+import json
+import random
+import threading
+from datetime import datetime
+
+from config import Config
+from services.sqlite_db import SqliteDatabase, default_db_path
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS questions (
+    id              TEXT PRIMARY KEY,
+    subject         TEXT NOT NULL,
+    topic           TEXT NOT NULL,
+    difficulty      TEXT NOT NULL,
+    document_id     TEXT NOT NULL,
+    question        TEXT NOT NULL,
+    options         TEXT NOT NULL,
+    answer          TEXT NOT NULL,
+    source_sentence INTEGER,
+    times_served    INTEGER NOT NULL DEFAULT 0,
+    times_answered  INTEGER NOT NULL DEFAULT 0,
+    times_correct   INTEGER NOT NULL DEFAULT 0,
+    last_served_at  TEXT,
+    created_at      TEXT NOT NULL,
+    minhash         BLOB,
+    duplicate_of    TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_questions_bucket
+    ON questions (subject, topic, difficulty, times_served);
+CREATE INDEX IF NOT EXISTS idx_questions_document
+    ON questions (document_id, difficulty, times_served);
+CREATE TABLE IF NOT EXISTS question_sources (
+    document_id  TEXT PRIMARY KEY,
+    subject      TEXT NOT NULL,
+    rounds       INTEGER NOT NULL DEFAULT 0,
+    exhausted    INTEGER NOT NULL DEFAULT 0,
+    generated_at TEXT NOT NULL
+);
+"""
+# Buckets tried in order for each requested difficulty.
+DIFFICULTY_ORDER = {
+    'easy': ('easy', 'medium', 'hard'),
+    'medium': ('medium', 'hard', 'easy'),
+    'hard': ('hard', 'medium', 'easy'),
+}
+CANDIDATE_FACTOR = 3  # rows read per question wanted, to sample among the least served
+ADDED_COLUMNS = {'minhash': 'BLOB', 'duplicate_of': 'TEXT'}
+
+
+def question_id(document_id, question, answer):
+    return hashlib.sha256(f'{document_id}\0{question}\0{answer}'.encode('utf-8')).hexdigest()[:24]
+
+
+def _row_to_question(row):
+    return {'id': row['id'], 'question': row['question'], 'options': json.loads(row['options']),
+            'answer': row['answer'], 'topic': row['topic'], 'difficulty': row['difficulty'],
+            'subject': row['subject'], 'document_id': row['document_id'],
+            'source_sentence': row['source_sentence']}
+
+
+class _SubjectIndex:
+    """LSH index over one subject's questions, with each question's document and canonical id."""
+
+    def __init__(self):
+        from models.minhash_lsh import LshIndex
+        self.lsh = LshIndex()
+        self.documents = {}
+        self.canonical = {}
+        self.last_rowid = 0
+
+    def add(self, qid, sig, document_id, duplicate_of):
+        self.lsh.add(qid, sig)
+        self.documents[qid] = document_id
+        self.canonical[qid] = duplicate_of or qid
+
+    def check(self, sig, document_id, threshold):
+        """``(drop, duplicate_of)`` for a new question of ``document_id``."""
+        hits = self.lsh.query(sig, threshold)
+        if any(self.documents[h] == document_id for h, _ in hits):
+            return True, None
+        return False, self.canonical[hits[0][0]] if hits else None
+
+
+class QuestionBank:
+    def __init__(self, path, threshold=0.7):
+        self.db = SqliteDatabase(path, SCHEMA)
+        self.db.add_columns('questions', ADDED_COLUMNS)
+        self.threshold = threshold
+        self._indexes = {}
+        self._index_lock = threading.Lock()
+
+    def _subject_index(self, subject):
+        """The subject's index, caught up with rows stored since (by any process)."""
+        import numpy as np
+        from models.minhash_lsh import question_signature
+        index = self._indexes.get(subject)
+        if index is not None and self.db.connect().execute(
+                'SELECT COUNT(*) FROM questions WHERE subject = ? AND rowid <= ?',
+                (subject, index.last_rowid)).fetchone()[0] < len(index.documents):
+            index = None  # questions were deleted (by any process) since it was built
+        if index is None:
+            index = self._indexes[subject] = _SubjectIndex()
+        rows = self.db.connect().execute(
+            'SELECT rowid, id, document_id, question, answer, minhash, duplicate_of FROM questions '
+            'WHERE subject = ? AND rowid > ? ORDER BY rowid', (subject, index.last_rowid)).fetchall()
+        for row in rows:
+            sig = (np.frombuffer(row['minhash'], dtype='<u4') if row['minhash']
+                   else question_signature(row['question'], row['answer']))
+            index.add(row['id'], sig, row['document_id'], row['duplicate_of'])
+            index.last_rowid = row['rowid']
+        return index
+
+    def add(self, questions, document_id, subject='General'):
+        """Store generated questions; returns how many were new.
+
+        Exact repeats and near-duplicates of the same document's questions are
+        skipped.  A generation round that adds nothing marks the document
+        exhausted, so it is not regenerated again.
+        """
+        from models.minhash_lsh import question_signature
+        now = datetime.now().isoformat()
+        rows = []
+        with self._index_lock:
+            index = self._subject_index(subject)
+            for q in questions:
+                qid = question_id(document_id, q['question'], q['answer'])
+                if qid in index.lsh:
+                    continue
+                sig = question_signature(q['question'], q['answer'])
+                drop, duplicate_of = index.check(sig, document_id, self.threshold)
+                if drop:
+                    continue
+                index.add(qid, sig, document_id, duplicate_of)
+                rows.append((qid, subject, q.get('topic') or 'General', q.get('difficulty') or 'medium',
+                             document_id, q['question'], json.dumps(q['options']), q['answer'],
+                             q.get('source_sentence'), now, sig.astype('<u4').tobytes(), duplicate_of))
+        with self.db.transaction() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                'INSERT OR IGNORE INTO questions (id, subject, topic, difficulty, document_id, question, options, '
+                'answer, source_sentence, created_at, minhash, duplicate_of) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+            added = conn.total_changes - before
+            conn.execute(
+                'INSERT INTO question_sources (document_id, subject, rounds, exhausted, generated_at) '
+                'VALUES (?, ?, 1, ?, ?) ON CONFLICT (document_id) DO UPDATE SET rounds = rounds + 1, '
+                'exhausted = excluded.exhausted, generated_at = excluded.generated_at',
+                (document_id, subject, int(added == 0), now))
+        return added
+
+    def counts(self, document_id=None, subject=None, topic=None):
+        """Questions per difficulty for a document, or for a subject (and topic)."""
+        where, params = self._scope(document_id, subject, topic)
+        rows = self.db.connect().execute(
+            f'SELECT difficulty, COUNT(*) FROM questions WHERE {where} GROUP BY difficulty', params)
+        return {difficulty: n for difficulty, n in rows}
+
+    def source(self, document_id):
+        row = self.db.connect().execute('SELECT * FROM question_sources WHERE document_id = ?',
+                                        (document_id,)).fetchone()
+        return dict(row) if row else None
+
+    def needs_generation(self, document_id, num, difficulty='easy'):
+        """True when the document's bank cannot fill a ``num`` question quiz of this difficulty."""
+        source = self.source(document_id)
+        if source and source['exhausted']:
+            return False
+        counts = self.counts(document_id=document_id)
+        return sum(counts.values()) < num or counts.get(difficulty, 0) < num
+
+    @staticmethod
+    def _scope(document_id, subject, topic):
+        if document_id is not None:
+            return 'document_id = ?', [document_id]
+        if topic:
+            return 'subject = ? AND topic = ? AND duplicate_of IS NULL', [subject, topic]
+        return 'subject = ? AND duplicate_of IS NULL', [subject]
+
+    def sample(self, num, difficulty='easy', document_id=None, subject=None, topic=None, rng=None):
+        """Up to ``num`` questions, preferred difficulty first, least served first."""
+        rng = rng or random.Random()
+        where, params = self._scope(document_id, subject, topic)
+        conn = self.db.connect()
+        chosen = []
+        for bucket in DIFFICULTY_ORDER.get(difficulty, DIFFICULTY_ORDER['medium']):
+            need = num - len(chosen)
+            if need <= 0:
+                break
+            rows = conn.execute(
+                f'SELECT * FROM questions WHERE {where} AND difficulty = ? ORDER BY times_served LIMIT ?',
+                (*params, bucket, need * CANDIDATE_FACTOR)).fetchall()
+            rows.sort(key=lambda r: (r['times_served'], rng.random()))
+            chosen.extend(rows[:need])
+        if chosen:
+            with self.db.transaction() as conn:
+                conn.executemany('UPDATE questions SET times_served = times_served + 1, last_served_at = ? '
+                                 'WHERE id = ?', [(datetime.now().isoformat(), r['id']) for r in chosen])
+        return [_row_to_question(r) for r in chosen]
+
+    def record_answers(self, answers):
+        """Count submitted answers against the bank questions they name (``question_id``)."""
+        updates = [(int(str(a.get('user_answer', '')) == str(a.get('correct_answer', ''))), a['question_id'])
+                   for a in answers if a.get('question_id')]
+        if updates:
+            with self.db.transaction() as conn:
+                conn.executemany('UPDATE questions SET times_answered = times_answered + 1, '
+                                 'times_correct = times_correct + ? WHERE id = ?', updates)
+        return len(updates)
+
+    def questions_after(self, rowid, limit):
+        """``[(rowid, id, question, difficulty)]`` of up to ``limit`` questions after ``rowid``, in rowid order."""
+        return [tuple(r) for r in self.db.connect().execute(
+            'SELECT rowid, id, question, difficulty FROM questions WHERE rowid > ? ORDER BY rowid LIMIT ?',
+            (rowid, limit))]
+
+    def set_difficulties(self, updates):
+        """Apply ``[(difficulty, question_id)]`` relabels; returns how many rows changed."""
+        if not updates:
+            return 0
+        with self.db.transaction() as conn:
+            return conn.executemany('UPDATE questions SET difficulty = ? WHERE id = ? AND difficulty != ?',
+                                    [(d, qid, d) for d, qid in updates]).rowcount
+
+    def dedupe(self, threshold=None, dry_run=False):
+        """Re-check every stored question in insertion order, as ``add`` would have.
+
+        Near-duplicates within a document are deleted (their usage counts
+        move to the question kept), ones across documents are marked
+        ``duplicate_of``, and missing signatures are filled in.
+        """
+        from models.minhash_lsh import question_signature
+        threshold = self.threshold if threshold is None else threshold
+        indexes, removed, marked, updates = {}, [], 0, []
+        rows = self.db.connect().execute(
+            'SELECT id, subject, document_id, question, answer, duplicate_of, times_served, times_answered, '
+            'times_correct FROM questions ORDER BY subject, rowid').fetchall()
+        for row in rows:
+            index = indexes.get(row['subject'])
+            if index is None:
+                index = indexes[row['subject']] = _SubjectIndex()
+            sig = question_signature(row['question'], row['answer'])
+            hits = index.lsh.query(sig, threshold)
+            same_doc = [h for h, _ in hits if index.documents[h] == row['document_id']]
+            if same_doc:
+                removed.append((row, same_doc[0]))
+                continue
+            duplicate_of = index.canonical[hits[0][0]] if hits else None
+            marked += duplicate_of is not None
+            index.add(row['id'], sig, row['document_id'], duplicate_of)
+            updates.append((sig.astype('<u4').tobytes(), duplicate_of, row['id']))
+        if not dry_run:
+            with self.db.transaction() as conn:
+                conn.executemany('UPDATE questions SET minhash = ?, duplicate_of = ? WHERE id = ?', updates)
+                for row, kept in removed:
+                    conn.execute('UPDATE questions SET times_served = times_served + ?, '
+                                 'times_answered = times_answered + ?, times_correct = times_correct + ? '
+                                 'WHERE id = ?', (row['times_served'], row['times_answered'],
+                                                  row['times_correct'], kept))
+                    conn.execute('DELETE FROM questions WHERE id = ?', (row['id'],))
+            with self._index_lock:
+                self._indexes = {}
+        return {'checked': len(rows), 'removed': len(removed), 'marked_duplicate': marked}
+
+    def forget(self, document_ids):
+        """Delete the questions of documents that are gone; returns how many went.
+
+        A question kept only as the ``duplicate_of`` target of other
+        documents' questions hands that role to the first of them.
+        """
+        document_ids = list(document_ids)
+        removed = 0
+        with self.db.transaction() as conn:
+            for doc_id in document_ids:
+                gone = [r[0] for r in conn.execute('SELECT id FROM questions WHERE document_id = ?', (doc_id,))]
+                for qid in gone:
+                    copies = [r[0] for r in conn.execute(
+                        'SELECT id FROM questions WHERE duplicate_of = ? AND document_id != ? ORDER BY rowid',
+                        (qid, doc_id))]
+                    if copies:
+                        conn.execute('UPDATE questions SET duplicate_of = NULL WHERE id = ?', (copies[0],))
+                        conn.executemany('UPDATE questions SET duplicate_of = ? WHERE id = ?',
+                                         [(copies[0], c) for c in copies[1:]])
+                removed += conn.execute('DELETE FROM questions WHERE document_id = ?', (doc_id,)).rowcount
+                conn.execute('DELETE FROM question_sources WHERE document_id = ?', (doc_id,))
+        if removed:
+            with self._index_lock:
+                self._indexes = {}
+        return removed
+
+    def question_stats(self, question_id):
+        row = self.db.connect().execute(
+            'SELECT times_served, times_answered, times_correct FROM questions WHERE id = ?',
+            (question_id,)).fetchone()
+        return dict(row) if row else None
+
+
+_bank = None
+_bank_lock = threading.Lock()
+
+
+def get_question_bank():
+    global _bank
+    if _bank is None:
+        with _bank_lock:
+            if _bank is None:
+                _bank = QuestionBank(default_db_path(), threshold=Config.QUESTION_DUPLICATE_THRESHOLD)
+    return _bank
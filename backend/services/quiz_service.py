@@ -1,7 +1,9 @@
 from models.quiz_model import generate_mcqs, classify_difficulty
+from models.document_analysis import analyze_document
 
-def create_quiz_from_notes(notes, subject, max_questions=5):
-    questions = generate_mcqs(notes, max_questions)
+def create_quiz_from_notes(notes, subject, max_questions=5, analysis=None, seed=None):
+    analysis = analysis or analyze_document(notes)
+    questions = generate_mcqs(notes, max_questions, analysis=analysis, seed=seed, subject=subject)
     question_texts = [q.get('question', q.get('stem', '')) for q in questions]
     difficulties = classify_difficulty(question_texts)
     for i, q in enumerate(questions):
@@ -0,0 +1,762 @@
+"""Related-material retrieval: nearest note chunks by TF-IDF cosine similarity.
+
+Every ingested document is cut into chunks of about ``CHUNK_WORDS`` words
+(whole sentences), and each chunk becomes one row of a sparse TF-IDF matrix.
+Terms are the search index's content tokens, hashed into ``N_FEATURES``
+columns, so no vocabulary has to be shared between workers.  Rows are
+sublinear-TF x IDF weighted and L2-normalised; a query is vectorised the same
+way and scored against rows with blocked sparse matrix-vector products.
+
+The matrix lives in segments: directories of ``.npy`` CSR arrays opened
+memory-mapped.  Once the index holds ``MIN_CLUSTERED`` chunks it is rebuilt
+into one base segment clustered with spherical k-means: rows are stored
+grouped by cluster and the (sparse, top-term) centroids act as a coarse
+index, so a query scores the centroids and then only the rows of the
+``NPROBE`` closest clusters.  Chunks added later go into small segments
+sorted by the same centroids, merged by size tier; when they outgrow
+``REBUILD_SHARE`` of the base everything is re-clustered with fresh IDF.
+Merges and rebuilds run as an NLP pool task (``nlp_tasks.maintain_related``)
+or from ``python -m services.related_notes maintain``, one process at a time
+under a file lock, never in a web worker.  As in the search index, SQLite records which segments are live.
+
+Chunks belong to the user whose notes they came from: every row carries a
+user code that queries filter on, and a hit is only returned when
+``related_documents`` lists its document for the querying user.
+
+Documents the document store evicts are forgotten: their rows are
+tombstoned per segment (skipped by queries before the top chunks are picked)
+until maintenance rewrites the segment without them, which it does as soon
+as ``PURGE_SHARE`` of a segment's chunks are tombstoned.
+"""
+import logging
+import math
+import os
+import shutil
+import threading
+import uuid
+import zlib
+from datetime import datetime
+
+import numpy as np
+
+from services.search_index import SENTENCE_RE, index_terms
+from services.sqlite_db import SqliteDatabase, default_db_path
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: single process, no lock needed
+    fcntl = None
+
+log = logging.getLogger(__name__)
+
+INDEX_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', 'related')
+N_FEATURES = 1 << 18
+CHUNK_WORDS = 120
+MIN_CLUSTERED = 1000      # chunks before the index is clustered at all
+MAX_CLUSTERS = 1024
+CENTROID_TERMS = 256      # non-zero terms kept per centroid
+CENTROID_MAX_DF = 2       # columns in more rows than this many clusters' worth are left out of centroids
+KMEANS_SAMPLE = 50000     # rows the centroids are fitted on
+KMEANS_ITERATIONS = 8
+REBUILD_SHARE = 0.5       # re-cluster once chunks added since the last build exceed this share of it
+NPROBE = 16
+MERGE_FACTOR = 8
+BLOCK_ROWS = 8192
+MAX_EXPANSION = 1 << 22   # centroid products per block when assigning rows to clusters
+TEXT_CHARS = 400
+MAINTAIN_TIMEOUT = 900    # seconds a pool worker may spend on one maintenance run
+PURGE_SHARE = 0.2         # rewrite a segment once this share of its chunks is tombstoned
+
+DOCUMENTS_TABLE = """
+CREATE TABLE IF NOT EXISTS related_documents (
+    user_id     TEXT NOT NULL,
+    document_id TEXT NOT NULL,
+    subject     TEXT NOT NULL,
+    chunks      INTEGER NOT NULL,
+    indexed_at  TEXT NOT NULL,
+    PRIMARY KEY (user_id, document_id)
+)"""
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS related_segments (
+    name       TEXT PRIMARY KEY,
+    generation TEXT,
+    chunks     INTEGER NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS related_deleted (
+    segment     TEXT NOT NULL,
+    document_id TEXT NOT NULL,
+    chunks      INTEGER NOT NULL,
+    deleted_at  TEXT NOT NULL,
+    PRIMARY KEY (segment, document_id)
+);""" + DOCUMENTS_TABLE + ";\n"
+LEGACY_USER = 'default'   # owner of chunks indexed before the index was split by user
+
+
+# -- vectorising -----------------------------------------------------------------
+def feature_column(term):
+    return zlib.crc32(term.encode('utf-8')) & (N_FEATURES - 1)
+
+
+def subject_code(subject):
+    return zlib.crc32(subject.encode('utf-8'))
+
+
+def user_code(user_id):
+    return zlib.crc32(user_id.encode('utf-8'))
+
+
+def chunk_spans(text, words=CHUNK_WORDS):
+    """``[(start, end)]`` character spans of runs of whole sentences of about ``words`` words."""
+    bounds = [0] + [m.end() for m in SENTENCE_RE.finditer(text)] + [len(text)]
+    spans, start, count = [], 0, 0
+    for a, b in zip(bounds, bounds[1:]):
+        count += len(text[a:b].split())
+        if count >= words:
+            spans.append((start, b))
+            start, count = b, 0
+    if text[start:].strip():
+        spans.append((start, len(text)))
+    return spans
+
+
+def term_counts(text):
+    """Distinct hashed columns of the text's content terms and their counts."""
+    columns = np.fromiter((feature_column(t) for t in index_terms(text)), dtype=np.uint32)
+    return np.unique(columns, return_counts=True)
+
+
+def idf_from(df, n):
+    """Smoothed IDF (as in ``CorpusTfidf``) of every column."""
+    return (np.log((1 + n) / (1 + df)) + 1).astype(np.float32)
+
+
+def weigh(indptr, indices, counts, idf):
+    """L2-normalised ``(1 + log tf) * idf`` row weights; rows must be non-empty."""
+    w = (1 + np.log(counts.astype(np.float32))) * idf[indices]
+    norms = np.sqrt(np.add.reduceat(w * w, indptr[:-1])) if len(w) else np.zeros(0, np.float32)
+    return (w / np.repeat(np.maximum(norms, 1e-12), np.diff(indptr))).astype(np.float32)
+
+
+def _expand(starts, lengths):
+    """Concatenated ``arange(start, start + length)`` for every pair."""
+    lengths = np.asarray(lengths, dtype=np.int64)
+    total = int(lengths.sum())
+    return np.repeat(np.asarray(starts, dtype=np.int64) - (np.cumsum(lengths) - lengths), lengths) + np.arange(total)
+
+
+def take_rows(indptr, rows):
+    """``(indptr, nnz positions)`` of the sub-matrix made of ``rows``."""
+    lengths = indptr[rows + 1] - indptr[rows]
+    return np.concatenate([[0], np.cumsum(lengths)]), _expand(indptr[rows], lengths)
+
+
+# -- centroids ---------------------------------------------------------------------
+class Centroids:
+    """Sparse unit-length centroids, stored by column for scoring sparse rows."""
+
+    def __init__(self, cols, clusters, weights, k):
+        self.cols, self.clusters, self.weights, self.k = cols, clusters, weights, int(k)
+        # Where each column's entries start, so a row's nonzeros find theirs with plain lookups.
+        self.col_start = np.searchsorted(cols, np.arange(N_FEATURES + 1)).astype(np.int64)
+
+    @classmethod
+    def from_entries(cls, clusters, cols, values, k):
+        """Keep each cluster's ``CENTROID_TERMS`` largest entries and normalise."""
+        order = np.lexsort((-values, clusters))
+        clusters, cols, values = clusters[order], cols[order], values[order]
+        first = np.searchsorted(clusters, clusters)
+        keep = np.arange(len(clusters)) - first < CENTROID_TERMS
+        clusters, cols, values = clusters[keep], cols[keep], values[keep]
+        norms = np.sqrt(np.bincount(clusters, weights=values * values, minlength=k))
+        values = values / np.maximum(norms[clusters], 1e-12)
+        order = np.argsort(cols, kind='stable')
+        return cls(cols[order].astype(np.uint32), clusters[order].astype(np.int32),
+                   values[order].astype(np.float32), k)
+
+    def scores(self, indptr, indices, data):
+        """Dense ``rows x k`` cosine similarities of CSR rows to every centroid."""
+        lo = self.col_start[indices]
+        n = self.col_start[indices + 1] - lo
+        pairs = _expand(lo, n)
+        rows = np.repeat(np.repeat(np.arange(len(indptr) - 1), np.diff(indptr)), n)
+        sims = np.bincount(rows * self.k + self.clusters[pairs], weights=np.repeat(data, n) * self.weights[pairs],
+                           minlength=(len(indptr) - 1) * self.k)
+        return sims.reshape(-1, self.k)
+
+    def closest(self, indptr, indices, data):
+        """``(labels, similarities)``: every row's closest centroid, in blocks that bound the work per step."""
+        labels = np.zeros(len(indptr) - 1, dtype=np.int32)
+        best = np.zeros(len(labels))
+        start = 0
+        while start < len(labels):
+            end = min(start + BLOCK_ROWS, len(labels))
+            while True:
+                a, b = indptr[start], indptr[end]
+                cols = np.asarray(indices[a:b])
+                work = int((self.col_start[cols + 1] - self.col_start[cols]).sum())
+                if work <= MAX_EXPANSION or end - start == 1:
+                    break
+                end = start + (end - start) // 2
+            sims = self.scores(indptr[start:end + 1] - a, cols, np.asarray(data[a:b]))
+            labels[start:end] = sims.argmax(axis=1)
+            best[start:end] = sims.max(axis=1)
+            start = end
+        return labels, best
+
+    def assign(self, indptr, indices, data):
+        return self.closest(indptr, indices, data)[0]
+
+
+def fit_centroids(indptr, indices, data, k, iterations=KMEANS_ITERATIONS, sample=KMEANS_SAMPLE, seed=0):
+    """Spherical k-means over (a sample of) the CSR rows; returns ``Centroids``.
+
+    Seeds are picked k-means++ style, favouring rows far from the seeds so
+    far, in batches that double in size so large ``k`` takes a few passes.
+    Only distinctive columns make up the centroids: one found in more rows
+    than ``CENTROID_MAX_DF`` clusters hold on average says little about
+    which cluster a row belongs to, and would let shared vocabulary decide
+    the assignment.
+    """
+    rng = np.random.default_rng(seed)
+    n = len(indptr) - 1
+    rows = np.sort(rng.choice(n, min(n, sample), replace=False))
+    indptr, pos = take_rows(indptr, rows)
+    indices, data = np.asarray(indices)[pos], np.asarray(data)[pos]
+    k = min(k, len(rows))
+    distinctive = np.bincount(indices, minlength=N_FEATURES)[indices] <= max(CENTROID_MAX_DF * len(rows) / k, 1)
+
+    def centroids_of(labels, k):
+        seeded = np.repeat(labels, np.diff(indptr))
+        keep = (seeded >= 0) & distinctive
+        keys, sums = np.unique(seeded[keep] * N_FEATURES + indices[keep], return_inverse=True)
+        sums = np.bincount(sums, weights=data[keep])
+        return Centroids.from_entries(keys // N_FEATURES, keys % N_FEATURES, sums, k)
+
+    labels = np.full(len(rows), -1, dtype=np.int64)
+    best = np.zeros(len(rows))
+    chosen = 0
+    while chosen < k:
+        weights = (1 - best).clip(0) ** 2
+        weights[labels >= 0] = 0
+        if not weights.any():
+            weights = (labels < 0).astype(float)
+        batch = rng.choice(len(rows), min(max(1, chosen // 2), k - chosen, np.count_nonzero(weights)),
+                           replace=False, p=weights / weights.sum())
+        seeds = np.full(len(rows), -1, dtype=np.int64)
+        seeds[batch] = np.arange(len(batch))
+        best = np.maximum(best, centroids_of(seeds, len(batch)).closest(indptr, indices, data)[1])
+        labels[batch] = chosen + np.arange(len(batch))
+        chosen += len(batch)
+    for i in range(iterations + 1):
+        centroids = centroids_of(labels, k)
+        if i == iterations:
+            return centroids
+        labels, best = centroids.closest(indptr, indices, data)
+        labels = labels.astype(np.int64)
+        # Empty clusters are reseeded with the rows that fit their cluster worst.
+        empty = np.setdiff1d(np.arange(k), labels)
+        labels[np.argsort(best)[:len(empty)]] = empty
+
+
+# -- segments ------------------------------------------------------------------------
+def write_segment(path, arrays):
+    """Write ``{name: array}`` as a segment directory that appears at ``path`` only once complete."""
+    tmp = f'{path}.{os.getpid()}.tmp'
+    os.makedirs(tmp)
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp, name + '.npy'), array)
+    os.replace(tmp, path)
+
+
+def segment_arrays(doc_ids, starts, ends, subjects, users, indptr, indices, counts, data, centroids=None):
+    """The arrays of a segment, rows grouped by their closest centroid when ``centroids`` is given."""
+    indptr = np.asarray(indptr, dtype=np.int64)
+    if centroids is not None:
+        labels = centroids.assign(indptr, indices, data)
+        rows = np.argsort(labels, kind='stable')
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(labels, minlength=centroids.k))])
+        doc_ids, starts, ends, subjects, users = (np.asarray(a)[rows]
+                                                  for a in (doc_ids, starts, ends, subjects, users))
+        indptr, pos = take_rows(indptr, rows)
+        indices, counts, data = (np.asarray(a)[pos] for a in (indices, counts, data))
+    else:
+        offsets = np.array([0, len(indptr) - 1])
+    df_cols, df_counts = np.unique(indices, return_counts=True)
+    return {'doc_ids': np.asarray(doc_ids, dtype='S64'), 'starts': np.asarray(starts, dtype=np.uint32),
+            'ends': np.asarray(ends, dtype=np.uint32), 'subjects': np.asarray(subjects, dtype=np.uint32),
+            'users': np.asarray(users, dtype=np.uint32),
+            'indptr': indptr, 'indices': np.asarray(indices, dtype=np.uint32),
+            'counts': np.asarray(counts, dtype=np.uint16), 'data': np.asarray(data, dtype=np.float32),
+            'df_cols': df_cols.astype(np.uint32), 'df_counts': df_counts.astype(np.uint32),
+            'offsets': offsets.astype(np.int64)}
+
+
+class Segment:
+    """A memory-mapped segment; the base segment also carries the centroids."""
+
+    def __init__(self, path):
+        self.path = path
+        arrays = {name[:-4]: np.load(os.path.join(path, name), mmap_mode='r')
+                  for name in os.listdir(path) if name.endswith('.npy')}
+        self.__dict__.update(arrays)
+        if 'users' not in arrays:  # written before chunks had owners
+            self.users = np.full(len(self.doc_ids), user_code(LEGACY_USER), dtype=np.uint32)
+        self.centroids = (Centroids(self.c_cols, self.c_clusters, self.c_weights, len(self.offsets) - 1)
+                          if 'c_cols' in arrays else None)
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+
+def dead_rows(seg, document_ids):
+    """Mask of the segment's rows that belong to ``document_ids``."""
+    return np.isin(seg.doc_ids, np.array([d.encode('ascii') for d in document_ids], dtype='S64'))
+
+
+def concatenate_segments(segments, dead=None):
+    """One segment's worth of arrays (without clustering) from several segments.
+
+    ``dead`` maps a segment to the document ids whose rows are left out.
+    """
+    indptr, shift = [np.zeros(1, dtype=np.int64)], 0
+    for seg in segments:
+        indptr.append(np.asarray(seg.indptr[1:]) + shift)
+        shift += int(seg.indptr[-1])
+    joined = {name: np.concatenate([np.asarray(getattr(seg, name)) for seg in segments])
+              for name in ('doc_ids', 'starts', 'ends', 'subjects', 'users', 'indices', 'counts', 'data')}
+    joined['indptr'] = np.concatenate(indptr)
+    if dead:
+        keep = np.concatenate([~dead_rows(seg, dead[seg]) if dead.get(seg) else np.ones(len(seg), dtype=bool)
+                               for seg in segments])
+        rows = np.flatnonzero(keep)
+        joined['indptr'], pos = take_rows(joined['indptr'], rows)
+        for name in ('doc_ids', 'starts', 'ends', 'subjects', 'users'):
+            joined[name] = joined[name][rows]
+        for name in ('indices', 'counts', 'data'):
+            joined[name] = joined[name][pos]
+    return joined
+
+
+class RelatedNotes:
+    def __init__(self, path, index_dir=INDEX_DIR, background=True, min_clustered=MIN_CLUSTERED,
+                 rebuild_share=REBUILD_SHARE, nprobe=NPROBE, merge_factor=MERGE_FACTOR, nlp=None):
+        self.db = SqliteDatabase(path, SCHEMA)
+        self._migrate()
+        self.index_dir = index_dir
+        self.background = background
+        self.nlp = nlp
+        self.min_clustered = min_clustered
+        self.rebuild_share = rebuild_share
+        self.nprobe = nprobe
+        self.merge_factor = merge_factor
+        self._segments = {}
+        self._df = (None, None)
+        self._lock = threading.Lock()
+        self._maintaining = False
+        self._maintain_lock = threading.Lock()
+
+    def _migrate(self):
+        """Give documents indexed before the user split to ``LEGACY_USER``."""
+        columns = {r[1] for r in self.db.connect().execute('PRAGMA table_info(related_documents)')}
+        if 'user_id' in columns:
+            return
+        with self.db.transaction() as conn:
+            conn.execute('ALTER TABLE related_documents RENAME TO related_documents_legacy')
+            conn.execute(DOCUMENTS_TABLE)
+            conn.execute('INSERT INTO related_documents (user_id, document_id, subject, chunks, indexed_at) '
+                         'SELECT ?, document_id, subject, chunks, indexed_at FROM related_documents_legacy',
+                         (LEGACY_USER,))
+            conn.execute('DROP TABLE related_documents_legacy')
+
+    def has_document(self, user_id, document_id):
+        return self.db.connect().execute('SELECT 1 FROM related_documents WHERE user_id = ? AND document_id = ?',
+                                         (user_id, document_id)).fetchone() is not None
+
+    def forget(self, document_ids):
+        """Drop documents for every user; returns how many segments held chunks of them.
+
+        Called with the ids the document store evicted.  The documents can be
+        indexed again at once; their old chunks are tombstoned until maintenance
+        rewrites the segments holding them.
+        """
+        document_ids = list(document_ids)
+        if not document_ids:
+            return 0
+        while True:
+            try:
+                dead = []
+                for row, seg in self._open(self._rows()):
+                    mask = dead_rows(seg, document_ids)
+                    if mask.any():
+                        found, counts = np.unique(np.asarray(seg.doc_ids)[mask], return_counts=True)
+                        dead.extend((row['name'], d.decode('ascii'), int(n)) for d, n in zip(found, counts))
+            except FileNotFoundError:
+                continue  # maintenance replaced a segment while listing; look again
+            names = sorted({name for name, _, _ in dead})
+            now = datetime.now().isoformat()
+            with self.db.transaction() as conn:
+                marks = ','.join('?' * len(names))
+                if names and conn.execute(f'SELECT COUNT(*) FROM related_segments WHERE name IN ({marks})',
+                                          names).fetchone()[0] != len(names):
+                    continue
+                conn.executemany('INSERT OR IGNORE INTO related_deleted (segment, document_id, chunks, deleted_at) '
+                                 'VALUES (?, ?, ?, ?)', [(name, d, n, now) for name, d, n in dead])
+                conn.executemany('DELETE FROM related_documents WHERE document_id = ?', [(d,) for d in document_ids])
+            if dead:
+                self._schedule()
+            return len(names)
+
+    def _tombstones(self):
+        """``{segment name: {document id: chunks}}`` of forgotten documents not yet rewritten away."""
+        dead = {}
+        for name, doc_id, chunks in self.db.connect().execute(
+                'SELECT segment, document_id, chunks FROM related_deleted'):
+            dead.setdefault(name, {})[doc_id] = chunks
+        return dead
+
+    # -- state ---------------------------------------------------------------------
+    def _rows(self):
+        return self.db.connect().execute('SELECT name, generation, chunks FROM related_segments').fetchall()
+
+    def _open(self, rows):
+        """``[(row, Segment)]`` for the live segments, reusing open ones."""
+        with self._lock:
+            opened = {r['name']: self._segments.get(r['name']) or Segment(os.path.join(self.index_dir, r['name']))
+                      for r in rows}
+            self._segments = opened
+        return [(r, opened[r['name']]) for r in rows]
+
+    @staticmethod
+    def _base(segments):
+        return next(((row, seg) for row, seg in segments if seg.centroids is not None), (None, None))
+
+    def _idf(self, segments):
+        """IDF over all live chunks, recomputed when the set of segments changes."""
+        key = frozenset(row['name'] for row, _ in segments)
+        cached_key, idf = self._df
+        if cached_key != key:
+            df = np.zeros(N_FEATURES, dtype=np.float64)
+            for _, seg in segments:
+                df += np.bincount(seg.df_cols, weights=seg.df_counts, minlength=N_FEATURES)
+            idf = idf_from(df, sum(row['chunks'] for row, _ in segments))
+            self._df = (key, idf)
+        return idf
+
+    def stats(self):
+        rows = self._rows()
+        base = next((r for r in rows if r['generation'] == r['name']), None)
+        return {'segments': len(rows), 'chunks': sum(r['chunks'] for r in rows),
+                'clustered_chunks': base['chunks'] if base else 0,
+                'clusters': len(Segment(os.path.join(self.index_dir, base['name'])).offsets) - 1 if base else 0}
+
+    # -- writing -------------------------------------------------------------------
+    def add_text(self, user_id, subject, document_id, text):
+        """Index a stored document's chunks for a user unless already indexed; returns how many were added."""
+        if not text or self.has_document(user_id, document_id):
+            return 0
+        starts, ends, indptr, indices, counts = [], [], [0], [], []
+        for start, end in chunk_spans(text):
+            cols, tf = term_counts(text[start:end])
+            if len(cols):
+                starts.append(start)
+                ends.append(end)
+                indices.append(cols)
+                counts.append(tf)
+                indptr.append(indptr[-1] + len(cols))
+        if not starts:
+            return 0
+        indptr, indices, counts = np.array(indptr), np.concatenate(indices), np.concatenate(counts)
+        segments = self._open(self._rows())
+        base_row, base = self._base(segments)
+        data = weigh(indptr, indices, counts, self._idf(segments))
+        name = uuid.uuid4().hex
+        os.makedirs(self.index_dir, exist_ok=True)
+        write_segment(os.path.join(self.index_dir, name), segment_arrays(
+            [document_id] * len(starts), starts, ends, [subject_code(subject)] * len(starts),
+            [user_code(user_id)] * len(starts), indptr, indices, counts, data, base.centroids if base else None))
+        now = datetime.now().isoformat()
+        with self.db.transaction() as conn:
+            added = conn.execute('INSERT OR IGNORE INTO related_documents (user_id, document_id, subject, chunks, '
+                                 'indexed_at) VALUES (?, ?, ?, ?, ?)',
+                                 (user_id, document_id, subject, len(starts), now)).rowcount
+            if added:
+                conn.execute('INSERT INTO related_segments (name, generation, chunks, created_at) VALUES (?, ?, ?, ?)',
+                             (name, base_row['name'] if base else None, len(starts), now))
+        if not added:
+            # Another worker indexed it meanwhile.
+            shutil.rmtree(os.path.join(self.index_dir, name), ignore_errors=True)
+            return 0
+        self._schedule()
+        return len(starts)
+
+    def _schedule(self):
+        """Hand due maintenance to the NLP pool (at most one request in flight per process)."""
+        if not self.background:
+            self.maintain()
+            return
+        if self._next_step(self._rows()) is None:
+            return
+        with self._maintain_lock:
+            if self._maintaining:
+                return
+            self._maintaining = True
+
+        def run():
+            from services import nlp_tasks
+            try:
+                if self.nlp is not None:
+                    self.nlp.run(nlp_tasks.maintain_related, timeout=MAINTAIN_TIMEOUT)
+                else:
+                    self.maintain()
+            except Exception:
+                log.exception('Related-notes maintenance failed; retried after the next add')
+            finally:
+                with self._maintain_lock:
+                    self._maintaining = False
+        threading.Thread(target=run, name='related-maintain', daemon=True).start()
+
+    def _tier(self, chunks):
+        return int(math.log(max(chunks, 1), self.merge_factor))
+
+    def _next_step(self, rows):
+        """``('rebuild', rows)``, ``('merge', group)`` or None when the segments need nothing."""
+        total = sum(r['chunks'] for r in rows)
+        base = next((r for r in rows if r['generation'] == r['name']), None)
+        built = base['chunks'] if base else 0
+        if total >= self.min_clustered and total - built > self.rebuild_share * built:
+            return 'rebuild', rows
+        dead = self._tombstones()
+        purge = next((r for r in rows if sum(dead.get(r['name'], {}).values()) >= max(PURGE_SHARE * r['chunks'], 1)),
+                     None)
+        if purge is not None:
+            # Rewriting the base segment on its own would lose its centroids, so it is rebuilt instead.
+            return ('rebuild', rows) if purge is base else ('merge', [purge])
+        tiers = {}
+        for row in rows:
+            if row is not base:
+                tiers.setdefault(self._tier(row['chunks']), []).append(row)
+        group = next((sorted(g, key=lambda r: r['chunks'])[:self.merge_factor]
+                      for _, g in sorted(tiers.items()) if len(g) >= self.merge_factor), None)
+        return ('merge', group) if group else None
+
+    def maintain(self, rebuild=False):
+        """Re-cluster or merge small segments until neither is due; returns the steps taken.
+
+        ``rebuild`` re-clusters first whether or not it is due.
+
+        Only one process maintains the index at a time; others return 0
+        straight away (the one holding the lock keeps going until nothing is due).
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(self.index_dir)), exist_ok=True)
+        lock = open(self.index_dir + '.lock', 'w')
+        try:
+            if fcntl:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return 0
+            steps = 0
+            while True:
+                rows = self._rows()
+                step = ('rebuild', rows) if rebuild and not steps else self._next_step(rows)
+                if step is None:
+                    return steps
+                action, rows = step
+                if not (self.rebuild() if action == 'rebuild' else self._merge(rows)):
+                    return steps
+                steps += 1
+        finally:
+            lock.close()
+
+    def _swap(self, old, name, generation, chunks, dropped=()):
+        """Replace segments ``old`` by the new segment ``name`` unless another worker changed them first.
+
+        ``dropped`` lists the ``(segment, document id)`` tombstones the new
+        segment was written without; ``name`` is None when nothing was left.
+        """
+        names = [r['name'] for r in old]
+        marks = ','.join('?' * len(names))
+        with self.db.transaction() as conn:
+            still_there = conn.execute(f'SELECT COUNT(*) FROM related_segments WHERE name IN ({marks})',
+                                       names).fetchone()[0] == len(names)
+            if still_there:
+                conn.execute(f'DELETE FROM related_segments WHERE name IN ({marks})', names)
+                conn.executemany('DELETE FROM related_deleted WHERE segment = ? AND document_id = ?', dropped)
+                if name is None:
+                    conn.execute(f'DELETE FROM related_deleted WHERE segment IN ({marks})', names)
+                else:
+                    # Documents forgotten since the segments were read are still in the new one.
+                    conn.execute(f'UPDATE related_deleted SET segment = ? WHERE segment IN ({marks})', [name] + names)
+                    conn.execute('INSERT INTO related_segments (name, generation, chunks, created_at) '
+                                 'VALUES (?, ?, ?, ?)', (name, generation, chunks, datetime.now().isoformat()))
+        for gone in (names if still_there else [name] if name else []):
+            # Readers holding the old segment's memory maps keep working after the unlink.
+            shutil.rmtree(os.path.join(self.index_dir, gone), ignore_errors=True)
+        return still_there
+
+    def _merge(self, group):
+        """Merge small segments into one, grouped by the current centroids."""
+        segments = self._open(self._rows())
+        base_row, base = self._base(segments)
+        by_name = {row['name']: seg for row, seg in segments}
+        if any(r['name'] not in by_name for r in group):
+            return False
+        dead, dropped = self._dead_in(group, by_name)
+        joined = concatenate_segments([by_name[r['name']] for r in group], dead)
+        n = len(joined['doc_ids'])
+        name = uuid.uuid4().hex if n else None
+        if n:
+            write_segment(os.path.join(self.index_dir, name),
+                          segment_arrays(centroids=base.centroids if base else None, **joined))
+        return self._swap(group, name, base_row['name'] if base else None, n, dropped)
+
+    def _dead_in(self, rows, by_name):
+        """``({Segment: document ids}, [(segment name, document id)])`` tombstoned in ``rows``."""
+        tombstones = self._tombstones()
+        dead = {by_name[r['name']]: list(tombstones[r['name']]) for r in rows if r['name'] in tombstones}
+        return dead, [(r['name'], d) for r in rows for d in tombstones.get(r['name'], ())]
+
+    def rebuild(self, seed=0):
+        """Re-cluster every live chunk into one base segment, with IDF recomputed over all of them."""
+        rows = self._rows()
+        if not rows:
+            return False
+        segments = self._open(rows)
+        dead, dropped = self._dead_in(rows, {row['name']: seg for row, seg in segments})
+        joined = concatenate_segments([seg for _, seg in segments], dead)
+        n = len(joined['doc_ids'])
+        if not n:
+            return self._swap(rows, None, None, 0, dropped)
+        df = np.bincount(joined['indices'], minlength=N_FEATURES)
+        joined['data'] = weigh(joined['indptr'], joined['indices'], joined['counts'], idf_from(df, n))
+        centroids = fit_centroids(joined['indptr'], joined['indices'], joined['data'],
+                                  min(MAX_CLUSTERS, max(1, int(math.sqrt(n)))), seed=seed)
+        arrays = segment_arrays(centroids=centroids, **joined)
+        arrays.update(c_cols=centroids.cols, c_clusters=centroids.clusters, c_weights=centroids.weights)
+        name = uuid.uuid4().hex
+        write_segment(os.path.join(self.index_dir, name), arrays)
+        return self._swap(rows, name, name, n, dropped)
+
+    # -- reading -------------------------------------------------------------------
+    def _candidates(self, seg, ranges, qd, user_id, subject, exclude, limit, dead=()):
+        """Best ``limit`` rows of a segment's ``[(start, end)]`` row ranges as ``[(score, segment, row)]``.
+
+        Each range is scored in blocks of at most ``BLOCK_ROWS`` contiguous
+        rows: one slice of the CSR arrays, a gather of the query weights and a
+        per-row sum.
+        """
+        best = []
+        for start, end in ranges:
+            for r0 in range(start, end, BLOCK_ROWS):
+                r1 = min(r0 + BLOCK_ROWS, end)
+                a, b = int(seg.indptr[r0]), int(seg.indptr[r1])
+                scores = np.add.reduceat(seg.data[a:b] * qd[seg.indices[a:b]], seg.indptr[r0:r1] - a)
+                rows = np.arange(r0, r1)
+                keep = seg.users[r0:r1] == user_code(user_id)
+                rows, scores = rows[keep], scores[keep]
+                if subject is not None:
+                    keep = seg.subjects[rows] == subject_code(subject)
+                    rows, scores = rows[keep], scores[keep]
+                if exclude is not None:
+                    keep = seg.doc_ids[rows] != exclude.encode('ascii')
+                    rows, scores = rows[keep], scores[keep]
+                if dead:
+                    keep = ~np.isin(seg.doc_ids[rows], np.array([d.encode('ascii') for d in dead], dtype='S64'))
+                    rows, scores = rows[keep], scores[keep]
+                if len(rows) > limit:
+                    top = np.argpartition(-scores, limit)[:limit]
+                    rows, scores = rows[top], scores[top]
+                best.extend(zip(scores.tolist(), [seg] * len(rows), rows.tolist()))
+        return sorted(best, key=lambda c: -c[0])[:limit]
+
+    def query(self, user_id, text, limit=5, subject=None, exclude=None, documents=None, nprobe=None):
+        """Chunks of the user's notes most similar to ``text`` as ``[{document_id, subject, score, text}]``.
+
+        Chunks of document ``exclude`` are skipped, ``subject`` restricts the
+        results to one subject, and ``documents`` (a ``DocumentStore``)
+        supplies chunk text; documents it no longer holds are left out.
+        """
+        try:
+            return self._query(user_id, text, limit, subject, exclude, documents, nprobe or self.nprobe)
+        except FileNotFoundError:
+            # A merge replaced a segment between listing and opening it.
+            return self._query(user_id, text, limit, subject, exclude, documents, nprobe or self.nprobe)
+
+    def _query(self, user_id, text, limit, subject, exclude, documents, nprobe):
+        segments = self._open(self._rows())
+        cols, tf = term_counts(text or '')
+        if not segments or not len(cols):
+            return []
+        weights = weigh(np.array([0, len(cols)]), cols, tf, self._idf(segments))
+        qd = np.zeros(N_FEATURES, dtype=np.float32)
+        qd[cols] = weights
+        base_row, base = self._base(segments)
+        probe = None
+        if base is not None:
+            sims = base.centroids.scores(np.array([0, len(cols)]), cols, weights)[0]
+            probe = np.argsort(-sims)[:nprobe]
+        hits = []
+        tombstones = self._tombstones()
+        for row, seg in segments:
+            if probe is not None and row['generation'] == base_row['name']:
+                ranges = [(int(seg.offsets[c]), int(seg.offsets[c + 1])) for c in probe]
+            else:
+                ranges = [(0, len(seg))]
+            hits.extend(self._candidates(seg, ranges, qd, user_id, subject, exclude, limit * 2,
+                                         tombstones.get(row['name'], ())))
+        results, subjects = [], {}
+        for score, seg, i in sorted(hits, key=lambda h: -h[0]):
+            if score <= 0:
+                break
+            doc_id = seg.doc_ids[i].decode('ascii')
+            if doc_id not in subjects:
+                # Also rules out another user whose code collides with this one.
+                found = self.db.connect().execute('SELECT subject FROM related_documents '
+                                                  'WHERE user_id = ? AND document_id = ?',
+                                                  (user_id, doc_id)).fetchone()
+                subjects[doc_id] = found[0] if found else None
+            if subjects[doc_id] is None:
+                continue
+            start, end = int(seg.starts[i]), int(seg.ends[i])
+            chunk = ''
+            if documents is not None:
+                doc_text = documents.get_text(doc_id)
+                if doc_text is None:
+                    continue
+                chunk = doc_text[start:end].strip()
+                if len(chunk) > TEXT_CHARS:
+                    chunk = chunk[:TEXT_CHARS].rsplit(' ', 1)[0] + '...'
+            results.append({'document_id': doc_id, 'subject': subjects[doc_id], 'score': round(score, 4),
+                            'start': start, 'end': end, 'text': chunk})
+            if len(results) == limit:
+                break
+        return results
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_related_notes():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                from services.nlp_executor import get_nlp_executor
+                _index = RelatedNotes(default_db_path(), nlp=get_nlp_executor())
+    return _index
+
+
+if __name__ == '__main__':
+    import sys
+    command = sys.argv[1] if len(sys.argv) > 1 else ''
+    if command not in ('maintain', 'rebuild', 'stats'):
+        print('usage: python -m services.related_notes maintain|rebuild|stats')
+        sys.exit(1)
+    index = RelatedNotes(default_db_path())
+    if command == 'maintain':
+        print(f'{index.maintain()} maintenance step(s)')
+    elif command == 'rebuild':
+        print(f'{index.maintain(rebuild=True)} maintenance step(s)')
+    print(index.stats())
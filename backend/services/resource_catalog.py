@@ -0,0 +1,188 @@
+"""Study resource catalog with an inverted index and BM25 ranking.
+
+The catalog file (CSV or JSON lines, ``Config.RESOURCE_CATALOG_PATH``) has one
+resource per row: ``subject``, ``title``, ``url``, ``type`` and optionally
+``topic``, ``description`` and the learner accuracy band it suits
+(``min_accuracy``..``max_accuracy``, default 0..1).
+
+Subject, topic and title tokens go into an inverted index whose postings hold
+each resource's precomputed BM25 impact, so a query only adds up a few
+posting arrays.  Resources outside the learner's accuracy band are skipped
+and the rest are weighted by how close the learner sits to the middle of
+their band.  The catalog is registered with the model registry, so an edited
+file is picked up without a restart.
+"""
+import csv
+import hashlib
+import json
+import re
+from collections import Counter
+
+import numpy as np
+
+from config import Config
+from models.model_registry import registry
+
+K1 = 1.2
+B = 0.75
+COMMON_SHARE = 0.05        # terms in more of the catalog than this only match their best postings
+COMMON_CANDIDATES = 1000
+FIELD_WEIGHTS = {'subject': 2.0, 'topic': 2.0, 'title': 1.0}
+STOPWORDS = frozenset('a an and are for in of on or the to with'.split())
+
+
+def tokenize(text):
+    return [t for t in re.findall(r'[a-z0-9]+', (text or '').lower()) if t not in STOPWORDS]
+
+
+def _accuracy(value, default):
+    try:
+        return float(value) if value not in (None, '') else default
+    except ValueError:
+        return default
+
+
+def read_catalog(path):
+    """Resource dicts from a ``.csv`` or ``.jsonl`` catalog file."""
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.endswith('.jsonl'):
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = list(csv.DictReader(f))
+    resources = []
+    for row in rows:
+        if not row.get('title') or not row.get('url'):
+            continue
+        resources.append({
+            'id': row.get('id') or hashlib.sha1(row['url'].encode('utf-8')).hexdigest()[:12],
+            'title': row['title'].strip(), 'url': row['url'].strip(), 'type': row.get('type') or 'web',
+            'subject': (row.get('subject') or 'General').strip(), 'topic': (row.get('topic') or '').strip(),
+            'description': row.get('description') or '',
+            'min_accuracy': _accuracy(row.get('min_accuracy'), 0.0),
+            'max_accuracy': _accuracy(row.get('max_accuracy'), 1.0),
+        })
+    return resources
+
+
+class ResourceIndex:
+    def __init__(self, resources=()):
+        self.resources = list(resources)
+        n = len(self.resources)
+        self.min_accuracy = np.array([r['min_accuracy'] for r in self.resources], dtype=np.float32)
+        self.max_accuracy = np.array([r['max_accuracy'] for r in self.resources], dtype=np.float32)
+        self.general = np.array([i for i, r in enumerate(self.resources) if r['subject'].lower() == 'general'],
+                                dtype=np.int32)
+        vocabulary, terms, docs, freqs = {}, [], [], []
+        for i, r in enumerate(self.resources):
+            tf = Counter()
+            for field, weight in FIELD_WEIGHTS.items():
+                for token in tokenize(r[field]):
+                    tf[token] += weight
+            for token, f in tf.items():
+                terms.append(vocabulary.setdefault(token, len(vocabulary)))
+                docs.append(i)
+                freqs.append(f)
+        terms = np.array(terms, dtype=np.int32)
+        docs = np.array(docs, dtype=np.int32)
+        tf = np.array(freqs, dtype=np.float32)
+        lengths = np.bincount(docs, weights=tf, minlength=n).astype(np.float32)
+        avg = float(lengths.mean()) if n else 1.0
+        df = np.bincount(terms, minlength=len(vocabulary))
+        idf = np.log(1 + (n - df + 0.5) / (df + 0.5)).astype(np.float32)
+        impact = idf[terms] * tf * (K1 + 1) / (tf + K1 * (1 - B + B * lengths[docs] / max(avg, 1e-6)))
+        # Group by term; the stable sort keeps each posting list in document order.
+        order = np.argsort(terms, kind='stable')
+        bounds = np.concatenate([[0], np.cumsum(df)])
+        docs, impact = docs[order], impact[order].astype(np.float32)
+        self.postings = {token: (docs[bounds[t]:bounds[t + 1]], impact[bounds[t]:bounds[t + 1]])
+                         for token, t in vocabulary.items()}
+        self._top = {}
+
+    @classmethod
+    def load(cls, path):
+        return cls(read_catalog(path))
+
+    def __len__(self):
+        return len(self.resources)
+
+    def _band_fit(self, ids, accuracy):
+        """0 outside each resource's band, 0.5 at its edges, 1 at its centre."""
+        lo, hi = self.min_accuracy[ids], self.max_accuracy[ids]
+        half = np.maximum((hi - lo) / 2, 1e-6)
+        fit = 1 - 0.5 * np.minimum(np.abs(accuracy - (lo + hi) / 2) / half, 1)
+        return np.where((lo <= accuracy) & (accuracy <= hi), fit, 0)
+
+    def _top_postings(self, token):
+        """A common term's postings with the highest impact (computed once per term)."""
+        top = self._top.get(token)
+        if top is None:
+            postings, impact = self.postings[token]
+            top = self._top[token] = np.sort(postings[np.argsort(-impact, kind='stable')[:COMMON_CANDIDATES]])
+        return top
+
+    def _score(self, tokens, limit):
+        """Matching ids and their BM25 scores for the query tokens.
+
+        Terms in more than ``COMMON_SHARE`` of the catalog (which score next to
+        nothing) contribute only their ``COMMON_CANDIDATES`` highest-impact
+        postings as candidates; every candidate is then scored against all
+        terms.  A query naming a subject most resources share thus never
+        walks its whole posting list.
+        """
+        common = COMMON_SHARE * len(self.resources)
+        candidates = [self.postings[t][0] if len(self.postings[t][0]) <= common else self._top_postings(t)
+                      for t in tokens]
+        ids = np.unique(np.concatenate(candidates))
+        if len(ids) >= limit * 2:
+            scores = np.zeros(len(ids), dtype=np.float32)
+            for t in tokens:
+                postings, impact = self.postings[t]
+                pos = np.minimum(np.searchsorted(postings, ids), len(postings) - 1)
+                hit = postings[pos] == ids
+                scores[hit] += impact[pos[hit]]
+            return ids, scores
+        scores = np.zeros(len(self.resources), dtype=np.float32)
+        for t in tokens:
+            postings, impact = self.postings[t]
+            scores[postings] += impact
+        ids = np.flatnonzero(scores)
+        return ids, scores[ids]
+
+    def search(self, query, accuracy=0.5, limit=6):
+        """``[(resource, score)]`` for the query, best first, General resources filling the tail."""
+        tokens = [t for t in set(tokenize(query)) if t in self.postings]
+        ranked = []
+        if tokens:
+            ids, scores = self._score(tokens, limit)
+            scores = scores * self._band_fit(ids, accuracy)
+            keep = scores > 0
+            ids, scores = ids[keep], scores[keep]
+            # Take extra candidates so dropping repeated URLs still leaves ``limit``.
+            if len(ids) > limit * 2:
+                top = np.argpartition(-scores, limit * 2)[:limit * 2]
+                ids, scores = ids[top], scores[top]
+            order = np.argsort(-scores, kind='stable')
+            ranked = [(int(ids[i]), float(scores[i])) for i in order]
+        if len(self.general):
+            general = self.general[self._band_fit(self.general, accuracy) > 0]
+            ranked += [(int(i), 0.0) for i in general]
+        results, seen = [], set()
+        for i, score in ranked:
+            r = self.resources[i]
+            if r['url'] not in seen:
+                seen.add(r['url'])
+                results.append((r, score))
+                if len(results) == limit:
+                    break
+        return results
+
+
+registry.register('resources', Config.RESOURCE_CATALOG_PATH, loader=ResourceIndex.load)
+
+
+def get_resource_index():
+    """The current catalog index (reloaded by the registry when the file changes)."""
+    try:
+        return registry.get('resources')
+    except FileNotFoundError:
+        return ResourceIndex()
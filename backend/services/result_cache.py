@@ -0,0 +1,219 @@
+"""Content-addressed cache for NLP results (summaries, MCQs, keywords).
+
+Keys are a SHA-256 of the normalized input text plus the request
+parameters, so the same handout pasted twice maps to the same entry.
+Values are pickled once on write; the in-memory tier is a size-bounded LRU
+and the optional disk tier (shared by all workers) lives under
+``backend/data/cache``.  Both tiers honour a TTL.
+"""
+import hashlib
+import json
+import os
+import pickle
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from config import Config
+
+CACHE_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', 'cache')
+_WS_RE = re.compile(r'\s+')
+_MISSING = object()
+
+
+def normalize_text(text):
+    return _WS_RE.sub(' ', text or '').strip()
+
+
+def cache_key(kind, text, **params):
+    """Stable key for ``kind`` of result computed from ``text`` with ``params``."""
+    payload = json.dumps([kind, normalize_text(text), params], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def seed_from_key(key):
+    """Deterministic RNG seed derived from a cache key."""
+    return int(key[:16], 16)
+
+
+class ResultCache:
+    def __init__(self, max_entries=1024, max_bytes=64 << 20, ttl=24 * 3600,
+                 disk_dir=None, max_disk_bytes=512 << 20):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._lock = threading.Lock()
+        self._mem = OrderedDict()  # key -> (expires_at, pickled bytes)
+        self._mem_bytes = 0
+        self._disk_bytes = None
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0, 'sets': 0}
+
+    # -- memory tier ---------------------------------------------------------
+    def _mem_get(self, key, now):
+        item = self._mem.get(key)
+        if item is None:
+            return None
+        if item[0] < now:
+            self._mem_drop(key)
+            return None
+        self._mem.move_to_end(key)
+        return item[1]
+
+    def _mem_drop(self, key):
+        _, blob = self._mem.pop(key)
+        self._mem_bytes -= len(blob)
+
+    def _mem_put(self, key, expires_at, blob):
+        if key in self._mem:
+            self._mem_drop(key)
+        if len(blob) > self.max_bytes:
+            return
+        self._mem[key] = (expires_at, blob)
+        self._mem_bytes += len(blob)
+        while len(self._mem) > self.max_entries or self._mem_bytes > self.max_bytes:
+            oldest = next(iter(self._mem))
+            self._mem_drop(oldest)
+            self.stats['evictions'] += 1
+
+    # -- disk tier -----------------------------------------------------------
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], key + '.pkl')
+
+    def _disk_get(self, key, now):
+        path = self._disk_path(key)
+        try:
+            with open(path, 'rb') as f:
+                expires_at, blob = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if expires_at < now:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return expires_at, blob
+
+    def _disk_usage(self):
+        files = []
+        for root, _, names in os.walk(self.disk_dir):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+        return files
+
+    def _disk_put(self, key, expires_at, blob):
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump((expires_at, blob), f)
+        os.replace(tmp, path)
+        if self._disk_bytes is None:
+            self._disk_bytes = sum(size for _, size, _ in self._disk_usage())
+        else:
+            self._disk_bytes += len(blob)
+        if self._disk_bytes > self.max_disk_bytes:
+            self._disk_evict()
+
+    def _disk_evict(self):
+        # Other workers write here too, so re-measure before deleting.
+        files = sorted(self._disk_usage())
+        total = sum(size for _, size, _ in files)
+        target = self.max_disk_bytes * 0.9
+        for _, size, path in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                self.stats['evictions'] += 1
+            except OSError:
+                pass
+        self._disk_bytes = total
+
+    # -- public API ----------------------------------------------------------
+    def get(self, key, default=None):
+        now = time.time()
+        with self._lock:
+            blob = self._mem_get(key, now)
+            if blob is not None:
+                self.stats['memory_hits'] += 1
+                return pickle.loads(blob)
+            if self.disk_dir:
+                item = self._disk_get(key, now)
+                if item is not None:
+                    self._mem_put(key, *item)
+                    self.stats['disk_hits'] += 1
+                    return pickle.loads(item[1])
+            self.stats['misses'] += 1
+        return default
+
+    def set(self, key, value, ttl=None):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._mem_put(key, expires_at, blob)
+            self.stats['sets'] += 1
+            if self.disk_dir:
+                self._disk_put(key, expires_at, blob)
+
+    def delete(self, key):
+        """Drop ``key`` from the memory tier and the shared disk tier."""
+        with self._lock:
+            if key in self._mem:
+                self._mem_drop(key)
+            if self.disk_dir:
+                try:
+                    os.remove(self._disk_path(key))
+                except OSError:
+                    pass
+
+    def get_or_compute(self, key, compute, ttl=None):
+        """Return the cached value for ``key``, computing and storing it on a miss.
+
+        Every call returns a fresh copy, so callers may mutate the result.
+        Empty results (e.g. no questions after a failed generation) and
+        exceptions are not stored, so the next call tries again.
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            if value not in (None, '', [], {}):
+                self.set(key, value, ttl)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._mem.clear()
+            self._mem_bytes = 0
+
+    def info(self):
+        with self._lock:
+            return dict(self.stats, entries=len(self._mem), memory_bytes=self._mem_bytes,
+                        disk_enabled=bool(self.disk_dir))
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """Process-wide cache configured from ``Config``."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResultCache(
+                    max_entries=Config.CACHE_MAX_ENTRIES, max_bytes=Config.CACHE_MAX_BYTES,
+                    ttl=Config.CACHE_TTL_SECONDS,
+                    disk_dir=CACHE_DIR if Config.CACHE_DISK else None,
+                    max_disk_bytes=Config.CACHE_MAX_DISK_BYTES)
+    return _cache
@@ -0,0 +1,204 @@
+"""Spaced-repetition review scheduling (SM-2).
+
+Every question a user answers becomes a review card holding its SM-2 state
+(ease factor, interval, repetition count) and the time it is next due.  A
+recall graded 3-5 stretches the interval (1 day, 6 days, then interval x ease);
+a lapse (0-2) starts the card over the next day and lowers its ease.
+
+Cards are indexed by (user, due time), so "what is due for this user" is an
+index range read, and a per-day table counts cards by due day across all
+users, so the day's total review load is a sum over a few day rows instead of
+a scan of every card.  Both are updated in the same transaction as the card.
+"""
+import json
+import math
+import threading
+from datetime import date, datetime, timedelta
+
+from services.ability_engine import item_key
+from services.progress_aggregates import is_correct
+from services.sqlite_db import SqliteDatabase, default_db_path
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS review_cards (
+    user_id     TEXT NOT NULL,
+    item_id     TEXT NOT NULL,
+    subject     TEXT NOT NULL,
+    card        TEXT NOT NULL DEFAULT '{}',
+    ease        REAL NOT NULL,
+    interval    REAL NOT NULL,
+    repetitions INTEGER NOT NULL,
+    lapses      INTEGER NOT NULL,
+    reviews     INTEGER NOT NULL,
+    due_at      TEXT NOT NULL,
+    due_day     TEXT NOT NULL,
+    reviewed_at TEXT,
+    PRIMARY KEY (user_id, item_id)
+);
+CREATE INDEX IF NOT EXISTS idx_review_cards_due ON review_cards (user_id, due_at);
+CREATE INDEX IF NOT EXISTS idx_review_cards_subject_due ON review_cards (user_id, subject, due_at);
+CREATE TABLE IF NOT EXISTS review_due_days (
+    day TEXT PRIMARY KEY,
+    n   INTEGER NOT NULL
+);
+"""
+INITIAL_EASE = 2.5
+MIN_EASE = 1.3
+PASS_GRADE = 3
+CORRECT_GRADE = 4  # grade given to a quiz answer that was right
+WRONG_GRADE = 1    # ... and to one that was wrong
+CARD_FIELDS = ('question', 'options', 'correct_answer', 'topic', 'difficulty')
+
+
+def new_card():
+    return {'ease': INITIAL_EASE, 'interval': 0.0, 'repetitions': 0, 'lapses': 0, 'reviews': 0}
+
+
+def sm2(state, grade):
+    """Return the state after a review graded 0-5, with its ``interval`` in days."""
+    state = dict(state)
+    grade = max(0, min(5, int(grade)))
+    if grade < PASS_GRADE:
+        state['repetitions'] = 0
+        state['interval'] = 1.0
+        state['lapses'] += 1
+    else:
+        state['repetitions'] += 1
+        if state['repetitions'] == 1:
+            state['interval'] = 1.0
+        elif state['repetitions'] == 2:
+            state['interval'] = 6.0
+        else:
+            state['interval'] = round(state['interval'] * state['ease'], 1)
+    state['ease'] = max(MIN_EASE, state['ease'] + 0.1 - (5 - grade) * (0.08 + (5 - grade) * 0.02))
+    state['reviews'] += 1
+    return state
+
+
+def answer_grade(answer):
+    """The answer's ``grade`` clamped to 0-5; without a numeric one, a grade for whether it was right."""
+    grade = answer.get('grade')
+    if grade is not None and not isinstance(grade, bool):
+        try:
+            grade = float(grade)
+        except (TypeError, ValueError):
+            grade = None
+        if grade is not None and math.isfinite(grade):
+            return max(0, min(5, int(round(grade))))
+    return CORRECT_GRADE if is_correct(answer) else WRONG_GRADE
+
+
+def _card_row(row):
+    card = {k: row[k] for k in ('item_id', 'subject', 'ease', 'interval', 'repetitions', 'lapses', 'reviews',
+                                'due_at', 'reviewed_at')}
+    card.update(json.loads(row['card']))
+    return card
+
+
+class ReviewScheduler:
+    def __init__(self, path):
+        self.db = SqliteDatabase(path, SCHEMA)
+
+    @staticmethod
+    def _shift_day(conn, old_day, new_day):
+        if old_day == new_day:
+            return
+        if old_day:
+            conn.execute('UPDATE review_due_days SET n = n - 1 WHERE day = ?', (old_day,))
+            conn.execute('DELETE FROM review_due_days WHERE day = ? AND n <= 0', (old_day,))
+        conn.execute('INSERT INTO review_due_days (day, n) VALUES (?, 1) '
+                     'ON CONFLICT (day) DO UPDATE SET n = n + 1', (new_day,))
+
+    def _review(self, conn, user_id, item_id, subject, grade, now, card=None, early=True):
+        """Apply one graded review; returns the updated card (None if skipped as early)."""
+        row = conn.execute('SELECT * FROM review_cards WHERE user_id = ? AND item_id = ?',
+                           (user_id, item_id)).fetchone()
+        if row is None:
+            state, old_day, payload = new_card(), None, card or {}
+        else:
+            state = {k: row[k] for k in new_card()}
+            old_day, payload = row['due_day'], dict(json.loads(row['card']), **(card or {}))
+            # A correct answer before the card is due (e.g. in a quiz) is not a review.
+            if not early and grade >= PASS_GRADE and row['due_at'] > now.isoformat():
+                return None
+        state = sm2(state, grade)
+        due = now + timedelta(days=state['interval'])
+        self._shift_day(conn, old_day, due.date().isoformat())
+        conn.execute(
+            'INSERT OR REPLACE INTO review_cards (user_id, item_id, subject, card, ease, interval, repetitions, '
+            'lapses, reviews, due_at, due_day, reviewed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (user_id, item_id, subject, json.dumps(payload), state['ease'], state['interval'],
+             state['repetitions'], state['lapses'], state['reviews'], due.isoformat(), due.date().isoformat(),
+             now.isoformat()))
+        return dict(state, item_id=item_id, subject=subject, due_at=due.isoformat(), reviewed_at=now.isoformat(),
+                    **payload)
+
+    def review(self, user_id, item_id, grade, now=None):
+        """Record one review of an existing card; returns the card, or None if unknown."""
+        now = now or datetime.now()
+        with self.db.transaction() as conn:
+            row = conn.execute('SELECT subject FROM review_cards WHERE user_id = ? AND item_id = ?',
+                               (user_id, item_id)).fetchone()
+            if row is None:
+                return None
+            return self._review(conn, user_id, item_id, row['subject'], grade, now)
+
+    def record_answers(self, user_id, subject, answers, now=None):
+        """Create or update the cards for a submitted quiz; returns how many were rescheduled."""
+        now = now or datetime.now()
+        changed = 0
+        with self.db.transaction() as conn:
+            for a in answers:
+                card = {k: a[k] for k in CARD_FIELDS if a.get(k) is not None}
+                changed += self._review(conn, user_id, item_key(a, subject), subject, answer_grade(a), now,
+                                        card=card, early=False) is not None
+        return changed
+
+    def due(self, user_id, subject=None, limit=20, now=None):
+        """The user's cards due by ``now``, most overdue first."""
+        now = (now or datetime.now()).isoformat()
+        if subject:
+            rows = self.db.connect().execute(
+                'SELECT * FROM review_cards WHERE user_id = ? AND subject = ? AND due_at <= ? '
+                'ORDER BY due_at LIMIT ?', (user_id, subject, now, limit)).fetchall()
+        else:
+            rows = self.db.connect().execute(
+                'SELECT * FROM review_cards WHERE user_id = ? AND due_at <= ? ORDER BY due_at LIMIT ?',
+                (user_id, now, limit)).fetchall()
+        return [_card_row(r) for r in rows]
+
+    def due_count(self, user_id, subject=None, until=None):
+        """How many of the user's cards are due by ``until`` (default: end of today)."""
+        until = (until or datetime.combine(date.today(), datetime.max.time())).isoformat()
+        if subject:
+            row = self.db.connect().execute(
+                'SELECT COUNT(*) FROM review_cards WHERE user_id = ? AND subject = ? AND due_at <= ?',
+                (user_id, subject, until)).fetchone()
+        else:
+            row = self.db.connect().execute(
+                'SELECT COUNT(*) FROM review_cards WHERE user_id = ? AND due_at <= ?', (user_id, until)).fetchone()
+        return row[0]
+
+    def load(self, day=None, days=7):
+        """Cards due across all users: overdue-or-today total and a per-day forecast."""
+        day = day or date.today()
+        conn = self.db.connect()
+        today = conn.execute('SELECT COALESCE(SUM(n), 0) FROM review_due_days WHERE day <= ?',
+                             (day.isoformat(),)).fetchone()[0]
+        end = (day + timedelta(days=days)).isoformat()
+        forecast = {d: n for d, n in conn.execute(
+            'SELECT day, n FROM review_due_days WHERE day > ? AND day <= ? ORDER BY day', (day.isoformat(), end))}
+        return {'due_today': today, 'forecast': forecast}
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_review_scheduler():
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = ReviewScheduler(default_db_path())
+    return _scheduler
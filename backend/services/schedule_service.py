@@ -1,14 +1,27 @@
 import csv
 from io import StringIO
 
-def generate_study_schedule_csv(subject: str, hours: float, concept_weights: dict = {}):
+REVIEW_SECONDS_PER_CARD = 30
+MAX_REVIEW_SHARE = 0.5  # of the study time spent on due spaced-repetition reviews
+
+def review_hours(due_reviews: int, hours: float):
+    return round(min(due_reviews * REVIEW_SECONDS_PER_CARD / 3600, hours * MAX_REVIEW_SHARE), 1)
+
+def generate_study_schedule_csv(subject: str, hours: float, concept_weights: dict = {}, due_reviews: int = 0):
     output = StringIO()
     writer = csv.writer(output)
     writer.writerow(['Session', 'Subject', 'Topic', 'Activity', 'Hours', 'Priority'])
+    first = 1
+    if due_reviews:
+        # Cards due today come first, so the scheduler's queue does not grow.
+        spent = max(review_hours(due_reviews, hours), 0.1)
+        writer.writerow(['Session 1', subject, f'{due_reviews} due reviews', 'Spaced Review', spent, 'High'])
+        hours = max(0, round(hours - spent, 1))
+        first = 2
     if concept_weights:
         sorted_topics = sorted(concept_weights.items(), key=lambda x: x[1], reverse=True)
         total_used = 0
-        for session, (topic, diff) in enumerate(sorted_topics, 1):
+        for session, (topic, diff) in enumerate(sorted_topics, first):
             topic_hours = round(hours * min(diff + 0.2, 0.5), 1)
             priority = 'High' if diff > 0.6 else ('Medium' if diff > 0.3 else 'Low')
             activity = 'Intensive Review' if diff > 0.6 else 'Practice Problems'
@@ -16,7 +29,7 @@ def generate_study_schedule_csv(subject: str, hours: float, concept_weights: dic
             total_used += topic_hours
         remaining = max(0, round(hours - total_used, 1))
         if remaining > 0:
-            writer.writerow([f'Session {len(sorted_topics)+1}', subject, 'All Topics', 'Final Revision', remaining, 'Low'])
+            writer.writerow([f'Session {len(sorted_topics)+first}', subject, 'All Topics', 'Final Revision', remaining, 'Low'])
     else:
         activities = [
             ('Review Concepts', 'Medium'),
@@ -25,7 +38,7 @@ def generate_study_schedule_csv(subject: str, hours: float, concept_weights: dic
             ('Revision', 'Medium')
         ]
         hours_per = round(hours / len(activities), 1)
-        for i, (activity, priority) in enumerate(activities, 1):
+        for i, (activity, priority) in enumerate(activities, first):
             writer.writerow([f'Session {i}', subject, 'General', activity, hours_per, priority])
     csv_data = output.getvalue()
     output.close()
@@ -0,0 +1,623 @@
+"""Full-text BM25 search over ingested notes, partitioned by user and subject.
+
+Each partition is a set of immutable on-disk segments.  A segment is a
+directory of ``.npy`` arrays: document ids and lengths, a sorted term
+dictionary, and one postings stream in which every term's document numbers
+(delta-coded) and term frequencies are varint-compressed.  Segments are
+opened memory-mapped, so a query pages in only the dictionary entries and
+postings it touches and an index of tens of millions of tokens never has to
+fit in RAM.
+
+Adding notes writes one small segment; segments of the same size tier are
+merged once ``MERGE_FACTOR`` of them pile up, so the number of segments a
+query visits stays logarithmic in the partition size.  Merges run as an NLP
+pool task (``nlp_tasks.merge_search``), one process per partition at a time
+under a file lock, and stream a k-way merge of the segments' sorted term
+dictionaries, so only one term's postings are in memory at once.  Which
+segments make up a partition (and which documents are in it) is recorded in
+SQLite, so every web and NLP worker sees the same index and a merge is
+swapped in atomically.
+
+Documents the document store evicts are forgotten: their rows go at once
+and their postings are tombstoned (left out of results) until the merge that
+rewrites their segment drops them; a segment that has lost ``PURGE_SHARE`` of
+its documents is rewritten on its own.
+
+Terms are the lowercase content tokens of ``DocumentAnalysis`` (the tokens
+keyword extraction works from), and snippets are cut from the document text
+kept by ``DocumentStore``.
+"""
+import hashlib
+import heapq
+import logging
+import math
+import os
+import re
+import shutil
+import threading
+import uuid
+from collections import Counter
+from datetime import datetime
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: single process, no lock needed
+    fcntl = None
+
+from models.document_analysis import SENTENCE_RE
+from services.sqlite_db import SqliteDatabase, default_db_path
+
+log = logging.getLogger(__name__)
+
+INDEX_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', 'search')
+MERGE_FACTOR = 8
+MERGE_TIMEOUT = 900  # seconds a pool worker may spend merging one partition
+PURGE_SHARE = 0.2  # rewrite a segment alone once this share of its documents is tombstoned
+K1 = 1.2
+B = 0.75
+SNIPPET_CHARS = 240
+TOKEN_RE = re.compile(r'\w+')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS search_segments (
+    name       TEXT PRIMARY KEY,
+    user_id    TEXT NOT NULL,
+    subject    TEXT NOT NULL,
+    docs       INTEGER NOT NULL,
+    tokens     INTEGER NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_search_segments_partition ON search_segments (user_id, subject);
+CREATE TABLE IF NOT EXISTS search_documents (
+    user_id     TEXT NOT NULL,
+    subject     TEXT NOT NULL,
+    document_id TEXT NOT NULL,
+    tokens      INTEGER NOT NULL,
+    indexed_at  TEXT NOT NULL,
+    PRIMARY KEY (user_id, subject, document_id)
+);
+CREATE TABLE IF NOT EXISTS search_deleted (
+    segment     TEXT NOT NULL,
+    document_id TEXT NOT NULL,
+    user_id     TEXT NOT NULL,
+    subject     TEXT NOT NULL,
+    deleted_at  TEXT NOT NULL,
+    PRIMARY KEY (segment, document_id)
+);
+CREATE INDEX IF NOT EXISTS idx_search_deleted_partition ON search_deleted (user_id, subject);
+"""
+
+
+# -- varint coding -------------------------------------------------------------
+def encode_varints(values):
+    """LEB128-encode a uint64 array into a uint8 array."""
+    values = np.asarray(values, dtype=np.uint64)
+    nbytes = encoded_sizes(values)
+    out = np.empty(int(nbytes.sum()), dtype=np.uint8)
+    pos = np.cumsum(nbytes) - nbytes
+    for k in range(int(nbytes.max()) if len(values) else 0):
+        mask = nbytes > k
+        byte = (values[mask] >> np.uint64(7 * k)) & np.uint64(0x7f)
+        byte |= np.where(nbytes[mask] > k + 1, np.uint64(0x80), np.uint64(0))
+        out[pos[mask] + k] = byte.astype(np.uint8)
+    return out
+
+
+def encoded_sizes(values):
+    """Bytes each value takes as a varint."""
+    sizes = np.ones(len(values), dtype=np.int64)
+    for k in range(1, 10):
+        sizes += values >= np.uint64(1 << (7 * k))
+    return sizes
+
+
+def decode_varints(data):
+    """Inverse of ``encode_varints``."""
+    data = np.asarray(data, dtype=np.uint8)
+    if not len(data):
+        return np.zeros(0, dtype=np.uint64)
+    ends = np.flatnonzero(data < 0x80)
+    starts = np.concatenate([[0], ends[:-1] + 1])
+    group = np.repeat(np.arange(len(ends)), ends - starts + 1)
+    shift = ((np.arange(len(data)) - starts[group]) * 7).astype(np.uint64)
+    return np.add.reduceat((data & 0x7f).astype(np.uint64) << shift, starts)
+
+
+# -- segments --------------------------------------------------------------------
+def write_segment(path, doc_ids, lengths, vocabulary, term_ids, docs, tfs):
+    """Write a segment from parallel ``term_ids``, ``docs`` and ``tfs`` posting arrays.
+
+    ``vocabulary`` is the sorted list of terms ``term_ids`` index into, each
+    used at least once; ``docs`` are positions in ``doc_ids`` and ``lengths``.
+    The directory appears at ``path`` only once complete.
+    """
+    term_ids, docs = np.asarray(term_ids, np.int64), np.asarray(docs, np.int64)
+    order = np.lexsort((docs, term_ids))
+    term_ids, docs, tfs = term_ids[order], docs[order], np.asarray(tfs, np.uint64)[order]
+    df = np.bincount(term_ids, minlength=len(vocabulary))
+    start = np.concatenate([[0], np.cumsum(df)[:-1]])
+    first = np.zeros(len(docs), dtype=bool)
+    first[start[df > 0]] = True
+    deltas = np.where(first, docs, docs - np.concatenate([[0], docs[:-1]]))
+    rank = np.arange(len(docs)) - start[term_ids]
+    values = np.empty(2 * len(docs), dtype=np.uint64)
+    values[2 * start[term_ids] + rank] = deltas
+    values[2 * start[term_ids] + df[term_ids] + rank] = tfs
+    encoded = encode_varints(values)
+    value_bytes = np.concatenate([[0], np.cumsum(encoded_sizes(values))])
+    offsets = value_bytes[2 * np.concatenate([start, [len(docs)]])]
+
+    term_bytes = [t.encode('utf-8') for t in vocabulary]
+    term_offsets = np.concatenate([[0], np.cumsum([len(t) for t in term_bytes])]).astype(np.uint64)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    os.makedirs(tmp)
+    arrays = {'doc_ids': np.array(doc_ids, dtype='S64'), 'lengths': np.asarray(lengths, dtype=np.uint32),
+              'terms': np.frombuffer(b''.join(term_bytes), dtype=np.uint8),
+              'term_offsets': term_offsets, 'df': df.astype(np.uint32),
+              'postings': encoded, 'offsets': offsets.astype(np.uint64)}
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp, name + '.npy'), array)
+    os.replace(tmp, path)
+
+
+def write_segment_stream(path, doc_ids, lengths, postings):
+    """Write a segment from ``(term bytes, docs, tfs)`` triples in sorted term order.
+
+    Postings are encoded and appended to disk one term at a time, so the
+    segment never has to fit in memory; the directory appears at ``path``
+    only once complete.
+    """
+    tmp = f'{path}.{os.getpid()}.tmp'
+    os.makedirs(tmp)
+    terms, term_offsets, df, offsets = bytearray(), [0], [], [0]
+    raw = os.path.join(tmp, 'postings.raw')
+    with open(raw, 'wb') as out:
+        for term, docs, tfs in postings:
+            encoded = encode_varints(np.concatenate([np.diff(docs, prepend=0), tfs]).astype(np.uint64))
+            out.write(encoded.tobytes())
+            terms += term
+            term_offsets.append(len(terms))
+            df.append(len(docs))
+            offsets.append(offsets[-1] + len(encoded))
+    with open(os.path.join(tmp, 'postings.npy'), 'wb') as out, open(raw, 'rb') as data:
+        np.lib.format.write_array_header_1_0(out, {'descr': '|u1', 'fortran_order': False, 'shape': (offsets[-1],)})
+        shutil.copyfileobj(data, out)
+    os.remove(raw)
+    arrays = {'doc_ids': np.array(doc_ids, dtype='S64'), 'lengths': np.asarray(lengths, dtype=np.uint32),
+              'terms': np.frombuffer(bytes(terms), dtype=np.uint8),
+              'term_offsets': np.array(term_offsets, dtype=np.uint64), 'df': np.array(df, dtype=np.uint32),
+              'offsets': np.array(offsets, dtype=np.uint64)}
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp, name + '.npy'), array)
+    os.replace(tmp, path)
+
+
+def merge_postings(segments, keeps):
+    """K-way merge of segments' postings as ``(term bytes, docs, tfs)`` in term order.
+
+    ``keeps`` are boolean masks over each segment's documents; the kept ones
+    are renumbered in segment order, and terms no kept document uses are left out.
+    """
+    renumber = []
+    base = 0
+    for keep in keeps:
+        renumber.append(np.cumsum(keep) - 1 + base)
+        base += int(keep.sum())
+    current, parts = None, []
+    for term, k, i in heapq.merge(*(segment.entries(k) for k, segment in enumerate(segments))):
+        if term != current:
+            if parts:
+                yield current, np.concatenate([d for d, _ in parts]), np.concatenate([f for _, f in parts])
+            current, parts = term, []
+        docs, tfs = segments[k].read(i)
+        live = keeps[k][docs]
+        if live.any():
+            parts.append((renumber[k][docs[live]], tfs[live]))
+    if parts:
+        yield current, np.concatenate([d for d, _ in parts]), np.concatenate([f for _, f in parts])
+
+
+class Segment:
+    """A memory-mapped segment."""
+
+    def __init__(self, path):
+        self.path = path
+        load = lambda name: np.load(os.path.join(path, name + '.npy'), mmap_mode='r')
+        self.doc_ids = load('doc_ids')
+        self.lengths = load('lengths')
+        self.terms = load('terms')
+        self.term_offsets = load('term_offsets')
+        self.df = load('df')
+        self.postings = load('postings')
+        self.offsets = load('offsets')
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def _term(self, i):
+        return self.terms[int(self.term_offsets[i]):int(self.term_offsets[i + 1])].tobytes()
+
+    def find(self, term):
+        """Dictionary position of ``term`` (binary search), or -1."""
+        key = term.encode('utf-8')
+        lo, hi = 0, len(self.df)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._term(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < len(self.df) and self._term(lo) == key else -1
+
+    def read(self, i):
+        """``(docs, tfs)`` of dictionary entry ``i``."""
+        values = decode_varints(self.postings[int(self.offsets[i]):int(self.offsets[i + 1])])
+        df = int(self.df[i])
+        return np.cumsum(values[:df]).astype(np.int64), values[df:].astype(np.float32)
+
+    def vocabulary(self):
+        return [self._term(i).decode('utf-8') for i in range(len(self.df))]
+
+    def entries(self, tag=None):
+        """``(term bytes, tag, dictionary position)`` in term order, for ``merge_postings``."""
+        for i in range(len(self.df)):
+            yield self._term(i), tag, i
+
+
+def index_terms(text):
+    """Lowercase content tokens, as ``DocumentAnalysis.content_tokens``."""
+    stop_words = _stop_words()
+    return [t for t in TOKEN_RE.findall(text.lower()) if t.isalnum() and t not in stop_words]
+
+
+_stop_word_set = None
+
+
+def _stop_words():
+    global _stop_word_set
+    if _stop_word_set is None:
+        from models.nlp_resources import load_stop_words
+        _stop_word_set = frozenset(load_stop_words())
+    return _stop_word_set
+
+
+def _slug(value):
+    slug = re.sub(r'[^a-z0-9]+', '-', value.lower()).strip('-')[:40]
+    return f"{slug or 'x'}-{hashlib.sha1(value.encode('utf-8')).hexdigest()[:8]}"
+
+
+def snippet(text, terms, max_chars=SNIPPET_CHARS):
+    """The passage of ``text`` with the most distinct query terms."""
+    sentences = [s for s in SENTENCE_RE.split(text.strip()) if s] or ['']
+    wanted = set(terms)
+    best = max(range(len(sentences)),
+               key=lambda i: (len(wanted & set(TOKEN_RE.findall(sentences[i].lower()))), -i))
+    passage = sentences[best]
+    while len(passage) < max_chars and best + 1 < len(sentences):
+        best += 1
+        passage += ' ' + sentences[best]
+    return passage if len(passage) <= max_chars else passage[:max_chars].rsplit(' ', 1)[0] + '...'
+
+
+class SearchIndex:
+    def __init__(self, path, index_dir=INDEX_DIR, merge_factor=MERGE_FACTOR, background=True, nlp=None):
+        self.db = SqliteDatabase(path, SCHEMA)
+        self.index_dir = index_dir
+        self.merge_factor = merge_factor
+        self.background = background
+        self.nlp = nlp
+        self._segments = {}  # (user_id, subject) -> {name: Segment}
+        self._lock = threading.Lock()
+        self._merging = set()
+
+    def partition_dir(self, user_id, subject):
+        return os.path.join(self.index_dir, _slug(user_id), _slug(subject))
+
+    def add_text(self, user_id, subject, document_id, text):
+        """Index stored notes unless the partition already has them."""
+        if self.has_document(user_id, subject, document_id):
+            return 0
+        return self.add(user_id, subject, [(document_id, index_terms(text))])
+
+    def has_document(self, user_id, subject, document_id):
+        return self.db.connect().execute(
+            'SELECT 1 FROM search_documents WHERE user_id = ? AND subject = ? AND document_id = ?',
+            (user_id, subject, document_id)).fetchone() is not None
+
+    def forget(self, document_ids):
+        """Drop documents from every partition holding them; returns how many entries went.
+
+        Called with the ids the document store evicted.  The documents can be
+        indexed again at once; their old postings are tombstoned until merged away.
+        """
+        document_ids = list(document_ids)
+        conn = self.db.connect()
+        partitions = set()
+        for i in range(0, len(document_ids), 500):
+            chunk = document_ids[i:i + 500]
+            partitions.update(tuple(r) for r in conn.execute(
+                f'SELECT DISTINCT user_id, subject FROM search_documents WHERE document_id IN '
+                f'({",".join("?" * len(chunk))})', chunk))
+        forgotten = 0
+        for user_id, subject in sorted(partitions):
+            forgotten += self._forget(user_id, subject, document_ids)
+            self._schedule_merge(user_id, subject)
+        return forgotten
+
+    def _forget(self, user_id, subject, document_ids):
+        wanted = np.array([d.encode('ascii') for d in document_ids], dtype='S64')
+        while True:
+            rows = self._segment_rows(user_id, subject)
+            try:
+                dead = [(row['name'], d.decode('ascii')) for row in rows
+                        for seg in [Segment(self._segment_path(user_id, subject, row['name']))]
+                        for d in np.asarray(seg.doc_ids)[np.isin(seg.doc_ids, wanted)]]
+            except FileNotFoundError:
+                continue  # merged away while listing; look again
+            names = sorted({name for name, _ in dead})
+            now = datetime.now().isoformat()
+            with self.db.transaction() as conn:
+                marks = ','.join('?' * len(names))
+                if names and conn.execute(f'SELECT COUNT(*) FROM search_segments WHERE name IN ({marks})',
+                                          names).fetchone()[0] != len(names):
+                    continue
+                conn.executemany('INSERT OR IGNORE INTO search_deleted (segment, document_id, user_id, subject, '
+                                 'deleted_at) VALUES (?, ?, ?, ?, ?)',
+                                 [(name, d, user_id, subject, now) for name, d in dead])
+                return sum(conn.execute('DELETE FROM search_documents WHERE user_id = ? AND subject = ? '
+                                        'AND document_id = ?', (user_id, subject, d)).rowcount
+                           for d in document_ids)
+
+    def _tombstones(self, user_id, subject):
+        """``{segment name: [document ids]}`` of the partition's forgotten documents."""
+        dead = {}
+        for name, doc_id in self.db.connect().execute(
+                'SELECT segment, document_id FROM search_deleted WHERE user_id = ? AND subject = ?',
+                (user_id, subject)):
+            dead.setdefault(name, []).append(doc_id)
+        return dead
+
+    # -- writing -------------------------------------------------------------------
+    def add(self, user_id, subject, documents):
+        """Index ``[(document_id, tokens)]`` into the partition as one new segment.
+
+        Documents already in the partition are skipped; returns how many were added.
+        """
+        documents = [(d, tokens) for d, tokens in dict(documents).items()
+                     if tokens and not self.has_document(user_id, subject, d)]
+        if not documents:
+            return 0
+        counts = [Counter(tokens) for _, tokens in documents]
+        vocabulary = sorted(set().union(*counts))
+        term_id = {t: i for i, t in enumerate(vocabulary)}
+        name = uuid.uuid4().hex
+        directory = self.partition_dir(user_id, subject)
+        os.makedirs(directory, exist_ok=True)
+        write_segment(os.path.join(directory, name), [d for d, _ in documents],
+                      [len(tokens) for _, tokens in documents], vocabulary,
+                      [term_id[t] for c in counts for t in c], [n for n, c in enumerate(counts) for _ in c],
+                      [f for c in counts for f in c.values()])
+        now = datetime.now().isoformat()
+        with self.db.transaction() as conn:
+            added = [(d, len(tokens)) for d, tokens in documents
+                     if conn.execute('SELECT 1 FROM search_documents WHERE user_id = ? AND subject = ? '
+                                     'AND document_id = ?', (user_id, subject, d)).fetchone() is None]
+            if len(added) == len(documents):
+                conn.execute('INSERT INTO search_segments (name, user_id, subject, docs, tokens, created_at) '
+                             'VALUES (?, ?, ?, ?, ?, ?)', (name, user_id, subject, len(documents),
+                                                          sum(n for _, n in added), now))
+                conn.executemany('INSERT INTO search_documents (user_id, subject, document_id, tokens, indexed_at) '
+                                 'VALUES (?, ?, ?, ?, ?)', [(user_id, subject, d, n, now) for d, n in added])
+        if len(added) != len(documents):
+            # Another worker indexed some of these meanwhile; retry with what is left.
+            shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+            return self.add(user_id, subject, [(d, t) for d, t in documents if d in dict(added)])
+        self._schedule_merge(user_id, subject)
+        return len(documents)
+
+    def _schedule_merge(self, user_id, subject):
+        """Hand a due merge to the NLP pool (at most one request in flight per partition and process)."""
+        if not self.background:
+            self.merge(user_id, subject)
+            return
+        if self._next_group(user_id, subject) is None:
+            return
+        with self._lock:
+            if (user_id, subject) in self._merging:
+                return
+            self._merging.add((user_id, subject))
+        threading.Thread(target=self._merge_loop, args=(user_id, subject), name='search-merge', daemon=True).start()
+
+    def _merge_loop(self, user_id, subject):
+        from services import nlp_tasks
+        try:
+            if self.nlp is not None:
+                self.nlp.run(nlp_tasks.merge_search, user_id, subject, timeout=MERGE_TIMEOUT)
+            else:
+                self.merge(user_id, subject)
+        except Exception:
+            log.exception('Merging search segments of %s/%s failed; retried after the next add', user_id, subject)
+        finally:
+            with self._lock:
+                self._merging.discard((user_id, subject))
+
+    def _tier(self, docs):
+        return int(math.log(max(docs, 1), self.merge_factor))
+
+    def _next_group(self, user_id, subject, force=False):
+        """``(segment rows, tombstones)`` of the next merge, or None when nothing is due."""
+        rows = self._segment_rows(user_id, subject)
+        dead = self._tombstones(user_id, subject)
+        if force:
+            group = rows if len(rows) > 1 or dead else []
+        else:
+            tiers = {}
+            for row in rows:
+                tiers.setdefault(self._tier(row['docs']), []).append(row)
+            group = next((sorted(g, key=lambda r: r['docs'])[:self.merge_factor] for _, g in sorted(tiers.items())
+                          if len(g) >= self.merge_factor), [])
+            group = group or next(([row] for row in rows
+                                   if len(dead.get(row['name'], ())) >= PURGE_SHARE * row['docs']), [])
+        return (group, dead) if group else None
+
+    def merge(self, user_id, subject, force=False):
+        """Merge same-tier segments until no tier holds ``merge_factor`` of them (all of them if ``force``).
+
+        Only one process merges a partition at a time; others return 0
+        straight away (the one holding the lock keeps going until nothing is due).
+        """
+        directory = self.partition_dir(user_id, subject)
+        os.makedirs(os.path.dirname(directory), exist_ok=True)
+        lock = open(directory + '.lock', 'w')
+        try:
+            if fcntl:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return 0
+            merges = 0
+            while True:
+                due = self._next_group(user_id, subject, force)
+                if due is None or not self._merge_group(user_id, subject, *due):
+                    return merges
+                merges += 1
+        finally:
+            lock.close()
+
+    def _merge_group(self, user_id, subject, group, dead):
+        """Replace ``group``'s segments with one, leaving out the documents tombstoned in ``dead``."""
+        segments = [Segment(self._segment_path(user_id, subject, row['name'])) for row in group]
+        keeps, doc_ids, lengths, dropped = [], [], [], []
+        for row, segment in zip(group, segments):
+            gone = dead.get(row['name'], [])
+            keep = ~np.isin(segment.doc_ids, np.array([g.encode('ascii') for g in gone], dtype='S64'))
+            keeps.append(keep)
+            doc_ids.extend(np.asarray(segment.doc_ids)[keep].tolist())
+            lengths.extend(np.asarray(segment.lengths)[keep].tolist())
+            dropped.extend((row['name'], g) for g in gone)
+        name = uuid.uuid4().hex
+        path = self._segment_path(user_id, subject, name)
+        if doc_ids:
+            write_segment_stream(path, doc_ids, lengths, merge_postings(segments, keeps))
+        names = [row['name'] for row in group]
+        with self.db.transaction() as conn:
+            marks = ','.join('?' * len(names))
+            still_there = conn.execute(f'SELECT COUNT(*) FROM search_segments WHERE name IN ({marks})',
+                                       names).fetchone()[0]
+            if still_there == len(names):
+                conn.execute(f'DELETE FROM search_segments WHERE name IN ({marks})', names)
+                conn.executemany('DELETE FROM search_deleted WHERE segment = ? AND document_id = ?', dropped)
+                # Documents forgotten since ``dead`` was read are still in the new segment.
+                conn.execute(f'UPDATE search_deleted SET segment = ? WHERE segment IN ({marks})', [name] + names)
+                if doc_ids:
+                    conn.execute('INSERT INTO search_segments (name, user_id, subject, docs, tokens, created_at) '
+                                 'VALUES (?, ?, ?, ?, ?, ?)', (name, user_id, subject, len(doc_ids),
+                                                              int(sum(lengths)), datetime.now().isoformat()))
+        if still_there != len(names):
+            # Another worker merged (some of) these first.
+            shutil.rmtree(path, ignore_errors=True)
+            return False
+        for old in names:
+            # Readers holding the old segment's memory maps keep working after the unlink.
+            shutil.rmtree(self._segment_path(user_id, subject, old), ignore_errors=True)
+        return True
+
+    # -- reading -------------------------------------------------------------------
+    def _segment_path(self, user_id, subject, name):
+        return os.path.join(self.partition_dir(user_id, subject), name)
+
+    def _segment_rows(self, user_id, subject):
+        return self.db.connect().execute(
+            'SELECT name, docs, tokens FROM search_segments WHERE user_id = ? AND subject = ?',
+            (user_id, subject)).fetchall()
+
+    def _open_partition(self, user_id, subject, rows):
+        """Segments named by ``rows``, reusing open ones and dropping those merged away."""
+        cached = self._segments.get((user_id, subject), {})
+        opened = {r['name']: cached.get(r['name']) or Segment(self._segment_path(user_id, subject, r['name']))
+                  for r in rows}
+        self._segments[(user_id, subject)] = opened
+        return list(opened.values())
+
+    def subjects(self, user_id):
+        return [r[0] for r in self.db.connect().execute(
+            'SELECT DISTINCT subject FROM search_segments WHERE user_id = ?', (user_id,))]
+
+    def stats(self, user_id, subject):
+        row = self.db.connect().execute(
+            'SELECT COUNT(*), COALESCE(SUM(docs), 0), COALESCE(SUM(tokens), 0) FROM search_segments '
+            'WHERE user_id = ? AND subject = ?', (user_id, subject)).fetchone()
+        return {'segments': row[0], 'documents': row[1], 'tokens': row[2]}
+
+    def _search_partition(self, user_id, subject, terms, limit):
+        rows = self._segment_rows(user_id, subject)
+        if not rows:
+            return []
+        n_docs = sum(r['docs'] for r in rows)
+        avgdl = sum(r['tokens'] for r in rows) / max(n_docs, 1)
+        segments = self._open_partition(user_id, subject, rows)
+        dead = self._tombstones(user_id, subject)
+        found = [[(term, seg.find(term)) for term in terms] for seg in segments]
+        df = {term: sum(int(seg.df[i]) for seg, hits in zip(segments, found) for t, i in hits if t == term and i >= 0)
+              for term in terms}
+        results = []
+        for row, seg, hits in zip(rows, segments, found):
+            hits = [(term, i) for term, i in hits if i >= 0]
+            if not hits:
+                continue
+            lengths = np.asarray(seg.lengths, dtype=np.float32)
+            scores = np.zeros(len(seg), dtype=np.float32)
+            for term, i in hits:
+                docs, tfs = seg.read(i)
+                idf = math.log(1 + (n_docs - df[term] + 0.5) / (df[term] + 0.5))
+                scores[docs] += idf * tfs * (K1 + 1) / (tfs + K1 * (1 - B + B * lengths[docs] / avgdl))
+            if row['name'] in dead:
+                scores[np.isin(seg.doc_ids, np.array([d.encode('ascii') for d in dead[row['name']]],
+                                                     dtype='S64'))] = 0
+            top = np.flatnonzero(scores)
+            if len(top) > limit:
+                top = top[np.argpartition(-scores[top], limit)[:limit]]
+            results.extend((float(scores[j]), seg.doc_ids[j].decode('ascii'), subject) for j in top)
+        return results
+
+    def search(self, user_id, query, subject=None, limit=10, documents=None):
+        """Best matching documents as ``[{document_id, subject, score, snippet}]``.
+
+        ``documents`` (a ``DocumentStore``) supplies the text snippets are cut
+        from; documents it no longer holds are left out.
+        """
+        terms = sorted(set(index_terms(query)))
+        if not terms:
+            return []
+        subjects = [subject] if subject else self.subjects(user_id)
+        try:
+            hits = [h for s in subjects for h in self._search_partition(user_id, s, terms, limit * 2)]
+        except FileNotFoundError:
+            # A merge replaced a segment between listing and opening it.
+            hits = [h for s in subjects for h in self._search_partition(user_id, s, terms, limit * 2)]
+        results = []
+        for score, doc_id, doc_subject in sorted(hits, key=lambda h: -h[0]):
+            text = documents.get_text(doc_id) if documents is not None else None
+            if documents is not None and text is None:
+                continue
+            results.append({'document_id': doc_id, 'subject': doc_subject, 'score': round(score, 4),
+                            'snippet': snippet(text, terms) if text else ''})
+            if len(results) == limit:
+                break
+        return results
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_search_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                from services.nlp_executor import get_nlp_executor
+                _index = SearchIndex(default_db_path(), nlp=get_nlp_executor())
+    return _index
@@ -0,0 +1,80 @@
+"""Shared SQLite plumbing for the attempt store and the stores next to it.
+
+Each store owns its tables but they all share the database file configured by
+``SQLALCHEMY_DATABASE_URI``, with the same connection settings: one
+connection per thread, WAL journaling and ``BEGIN IMMEDIATE`` write
+transactions.
+"""
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from config import Config
+
+BACKEND_DIR = os.path.join(os.path.dirname(__file__), '..')
+
+
+def sqlite_path_from_uri(uri):
+    """Turn a SQLAlchemy-style sqlite URI into a filesystem path."""
+    if not uri.startswith('sqlite:///'):
+        raise ValueError(f"Unsupported database URI: {uri!r} (only sqlite:/// is supported)")
+    path = uri[len('sqlite:///'):]
+    if path == ':memory:' or os.path.isabs(path):
+        return path
+    # Relative paths are resolved against the backend folder, which is where
+    # config.py creates the ``instance`` directory.
+    return os.path.abspath(os.path.join(BACKEND_DIR, path))
+
+
+def default_db_path():
+    return sqlite_path_from_uri(Config.SQLALCHEMY_DATABASE_URI)
+
+
+class SqliteDatabase:
+    def __init__(self, path, schema):
+        self.path = path
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._local = threading.local()
+        self.connect().executescript(schema)
+
+    def add_columns(self, table, columns):
+        """Add ``{name: definition}`` columns missing from a table created by an older schema."""
+        conn = self.connect()
+        existing = {row['name'] for row in conn.execute(f'PRAGMA table_info({table})')}
+        for name, definition in columns.items():
+            if name not in existing:
+                try:
+                    conn.execute(f'ALTER TABLE {table} ADD COLUMN {name} {definition}')
+                except sqlite3.OperationalError as e:
+                    if 'duplicate column' not in str(e):  # another worker got there first
+                        raise
+
+    def connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=30000')
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        conn = self.connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
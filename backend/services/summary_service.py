@@ -1,8 +1,11 @@
 from models.summarizer_model import summarize_text
 from models.nlp_utils import extract_keywords, generate_study_tips
+from models.document_analysis import analyze_document
 
-def generate_summary(text, subject, max_sentences=3):
-    summary = summarize_text(text, max_sentences)
-    keywords = extract_keywords(text)
+def generate_summary(text, subject, max_sentences=3, analysis=None, ratio=None, keywords=None):
+    analysis = analysis or analyze_document(text)
+    summary = summarize_text(text, max_sentences, analysis=analysis, ratio=ratio)
+    if keywords is None:
+        keywords = extract_keywords(text, analysis=analysis)
     tips = generate_study_tips(keywords, subject)
     return summary, tips
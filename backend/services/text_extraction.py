@@ -1,19 +1,15 @@
-import PyPDF2
 import requests
-from bs4 import BeautifulSoup
 import re
 
 def extract_text_from_source(source, source_type):
     if source_type == 'pdf':
-        reader = PyPDF2.PdfReader(source)
-        text = ''
-        for page in reader.pages:
-            text += page.extract_text() or ''
+        from services.pdf_extraction import extract_pdf, extract_pdf_stream
+        text, _ = extract_pdf(source) if isinstance(source, str) else extract_pdf_stream(source)
         return text
     elif source_type == 'url':
-        resp = requests.get(source)
-        soup = BeautifulSoup(resp.text, 'html.parser')
-        return ' '.join([p.get_text() for p in soup.find_all('p')])
+        from config import Config
+        from services.url_fetcher import get_url_fetcher
+        return get_url_fetcher().fetch_text(source, max_chars=Config.URL_TEXT_MAX_CHARS)
     elif source_type == 'youtube':
         # Extract video transcript using YouTube API or fallback to title/description
         video_id = None
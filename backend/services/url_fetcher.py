@@ -0,0 +1,320 @@
+"""Fetching web pages as study notes.
+
+One pooled ``requests.Session`` per process keeps connections alive and caps
+concurrent connections per host (extra requests wait for a free one).
+Responses are cached on disk under ``data/http_cache``: entries are reused
+while fresh (``Cache-Control: max-age``) and otherwise revalidated with a
+conditional GET (``If-None-Match`` / ``If-Modified-Since``), so an unchanged
+page costs a 304.  Bodies are streamed with a size cap, and HTML is reduced to
+its main content (paragraph-like blocks, without navigation, scripts and
+link lists) before any truncation.
+"""
+import hashlib
+import io
+import os
+import pickle
+import re
+import threading
+import time
+from collections import namedtuple
+from html.parser import HTMLParser
+
+from config import Config
+
+CACHE_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', 'http_cache')
+USER_AGENT = 'AIStudyPal/1.0 (notes fetcher)'
+READ_CHUNK = 64 * 1024
+POOL_HOSTS = 16
+MIN_BLOCK_WORDS = 8
+MAX_LINK_DENSITY = 0.5
+
+FetchResult = namedtuple('FetchResult', 'url status content_type encoding body from_cache')
+
+
+class FetchError(Exception):
+    """The URL could not be fetched, or is not a document we can read."""
+
+
+# -- main-content extraction -------------------------------------------------
+
+SKIP_TAGS = {'script', 'style', 'noscript', 'template', 'svg', 'nav', 'header', 'footer',
+             'aside', 'form', 'iframe', 'button', 'select', 'head'}
+BLOCK_TAGS = {'p', 'div', 'section', 'article', 'main', 'li', 'ul', 'ol', 'pre', 'blockquote',
+              'td', 'th', 'tr', 'table', 'dd', 'dt', 'dl', 'figcaption', 'br', 'body',
+              'h1', 'h2', 'h3', 'h4', 'h5', 'h6'}
+HEADING_TAGS = {'h1', 'h2', 'h3', 'h4', 'h5', 'h6'}
+MAIN_TAGS = {'article', 'main'}
+
+
+class _BlockParser(HTMLParser):
+    """Splits a page into text blocks, noting link text and main-content markup."""
+
+    def __init__(self):
+        super().__init__()
+        self.blocks = []  # (text, link_chars, in_main, heading)
+        self._parts, self._link_chars = [], 0
+        self._skip = self._links = self._main = 0
+        self._heading = False
+
+    def _flush(self):
+        text = ' '.join(' '.join(self._parts).split())
+        if text:
+            self.blocks.append((text, self._link_chars, self._main > 0, self._heading))
+        self._parts, self._link_chars, self._heading = [], 0, False
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self._skip += 1
+        elif tag in BLOCK_TAGS:
+            self._flush()
+            self._heading = tag in HEADING_TAGS
+            if tag in MAIN_TAGS:
+                self._main += 1
+        elif tag == 'a':
+            self._links += 1
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self._skip = max(self._skip - 1, 0)
+        elif tag in BLOCK_TAGS:
+            self._flush()
+            if tag in MAIN_TAGS:
+                self._main = max(self._main - 1, 0)
+        elif tag == 'a':
+            self._links = max(self._links - 1, 0)
+
+    def handle_data(self, data):
+        if self._skip:
+            return
+        self._parts.append(data)
+        if self._links:
+            self._link_chars += len(data.strip())
+
+    def close(self):
+        super().close()
+        self._flush()
+
+
+def main_text(html):
+    """Readable main content of an HTML page, one block per line."""
+    parser = _BlockParser()
+    parser.feed(html)
+    parser.close()
+    blocks = parser.blocks
+    if sum(len(b[0]) for b in blocks if b[2]) >= 200:
+        blocks = [b for b in blocks if b[2]]  # the page marks its main content
+    keep = [len(text.split()) >= MIN_BLOCK_WORDS and links / len(text) <= MAX_LINK_DENSITY
+            for text, links, _, _ in blocks]
+    lines = []
+    for i, (text, _, _, heading) in enumerate(blocks):
+        # A heading is kept when the content it introduces is kept.
+        if keep[i] or (heading and i + 1 < len(blocks) and keep[i + 1]):
+            lines.append(text)
+    if not lines:
+        lines = [b[0] for b in blocks]
+    return '\n'.join(lines)
+
+
+def truncate(text, max_chars):
+    """Cut ``text`` to ``max_chars`` at a word boundary."""
+    if not max_chars or len(text) <= max_chars:
+        return text
+    cut = text.rfind(' ', 0, max_chars + 1)
+    return text[:cut if cut > 0 else max_chars].rstrip()
+
+
+# -- disk cache ---------------------------------------------------------------
+
+def _max_age(cache_control):
+    if 'no-store' in cache_control:
+        return None
+    if 'no-cache' in cache_control:
+        return 0
+    m = re.search(r'max-age\s*=\s*(\d+)', cache_control)
+    return int(m.group(1)) if m else 0
+
+
+class HttpCache:
+    """Response bodies plus their validators, one pickle per URL."""
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=256 << 20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._bytes = None
+        self._lock = threading.Lock()
+
+    def _path(self, url):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, key[:2], key + '.pkl')
+
+    def get(self, url):
+        try:
+            with open(self._path(url), 'rb') as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def put(self, url, entry):
+        path = self._path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump(entry, f)
+        os.replace(tmp, path)
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = sum(size for _, size, _ in self._usage())
+            else:
+                self._bytes += len(entry['body'])
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def _usage(self):
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+        return files
+
+    def _evict(self):
+        files = sorted(self._usage())
+        total = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if total <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self._bytes = total
+
+
+# -- fetcher ------------------------------------------------------------------
+
+def _charset(content_type, body):
+    m = re.search(r'charset=["\']?([\w-]+)', content_type, re.I)
+    if not m:
+        m = re.search(rb'<meta[^>]+charset=["\']?([\w-]+)', body[:4096], re.I)
+        return m.group(1).decode('ascii') if m else None
+    return m.group(1)
+
+
+class UrlFetcher:
+    def __init__(self, cache=None, timeout=10.0, max_bytes=5 << 20, per_host=4, session=None):
+        self.cache = cache
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.per_host = per_host
+        self._session = session
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'fresh_hits': 0, 'revalidated': 0}
+
+    def session(self):
+        with self._lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                from urllib3.util.retry import Retry
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=POOL_HOSTS, pool_maxsize=self.per_host, pool_block=True,
+                    max_retries=Retry(total=2, connect=2, read=1, backoff_factor=0.3,
+                                      status_forcelist=(502, 503, 504), allowed_methods={'GET'}))
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                session.headers['User-Agent'] = USER_AGENT
+                self._session = session
+            return self._session
+
+    def _read(self, resp):
+        length = resp.headers.get('Content-Length')
+        if length and length.isdigit() and int(length) > self.max_bytes:
+            raise FetchError(f'Response is larger than {self.max_bytes} bytes')
+        body = bytearray()
+        for chunk in resp.iter_content(READ_CHUNK):
+            body += chunk
+            if len(body) > self.max_bytes:
+                raise FetchError(f'Response is larger than {self.max_bytes} bytes')
+        return bytes(body)
+
+    def fetch(self, url):
+        """GET ``url`` through the cache; returns a ``FetchResult``."""
+        import requests
+        if not re.match(r'https?://[^/\s]+', url or '', re.I):
+            raise FetchError(f'Not an http(s) URL: {url!r}')
+        entry = self.cache.get(url) if self.cache else None
+        if entry and entry['fresh_until'] > time.time():
+            self.stats['fresh_hits'] += 1
+            return self._result(entry, from_cache=True)
+        headers = {}
+        if entry and entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+        self.stats['requests'] += 1
+        try:
+            with self.session().get(url, headers=headers, timeout=self.timeout, stream=True) as resp:
+                max_age = _max_age(resp.headers.get('Cache-Control', '').lower())
+                if resp.status_code == 304 and entry:
+                    self.stats['revalidated'] += 1
+                    entry['fresh_until'] = time.time() + (max_age or 0)
+                    self.cache.put(url, entry)
+                    return self._result(entry, from_cache=True)
+                if resp.status_code >= 400:
+                    raise FetchError(f'HTTP {resp.status_code} fetching {url}')
+                body = self._read(resp)
+                content_type = resp.headers.get('Content-Type', '')
+                entry = {'url': resp.url, 'status': resp.status_code, 'content_type': content_type,
+                         'encoding': _charset(content_type, body), 'body': body,
+                         'etag': resp.headers.get('ETag'), 'last_modified': resp.headers.get('Last-Modified'),
+                         'fresh_until': time.time() + (max_age or 0)}
+        except requests.RequestException as e:
+            raise FetchError(f'Could not fetch {url}: {e}') from e
+        if self.cache and max_age is not None and (max_age or entry['etag'] or entry['last_modified']):
+            self.cache.put(url, entry)
+        return self._result(entry, from_cache=False)
+
+    @staticmethod
+    def _result(entry, from_cache):
+        return FetchResult(entry['url'], entry['status'], entry['content_type'], entry['encoding'],
+                           entry['body'], from_cache)
+
+    def fetch_text(self, url, max_chars=None):
+        """Readable text of an HTML, plain-text or PDF URL, cut to ``max_chars``."""
+        result = self.fetch(url)
+        content_type = result.content_type.split(';')[0].strip().lower()
+        if content_type == 'application/pdf' or result.body.startswith(b'%PDF'):
+            from services.pdf_extraction import extract_pdf_stream
+            text, _ = extract_pdf_stream(io.BytesIO(result.body))
+            return truncate(text, max_chars)
+        if content_type and not content_type.startswith('text/') and 'xml' not in content_type:
+            raise FetchError(f'Unsupported content type: {content_type}')
+        try:
+            text = result.body.decode(result.encoding or 'utf-8', errors='replace')
+        except LookupError:
+            text = result.body.decode('utf-8', errors='replace')
+        if content_type in ('', 'text/html', 'application/xhtml+xml') and '<' in text:
+            text = main_text(text)
+        return truncate(text.strip(), max_chars)
+
+
+_fetcher = None
+_fetcher_lock = threading.Lock()
+
+
+def get_url_fetcher():
+    """Process-wide fetcher configured from ``Config``."""
+    global _fetcher
+    if _fetcher is None:
+        with _fetcher_lock:
+            if _fetcher is None:
+                _fetcher = UrlFetcher(HttpCache(CACHE_DIR, Config.URL_CACHE_MAX_BYTES),
+                                      timeout=Config.URL_FETCH_TIMEOUT, max_bytes=Config.URL_FETCH_MAX_BYTES,
+                                      per_host=Config.URL_FETCH_PER_HOST)
+    return _fetcher
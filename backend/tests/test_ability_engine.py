@@ -0,0 +1,84 @@
+import json
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+
+from services.ability_engine import AbilityStore, item_key, new_item, new_user, update
+
+
+def answers(results, prefix='q', difficulty=None):
+    return [{'question_id': f'{prefix}{i}', 'user_answer': 'a' if ok else 'b', 'correct_answer': 'a',
+             'difficulty': difficulty} for i, ok in enumerate(results)]
+
+
+def test_update_moves_user_and_item_in_opposite_directions():
+    user, item = new_user(), new_item()
+    p = update(user, item, True)
+    assert p == 0.5 and user['theta'] > 0 and item['beta'] < 0
+    assert user['variance'] < 1.0 and item['answers'] == item['correct'] == 1
+
+
+def test_interval_narrows_with_evidence(tmp_path):
+    abilities = AbilityStore(str(tmp_path / 'db.sqlite'))
+    first = abilities.record_attempt('u1', 'Bio', answers([True, True, False]))
+    for i in range(10):
+        last = abilities.record_attempt('u1', 'Bio', answers([True, True, False], prefix=f'r{i}_'))
+    assert last['ability_ci'][1] - last['ability_ci'][0] < first['ability_ci'][1] - first['ability_ci'][0]
+    assert last['ability_ci'][0] < last['ability'] < last['ability_ci'][1]
+    assert 55 < last['ability'] < 80 and last['answers'] == 33 and last['attempts'] == 11
+
+
+def test_items_learn_difficulty_and_trend_follows(tmp_path):
+    abilities = AbilityStore(str(tmp_path / 'db.sqlite'))
+    for user in range(5):
+        abilities.record_attempt(f'u{user}', 'Bio', answers([True, False]))
+    assert abilities.item('q0')['beta'] < abilities.item('q1')['beta']
+    for i in range(3):
+        abilities.record_attempt('learner', 'Bio', answers([False] * 4, prefix=f'w{i}_'))
+    for i in range(4):
+        state = abilities.record_attempt('learner', 'Bio', answers([True] * 4, prefix=f'x{i}_'))
+    assert state['trend'] == 'improving'
+    assert set(abilities.user_abilities('learner')) == {'Bio'}
+
+
+def test_free_form_answers_and_counts_only_attempts(tmp_path):
+    abilities = AbilityStore(str(tmp_path / 'db.sqlite'))
+    answer = {'question': 'Q?', 'user_answer': 'x', 'correct_answer': 'x'}
+    assert item_key(answer, 'Bio') == item_key(dict(answer), 'Bio') != item_key(answer, 'Chem')
+    state = abilities.record_attempt('u1', 'Bio', [], correct=4, total=5)
+    assert state['answers'] == 5 and state['ability'] > 50
+
+
+def test_replay_matches_live_updates(tmp_path):
+    history = {'u1': [{'subject': 'Bio', 'timestamp': '2024-01-02', 'answers': answers([True, False]),
+                       'correct': 1, 'total': 2},
+                      {'subject': 'Bio', 'timestamp': '2024-01-01', 'answers': answers([True, True]),
+                       'correct': 2, 'total': 2}],
+               'u2': [{'subject': 'Chem', 'timestamp': '2024-01-03', 'answers': [], 'correct': 1, 'total': 3}]}
+    live = AbilityStore(str(tmp_path / 'live.sqlite'))
+    live.record_attempt('u1', 'Bio', answers([True, True]))
+    live.record_attempt('u1', 'Bio', answers([True, False]))
+    replayed = AbilityStore(str(tmp_path / 'replay.sqlite'))
+    assert replayed.replay(history) == 3
+    assert replayed.user_abilities('u1') == live.user_abilities('u1')
+    assert replayed.replay(history) == 3 and replayed.user_abilities('u2')['Chem']['answers'] == 3
+
+    path = tmp_path / 'quiz_history.json'
+    path.write_text(json.dumps(history))
+    from replay_ability import main
+    assert main(['--history', str(path), '--db', str(tmp_path / 'cli.sqlite')]) == 0
+    assert AbilityStore(str(tmp_path / 'cli.sqlite')).user_abilities('u1') == live.user_abilities('u1')
+
+
+def test_empty_history_leaves_estimates_alone(tmp_path):
+    abilities = AbilityStore(str(tmp_path / 'db.sqlite'))
+    abilities.record_attempt('u1', 'Bio', answers([True, False]))
+    with pytest.raises(ValueError):
+        abilities.replay({'u1': []})
+    assert abilities.user_abilities('u1')['Bio']['answers'] == 2
+
+    from replay_ability import main
+    missing = str(tmp_path / 'missing.json')
+    assert main(['--history', missing, '--db', str(tmp_path / 'db.sqlite')]) == 1
+    assert abilities.user_abilities('u1')['Bio']['answers'] == 2
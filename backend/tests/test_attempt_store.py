@@ -0,0 +1,81 @@
+import json
+import os
+import sys
+import threading
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from services.attempt_store import SqliteAttemptStore, JsonAttemptStore, sqlite_path_from_uri
+
+
+def make_attempt(subject, accuracy, timestamp):
+    return {'subject': subject, 'accuracy': accuracy, 'correct': int(accuracy * 4), 'total': 4,
+            'timestamp': timestamp, 'answers': [{'topic': 'Algebra', 'user_answer': 'a', 'correct_answer': 'a'}]}
+
+
+def test_sqlite_path_from_uri():
+    assert sqlite_path_from_uri('sqlite:////tmp/x.db') == '/tmp/x.db'
+    assert sqlite_path_from_uri('sqlite:///instance/x.db').endswith(os.path.join('instance', 'x.db'))
+
+
+def test_sqlite_store_roundtrip(tmp_path):
+    store = SqliteAttemptStore(str(tmp_path / 'attempts.db'))
+    assert store.journal_mode() == 'wal'
+    store.add_attempt('u1', make_attempt('Math', 0.5, '2025-01-02T00:00:00'))
+    store.add_attempt('u1', make_attempt('Physics', 1.0, '2025-01-01T00:00:00'))
+    store.add_attempt('u2', make_attempt('Math', 0.25, '2025-01-03T00:00:00'))
+
+    attempts = store.get_attempts('u1')
+    assert [a['subject'] for a in attempts] == ['Physics', 'Math']
+    assert attempts[1]['answers'][0]['topic'] == 'Algebra'
+    assert len(store.get_attempts('u1', 'Math')) == 1
+    assert store.user_summary('u1') == (2, 0.75)
+    assert store.user_summary('nobody') == (0, 0.0)
+    assert store.count_since('u1', '2025-01-02T00:00:00') == 1
+
+
+def test_concurrent_writers_do_not_lose_attempts(tmp_path):
+    path = str(tmp_path / 'attempts.db')
+
+    def writer(n):
+        store = SqliteAttemptStore(path)
+        for i in range(25):
+            store.add_attempt('u1', make_attempt('Math', 1.0, f'2025-01-01T00:00:{i:02d}'))
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert SqliteAttemptStore(path).user_summary('u1')[0] == 100
+
+
+def test_json_migration_runs_once(tmp_path):
+    history_file = tmp_path / 'quiz_history.json'
+    history = {'u1': [make_attempt('Math', 0.5, '2025-01-01T00:00:00')],
+               'u2': [make_attempt('Math', 1.0, '2025-01-01T00:00:00')]}
+    history_file.write_text(json.dumps(history))
+
+    store = SqliteAttemptStore(str(tmp_path / 'attempts.db'))
+    assert store.migrate_json_history(str(history_file)) == 2
+    assert store.migrate_json_history(str(history_file)) == 0
+    assert sorted(store.user_ids()) == ['u1', 'u2']
+
+    json_store = JsonAttemptStore(str(history_file))
+    assert json_store.get_attempts('u1') == store.get_attempts('u1')
+
+
+def test_aggregates_follow_inserts_and_rebuild(tmp_path):
+    store = SqliteAttemptStore(str(tmp_path / 'attempts.db'))
+    for i, acc in enumerate([0.2, 0.4, 0.6, 0.8, 1.0, 0.5]):
+        agg = store.add_attempt('u1', make_attempt('Math', acc, f'2025-01-0{i + 1}T00:00:00'))
+    assert agg['attempts'] == 6
+    assert agg['recent'] == [0.4, 0.6, 0.8, 1.0, 0.5]
+    assert (agg['min_accuracy'], agg['max_accuracy']) == (0.2, 1.0)
+    assert store.topic_aggregates('u1')['Math']['Algebra'] == {'correct': 6, 'total': 6}
+    assert store.check_aggregates() == []
+
+    conn = store.db.connect()
+    conn.execute("UPDATE subject_aggregates SET attempts = 99")
+    assert store.check_aggregates() == [('u1', 'Math')]
+    assert store.rebuild_aggregates() == 1
+    assert store.check_aggregates() == []
+    assert store.subject_aggregate('u1', 'Math') == agg
@@ -0,0 +1,147 @@
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+
+import services.url_fetcher as url_fetcher
+from services.batch_ingestion import BatchIngestor, discard_unclaimed, validate_items
+from services.document_store import DocumentStore
+from services.nlp_executor import NlpExecutor
+from services.result_cache import ResultCache
+
+PAGE = ("<html><body><article><p>Page {} explains how enzymes lower the activation energy "
+        "of chemical reactions inside living cells.</p></article></body></html>")
+
+
+class Handler(BaseHTTPRequestHandler):
+    active = peak = 0
+    hits = 0
+    delay = 0.1
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        with Handler.lock:
+            Handler.hits += 1
+            Handler.active += 1
+            Handler.peak = max(Handler.peak, Handler.active)
+        time.sleep(Handler.delay)
+        with Handler.lock:
+            Handler.active -= 1
+        body = PAGE.format(self.path).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.setattr(url_fetcher, '_fetcher',
+                        url_fetcher.UrlFetcher(url_fetcher.HttpCache(str(tmp_path / 'http')), per_host=8))
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    Handler.active = Handler.peak = Handler.hits = 0
+    Handler.delay = 0.1
+    yield f'http://127.0.0.1:{httpd.server_address[1]}'
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def make_ingestor(tmp_path, **kwargs):
+    return BatchIngestor(NlpExecutor(workers=0),
+                         DocumentStore(str(tmp_path / 'db.sqlite'), blob_dir=str(tmp_path / 'blobs')),
+                         ResultCache(), **kwargs)
+
+
+def run(ingestor, items):
+    lines = [json.loads(line) for line in ingestor.run(validate_items(items, 200), 'Bio')]
+    return sorted(lines[:-1], key=lambda r: r['index']), lines[-1]
+
+
+def test_validate_items():
+    items = validate_items(['http://a/x', {'source': 'text', 'content': 'hi', 'pdf_path': '/etc/passwd'}], 10)
+    assert items == [{'source': 'url', 'url': 'http://a/x'}, {'source': 'text', 'content': 'hi'}]
+    for bad in ([], 'http://a', [{'source': 'ftp'}], ['x'] * 11):
+        with pytest.raises(ValueError):
+            validate_items(bad, 10)
+
+
+def test_mixed_batch_respects_per_host_limit(server, tmp_path):
+    ingestor = make_ingestor(tmp_path, workers=8, per_host=2)
+    items = [f'{server}/{i}' for i in range(6)]
+    items += [{'source': 'text', 'content': 'Enzymes are proteins that speed up reactions in cells.'},
+              {'source': 'text', 'content': ''}, {'source': 'pdf', 'file': 'missing'}]
+    results, summary = run(ingestor, items)
+    assert [r['status'] for r in results] == ['ok'] * 7 + ['error'] * 2
+    assert summary == dict(summary, done=True, ok=7, failed=2, total=9)
+    assert Handler.peak == 2
+    assert len({r['document_id'] for r in results[:6]}) == 6
+    assert ingestor._hosts == {}
+
+
+def test_repeat_batch_hits_the_cache(server, tmp_path):
+    ingestor = make_ingestor(tmp_path)
+    first, _ = run(ingestor, [f'{server}/a', f'{server}/b'])
+    second, _ = run(ingestor, [f'{server}/a', f'{server}/b'])
+    assert Handler.hits == 2
+    assert [r['document_id'] for r in first] == [r['document_id'] for r in second]
+
+
+def test_deadline_fails_unfinished_items(server, tmp_path):
+    Handler.delay = 1.0
+    ingestor = make_ingestor(tmp_path, workers=4, per_host=1, deadline=0.5)
+    results, summary = run(ingestor, [f'{server}/{i}' for i in range(3)])
+    assert all(r['status'] == 'error' and 'deadline' in r['error'] for r in results)
+    assert summary['failed'] == 3 and summary['seconds'] < 1.0
+
+
+def test_spool_files_outlive_the_deadline_until_their_item_finishes(tmp_path):
+    ingestor = make_ingestor(tmp_path, workers=2, deadline=0.2)
+    seen = []
+
+    def slow_extract(item):
+        time.sleep(0.5)
+        seen.append(os.path.exists(item['pdf_path']))
+        return 'Enzymes are proteins that speed up reactions in cells.', 1
+
+    ingestor._extract = slow_extract
+    items = []
+    for i in range(3):
+        path = tmp_path / f'spool{i}'
+        path.write_bytes(b'%PDF')
+        items.append({'source': 'pdf', 'pdf_path': str(path), 'digest': f'{i:064d}'})
+    lines = list(ingestor.run(items, 'Bio'))
+    assert json.loads(lines[-1])['failed'] == 3
+    # The third item was cancelled before it started; the other two are still extracting.
+    assert not os.path.exists(items[2]['pdf_path'])
+    assert os.path.exists(items[0]['pdf_path']) and os.path.exists(items[1]['pdf_path'])
+    time.sleep(0.8)
+    assert seen == [True, True]
+    assert not any(os.path.exists(item['pdf_path']) for item in items)
+
+
+def test_items_are_indexed_through_the_runner_and_unstarted_spools_discarded(tmp_path):
+    class Indexer:
+        calls = []
+
+        def index(self, user_id, subject, doc_id, text):
+            self.calls.append((user_id, subject, doc_id))
+
+    ingestor = make_ingestor(tmp_path, indexer=Indexer())
+    results, _ = run(ingestor, [{'source': 'text', 'content': 'Enzymes are proteins that speed up reactions.'}])
+    assert Indexer.calls == [('default', 'Bio', results[0]['document_id'])]
+
+    path = tmp_path / 'spool'
+    path.write_bytes(b'%PDF')
+    items = [{'source': 'pdf', 'pdf_path': str(path), 'digest': '0' * 64}]
+    ingestor.run(items, 'Bio')  # a response that is closed unread never starts the generator
+    discard_unclaimed(items)
+    assert not path.exists()
@@ -0,0 +1,55 @@
+import os
+import sys
+from collections import Counter
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from models import corpus_tfidf
+from models.corpus_tfidf import CorpusTfidf, document_terms, fit_corpus_model, score_sentences
+from models.document_analysis import analyze_document
+
+DOCS = ["neural networks learn weights from data",
+        "linked lists and stacks are data structures",
+        "photosynthesis converts light energy",
+        "neural networks power deep learning"]
+
+
+def test_idf_matches_sklearn(tmp_path):
+    model = fit_corpus_model(DOCS, path=str(tmp_path / 'corpus.npz'))
+    ref = TfidfVectorizer(stop_words='english').fit(DOCS)
+    terms = sorted(ref.vocabulary_)
+    expected = ref.idf_[[ref.vocabulary_[t] for t in terms]]
+    assert np.allclose(model.idf_for(terms), expected)
+
+
+def test_incremental_fit_equals_full_fit(tmp_path):
+    path = str(tmp_path / 'corpus.npz')
+    model = CorpusTfidf().partial_fit(document_terms(d) for d in DOCS[:2])
+    model.partial_fit(document_terms(d) for d in DOCS[2:])
+    model.save(path)
+    full = CorpusTfidf().partial_fit(document_terms(d) for d in DOCS)
+    loaded = CorpusTfidf.load(path)
+    assert loaded.n_docs == 4
+    assert np.allclose(loaded.idf_for(full.terms), full.idf_for(full.terms))
+
+
+def test_buffered_documents_are_merged_on_flush(tmp_path, monkeypatch):
+    # Other tests parse notes in-process, which buffers their terms too.
+    monkeypatch.setattr(corpus_tfidf, '_pending', Counter())
+    monkeypatch.setattr(corpus_tfidf, '_pending_docs', 0)
+    path = str(tmp_path / 'corpus.npz')
+    fit_corpus_model(DOCS, path=path)
+    corpus_tfidf.add_documents(["quantum entanglement puzzles physicists"], flush_every=2, path=path)
+    assert CorpusTfidf.load(path).n_docs == 4
+    corpus_tfidf.add_documents(["quantum tunnelling in semiconductors"], flush_every=2, path=path)
+    model = CorpusTfidf.load(path)
+    assert model.n_docs == 6
+    assert model.df[model.vocabulary['quantum']] == 2
+
+
+def test_rare_terms_score_higher():
+    model = CorpusTfidf().partial_fit(document_terms(d) for d in DOCS)
+    analysis = analyze_document("Neural networks learn. Photosynthesis converts light.")
+    common, rare = score_sentences(analysis, model)
+    assert rare > 0 and common > 0
+    assert model.idf_for(['photosynthesis'])[0] > model.idf_for(['neural'])[0]
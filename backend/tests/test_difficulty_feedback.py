@@ -0,0 +1,114 @@
+import os
+import sys
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from models.quiz_model import (train_quiz_models, learn_difficulty, classify_difficulty, difficulty_label,
+                               question_features)
+from models.model_registry import load_pickles
+from services.difficulty_feedback import DifficultyFeedback
+from services.nlp_executor import NlpExecutor, PoolBusy
+from services.question_bank import QuestionBank
+
+HARD = 'Derive the eigenvalues of the Hamiltonian operator?'
+
+
+def p_wrong(path, question):
+    return load_pickles(path).predict_proba(question_features([question]))[0, 1]
+
+
+def test_seed_model_is_created_once(tmp_path):
+    path = str(tmp_path / 'difficulty.pkl')
+    model = train_quiz_models(path)
+    assert os.path.exists(path)
+    learn_difficulty([HARD] * 5, [1] * 5, path=path)
+    # An existing, already-learning model is kept rather than reseeded.
+    assert train_quiz_models(path).predict_proba(question_features([HARD]))[0, 1] == p_wrong(path, HARD)
+    assert list(model.classes_) == [0, 1]
+
+
+def test_answers_move_the_predicted_difficulty(tmp_path):
+    path = str(tmp_path / 'difficulty.pkl')
+    train_quiz_models(path)
+    before = p_wrong(path, HARD)
+    for _ in range(20):
+        learn_difficulty([HARD, 'What is 2+2?'], [1, 0], path=path)
+    assert p_wrong(path, HARD) > max(before, 0.65)
+    assert classify_difficulty([HARD, 'What is 2+2?'], model=load_pickles(path)) == ['hard', 'easy']
+
+
+def test_difficulty_labels():
+    assert [difficulty_label(p) for p in (0.1, 0.35, 0.64, 0.65, 0.9)] == ['easy', 'medium', 'medium', 'hard', 'hard']
+
+
+def test_feedback_learns_in_micro_batches(tmp_path, monkeypatch):
+    path = str(tmp_path / 'difficulty.pkl')
+    calls = []
+
+    def learn(questions, wrong):
+        calls.append(len(questions))
+        return learn_difficulty(questions, wrong, path=path)
+
+    monkeypatch.setattr('services.nlp_tasks.learn_difficulty', learn)
+    feedback = DifficultyFeedback(NlpExecutor(workers=0), batch_size=4, interval=3600)
+    answers = [{'question': HARD, 'user_answer': 'a', 'correct_answer': 'b'}] * 6
+    answers += [{'question': '', 'user_answer': 'a', 'correct_answer': 'a'}]
+    assert feedback.record(answers) == 6
+    feedback.flush()
+    deadline = time.time() + 5
+    while feedback.stats['learned'] < 6 and time.time() < deadline:  # the full batch may be on the thread
+        time.sleep(0.01)
+    assert sorted(calls) == [2, 4]
+    assert feedback.stats['learned'] == 6 and feedback.stats['recorded'] == 6
+    assert p_wrong(path, HARD) > 0.5
+
+
+class BusyPool:
+    def __init__(self):
+        self.busy = True
+        self.calls = 0
+
+    def run(self, fn, *args):
+        self.calls += 1
+        if self.busy:
+            raise PoolBusy()
+        return fn(*args)
+
+
+def test_busy_pool_keeps_the_queue(tmp_path, monkeypatch):
+    monkeypatch.setattr('services.nlp_tasks.learn_difficulty', lambda questions, wrong: len(questions))
+    nlp = BusyPool()
+    feedback = DifficultyFeedback(nlp, batch_size=2, interval=3600)
+    feedback._thread = True  # drive flush by hand
+    feedback.record([{'question': f'Q{i}?', 'user_answer': 'a', 'correct_answer': 'a'} for i in range(5)])
+    assert feedback.flush() == 0 and nlp.calls == 1
+    assert list(feedback._pending)[0][0] == 'Q0?' and len(feedback._pending) == 5
+    nlp.busy = False
+    assert feedback.flush() == 5 and feedback.stats['batches'] == 3
+
+
+def test_bank_follows_the_model(tmp_path, monkeypatch):
+    path = str(tmp_path / 'difficulty.pkl')
+    monkeypatch.setattr('services.nlp_tasks.learn_difficulty',
+                        lambda questions, wrong: learn_difficulty(questions, wrong, path=path))
+    monkeypatch.setattr('models.quiz_model.DIFFICULTY_MODEL_PATH', path)
+    monkeypatch.setattr('services.nlp_tasks.difficulties',
+                        lambda questions: classify_difficulty(questions, model=load_pickles(path)))
+    bank = QuestionBank(str(tmp_path / 'db.sqlite'))
+    texts = [HARD, 'What colour is the sky on a clear day?', 'Name the largest planet of the solar system?']
+    bank.add([{'question': q, 'answer': f'a{i}', 'options': [f'a{i}', 'b', 'c', 'd'], 'difficulty': 'easy'}
+              for i, q in enumerate(texts)], 'doc1', 'Physics')
+    feedback = DifficultyFeedback(NlpExecutor(workers=0), bank=bank, batch_size=64, interval=3600, relabel_rows=2)
+    feedback._thread = True
+    assert feedback.relabel() == 0  # nothing learned yet
+    train_quiz_models(path)
+    for _ in range(20):
+        feedback.record([{'question': HARD, 'user_answer': 'a', 'correct_answer': 'b'},
+                         {'question': texts[1], 'user_answer': 'a', 'correct_answer': 'a'}])
+    feedback.flush()
+    feedback.relabel()
+    feedback.relabel()  # two rows per tick
+    assert feedback.relabel() == 0 and feedback._relabel_from is None
+    labels = {question: difficulty for _, _, question, difficulty in bank.questions_after(0, 10)}
+    assert labels[HARD] == 'hard' and labels[texts[1]] == 'easy'
+    assert [q['question'] for q in bank.sample(1, 'easy', document_id='doc1')] == [texts[1]]
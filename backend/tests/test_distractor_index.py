@@ -0,0 +1,67 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import numpy as np
+from models.distractor_index import TermIndex, SubjectIndexes, pick_distractors
+from models.document_analysis import analyze_document
+from models.quiz_model import generate_mcqs, BLANK
+
+NOTES = ("Mitochondria and ribosomes are organelles inside the cell. "
+         "Chloroplasts and mitochondria are organelles that convert energy. "
+         "Ribosomes and chloroplasts are organelles found in plant cells. "
+         "Tokyo and Paris are capital cities with large populations. "
+         "Paris and Berlin are capital cities in Europe.")
+
+
+def test_cooccurring_terms_are_neighbours():
+    index = TermIndex()
+    index.add_analysis(analyze_document(NOTES))
+    near = index.nearest(['mitochondria'], k=3)[0]
+    assert 'ribosomes' in near or 'chloroplasts' in near
+    assert 'tokyo' not in near
+    assert index.nearest(['unknownterm'])[0] == []
+
+
+def test_incremental_updates_merge_additively():
+    a, b, both = TermIndex(), TermIndex(), TermIndex()
+    first, second = NOTES.split('Tokyo')
+    a.add_analysis(analyze_document(first))
+    b.add_analysis(analyze_document('Tokyo' + second))
+    both.add_analysis(analyze_document(first))
+    both.add_analysis(analyze_document('Tokyo' + second))
+    a.merge(b)
+    order = [a.vocabulary[t] for t in both.terms]
+    assert np.allclose(a.vectors[order], both.vectors)
+
+
+def test_subject_index_persists_between_workers(tmp_path):
+    writer = SubjectIndexes(str(tmp_path), flush_every=1)
+    writer.add('Biology 101', analyze_document(NOTES))
+    reader = SubjectIndexes(str(tmp_path))
+    assert 'mitochondria' in reader.get('Biology 101').vocabulary
+    assert len(reader.get('History')) == 0
+
+
+def test_distractors_exclude_answer_and_sentence_terms():
+    index = TermIndex()
+    index.add_analysis(analyze_document(NOTES))
+    options = pick_distractors('Mitochondria', ['organelles'], [index], n=3)
+    assert len(options) == 3
+    assert 'Mitochondria' not in options and 'Organelles' not in options
+    assert all(o[0].isupper() for o in options)
+
+
+def test_generated_questions_use_real_distractors():
+    questions = generate_mcqs(NOTES, 3, seed=1)
+    assert questions
+    for q in questions:
+        assert BLANK in q['question']
+        assert q['answer'] in q['options'] and len(set(q['options'])) == 4
+        assert not any(o.startswith('Option ') for o in q['options'])
+        # Sentence-initial capitals are not carried into the options; proper nouns keep theirs.
+        assert all(o.islower() for o in q['options']) or q['answer'] in ('Paris', 'Tokyo', 'Berlin')
+
+
+def test_sentences_without_enough_distractors_give_no_question():
+    questions = generate_mcqs("Photosynthesis happens inside green plant leaves. " * 3, 3, seed=1)
+    assert questions == []
@@ -0,0 +1,46 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from sklearn.feature_extraction.text import CountVectorizer
+from models.document_analysis import analyze_document
+from models.summarizer_model import summarize_text
+from models.nlp_utils import extract_keywords
+
+TEXT = ("Photosynthesis converts light energy into chemical energy. "
+        "Chlorophyll absorbs light in the chloroplast! "
+        "The Calvin cycle fixes carbon dioxide. "
+        "Light energy drives the light reactions.")
+
+
+def test_analysis_is_computed_once_per_text():
+    a = analyze_document(TEXT)
+    assert len(a.sentences) == 4
+    assert a.sentence_tokens[1][0] == 'Chlorophyll'
+    assert a.term_freq['light'] == 4
+    assert 'the' not in a.content_freq
+    assert a.sentence_term_matrix.shape == (4, len(a.vocabulary))
+    assert a.sentence_term_matrix[3, a.vocabulary['light']] == 2
+
+
+def test_project_matches_count_vectorizer():
+    a = analyze_document(TEXT)
+    vec = CountVectorizer().fit(["light energy calvin cycle", "carbon dioxide chloroplast"])
+    rows = [0, 3]
+    expected = vec.transform([a.sentences[i] for i in rows])
+    assert (a.project(vec.vocabulary_, rows) != expected).nnz == 0
+
+
+def test_consumers_accept_shared_analysis():
+    a = analyze_document(TEXT)
+    assert summarize_text(TEXT, 2, analysis=a) == summarize_text(TEXT, 2)
+    assert extract_keywords(TEXT, 2, analysis=a) == extract_keywords(TEXT, 2)
+
+
+def test_sentences_split_after_quotes_and_on_new_lines():
+    a = analyze_document('Cells divide by mitosis\nDNA replicates first\n\n"Ribosomes make proteins."\nThe end.')
+    assert a.sentences == ['Cells divide by mitosis', 'DNA replicates first', '"Ribosomes make proteins."',
+                           'The end.']
+    assert analyze_document('He said "Stop." Then he left (see above.) Next!').sentences == [
+        'He said "Stop."', 'Then he left (see above.)', 'Next!']
+    # A hard-wrapped line continues its sentence.
+    assert len(analyze_document('A line that\nwraps onto the next.').sentences) == 1
@@ -0,0 +1,96 @@
+import io
+import os
+import sqlite3
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.document_store import DocumentStore, document_id
+from services.pdf_extraction import spool_upload
+from services.result_cache import ResultCache
+
+TEXT = "Osmosis moves water across a membrane. It needs no energy."
+
+
+def make_store(tmp_path, **kwargs):
+    return DocumentStore(str(tmp_path / 'db.sqlite'), blob_dir=str(tmp_path / 'blobs'), **kwargs)
+
+
+def spool(tmp_path, data):
+    return spool_upload(io.BytesIO(data), directory=str(tmp_path))
+
+
+def test_metadata_is_recorded(tmp_path):
+    docs = make_store(tmp_path)
+    doc = docs.get(docs.put(TEXT, 'Bio', 'pdf', ['osmosis'], page_count=3))
+    assert doc['page_count'] == 3 and doc['token_count'] == 10 and doc['size_bytes'] == len(TEXT)
+    assert doc['subject'] == 'Bio' and doc['source'] == 'pdf'
+
+
+def test_uploads_are_linked_per_page_range(tmp_path):
+    docs = make_store(tmp_path)
+    path, digest = spool(tmp_path, b'%PDF raw bytes')
+    blob = docs.store_upload(path, digest)
+    assert not os.path.exists(path) and open(blob, 'rb').read() == b'%PDF raw bytes'
+    doc_id = docs.put(TEXT, upload=digest, pages='1-2')
+    assert docs.find_upload(digest, ' 1-2 ')['id'] == doc_id
+    assert docs.find_upload(digest) is None
+    assert docs.find_upload('0' * 64, '1-2') is None
+
+    again, same = spool(tmp_path, b'%PDF raw bytes')
+    assert same == digest and docs.store_upload(again, digest) == blob
+    assert not os.path.exists(again) and docs.usage()['uploads'] == 1
+
+
+def test_gc_evicts_least_recently_used(tmp_path):
+    docs = make_store(tmp_path, max_bytes=10 ** 6)
+    path, digest = spool(tmp_path, b'x' * 400)
+    blob = docs.store_upload(path, digest)
+    old = docs.put('old notes ' * 30, upload=digest)
+    with docs.db.transaction() as conn:
+        conn.execute("UPDATE documents SET last_used_at = '2000-01-01' WHERE id = ?", (old,))
+        conn.execute("UPDATE uploads SET last_used_at = '2000-01-02'")
+    new = docs.put('new notes ' * 30)
+    assert docs.gc(max_bytes=500) == {'documents': 1, 'uploads': 1, 'bytes': 300}
+    assert docs.get(old) is None and docs.get(new) is not None
+    assert not os.path.exists(blob) and docs.find_upload(digest) is None
+
+
+def test_putting_again_counts_as_a_use_and_eviction_drops_cached_parses(tmp_path):
+    cache = ResultCache()
+    docs = DocumentStore(str(tmp_path / 'db.sqlite'), blob_dir=str(tmp_path / 'blobs'), cache=cache)
+    old = docs.put('old notes ' * 30, cache_key='parse-old')
+    new = docs.put('new notes ' * 30, cache_key='parse-new')
+    cache.set('parse-old', {'document_id': old})
+    cache.set('parse-new', {'document_id': new})
+    with docs.db.transaction() as conn:
+        conn.execute("UPDATE documents SET last_used_at = '2000-01-01' WHERE id = ?", (old,))
+    # A cache hit re-puts its document, so ``old`` is now the more recently used one.
+    assert docs.put('old notes ' * 30) == old
+    docs.gc(max_bytes=400)
+    assert docs.get(new) is None and docs.get(old) is not None
+    assert cache.get('parse-new') is None and cache.get('parse-old') == {'document_id': old}
+
+    # Putting an evicted document back stores it again under the same id.
+    assert docs.put('new notes ' * 30) == new and docs.get_text(new) == 'new notes ' * 30
+
+
+def test_gc_runs_when_the_store_outgrows_its_budget(tmp_path):
+    docs = make_store(tmp_path, max_bytes=1000)
+    ids = [docs.put(f'document {i} ' + 'words ' * 50) for i in range(5)]
+    assert docs.usage()['document_bytes'] <= 1000
+    assert docs.get(ids[-1]) is not None
+
+
+def test_old_tables_gain_the_new_columns(tmp_path):
+    path = str(tmp_path / 'db.sqlite')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE documents (id TEXT PRIMARY KEY, subject TEXT NOT NULL, source TEXT NOT NULL, '
+                 "text TEXT NOT NULL, word_count INTEGER NOT NULL, keywords TEXT NOT NULL DEFAULT '[]', "
+                 'created_at TEXT NOT NULL)')
+    conn.execute("INSERT INTO documents VALUES (?, 'Bio', 'text', ?, 10, '[]', '2024-01-01')",
+                 (document_id(TEXT), TEXT))
+    conn.commit()
+    conn.close()
+    docs = DocumentStore(path, blob_dir=str(tmp_path / 'blobs'))
+    assert docs.get(document_id(TEXT))['size_bytes'] == len(TEXT)
+    assert docs.put(TEXT) == document_id(TEXT)
@@ -0,0 +1,129 @@
+import io
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from services.document_store import DocumentStore, document_id
+from services.ingestion_jobs import ORPHAN_ERROR, IngestionRunner, JobStore, job_events
+from services.nlp_executor import NlpExecutor
+from services.search_index import SearchIndex
+
+TEXT = ("Photosynthesis converts light energy into chemical energy in plants. "
+        "Chlorophyll in the chloroplast absorbs the light energy used by plants. "
+        "The Calvin cycle uses chemical energy to fix carbon dioxide into sugar.")
+
+
+def wait_for(jobs, job_id, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = jobs.get(job_id)
+        if job['status'] in ('done', 'failed'):
+            return job
+        time.sleep(0.05)
+    raise AssertionError('job did not finish')
+
+
+def test_document_ids_are_content_hashes(tmp_path):
+    docs = DocumentStore(str(tmp_path / 'db.sqlite'))
+    doc_id = docs.put(TEXT, 'Bio', 'text', ['light'])
+    assert doc_id == document_id(TEXT) == docs.put(TEXT + '  ', 'Bio')
+    assert docs.get_text(doc_id) == TEXT
+    assert docs.get(doc_id)['keywords'] == ['light']
+    assert docs.get('missing') is None
+
+
+def test_text_job_runs_to_done_and_stores_document(tmp_path):
+    path = str(tmp_path / 'db.sqlite')
+    jobs, docs = JobStore(path), DocumentStore(path)
+    runner = IngestionRunner(jobs, docs, NlpExecutor(workers=0))
+    job = wait_for(jobs, runner.submit('text', 'Bio', content=TEXT))
+    assert job['status'] == 'done' and job['done'] == job['total'] == 1
+    assert job['result']['keywords']
+    assert docs.get_text(job['document_id']) == TEXT
+
+
+def test_notes_are_indexed_on_the_runner_pool(tmp_path):
+    path = str(tmp_path / 'db.sqlite')
+    search = SearchIndex(path, index_dir=str(tmp_path / 'search'), background=False)
+    runner = IngestionRunner(JobStore(path), DocumentStore(path), NlpExecutor(workers=0), search=search)
+    doc_id = document_id(TEXT)
+    runner.index('u1', 'Bio', doc_id, TEXT)
+    deadline = time.time() + 10
+    while not search.has_document('u1', 'Bio', doc_id) and time.time() < deadline:
+        time.sleep(0.05)
+    assert search.search('u1', 'chlorophyll')[0]['document_id'] == doc_id
+
+
+def test_failed_extraction_is_reported(tmp_path):
+    path = str(tmp_path / 'db.sqlite')
+    jobs = JobStore(path)
+    runner = IngestionRunner(jobs, DocumentStore(path), NlpExecutor(workers=0))
+    assert wait_for(jobs, runner.submit('text', 'Bio', content='   '))['error'] == 'Could not extract content'
+    pdf = tmp_path / 'bad.pdf'
+    pdf.write_bytes(b'not a pdf')
+    job = wait_for(jobs, runner.submit('pdf', 'Bio', pdf_path=str(pdf)))
+    assert job['status'] == 'failed' and not pdf.exists()
+
+
+def test_events_stream_until_finished(tmp_path):
+    jobs = JobStore(str(tmp_path / 'db.sqlite'))
+    job_id = jobs.create('pdf', 'Bio')
+    jobs.update(job_id, status='running', stage='extracting', done=1, total=2)
+    jobs.update(job_id, status='done', stage='done', result={'word_count': 3})
+    events = list(job_events(jobs, job_id, poll=0.01))
+    assert len(events) == 1 and events[0].startswith('event: done\n')
+    assert list(job_events(jobs, 'missing'))[0].startswith('event: error')
+
+
+def test_orphaned_jobs_fail(tmp_path):
+    jobs = JobStore(str(tmp_path / 'db.sqlite'), stale_after=60)
+    mine, live, orphan, other = (jobs.create('url', 'Bio') for _ in range(4))
+    stale = (datetime.now() - timedelta(minutes=5)).isoformat()
+    with jobs.db.transaction() as conn:
+        # Another boot's jobs: one still refreshed by its runner, two not.
+        conn.execute("UPDATE ingest_jobs SET owner = 'gone' WHERE id IN (?, ?, ?)", (live, orphan, other))
+        conn.execute('UPDATE ingest_jobs SET updated_at = ? WHERE id IN (?, ?, ?)', (stale, mine, orphan, other))
+    assert jobs.fail_orphans() == 2
+    job = jobs.get(orphan)
+    assert (job['status'], job['stage'], job['error']) == ('failed', 'failed', ORPHAN_ERROR)
+    # A poll of a stale job fails it straight away.
+    polled = jobs.create('url', 'Bio')
+    with jobs.db.transaction() as conn:
+        conn.execute("UPDATE ingest_jobs SET owner = 'gone', updated_at = ? WHERE id = ?", (stale, polled))
+    assert jobs.get(polled)['status'] == 'failed'
+    assert jobs.get(mine)['status'] == jobs.get(live)['status'] == 'queued'
+    jobs.touch([orphan, mine])
+    assert jobs.get(orphan)['version'] == 1 and jobs.get(mine)['updated_at'] > stale
+
+
+def test_finished_jobs_are_pruned_after_their_ttl(tmp_path):
+    jobs = JobStore(str(tmp_path / 'db.sqlite'), ttl=3600)
+    old, running, recent = jobs.create('text', 'Bio'), jobs.create('url', 'Bio'), jobs.create('text', 'Bio')
+    jobs.update(old, status='done', stage='done')
+    jobs.update(recent, status='failed', error='x')
+    stale = (datetime.now() - timedelta(hours=2)).isoformat()
+    jobs.db.connect().execute('UPDATE ingest_jobs SET updated_at = ? WHERE id IN (?, ?)', (stale, old, running))
+    assert jobs.prune(3600) == 1
+    assert jobs.get(old) is None and jobs.get(running) and jobs.get(recent)
+
+
+def test_pdf_job_reports_page_progress(tmp_path):
+    from tests.pdf_fixtures import make_pdf
+    from services.pdf_extraction import spool_upload
+    path = str(tmp_path / 'db.sqlite')
+    jobs, docs = JobStore(path), DocumentStore(path, blob_dir=str(tmp_path / 'blobs'))
+    runner = IngestionRunner(jobs, docs, NlpExecutor(workers=0))
+    data = make_pdf(['Plants absorb light energy', 'Chlorophyll absorbs light', 'Sugar is made'])
+    pdf_path, digest = spool_upload(io.BytesIO(data), directory=str(tmp_path))
+    job = wait_for(jobs, runner.submit('pdf', 'Bio', pdf_path=pdf_path, pages='1-2', digest=digest))
+    assert job['status'] == 'done' and job['done'] == job['total'] == 2
+    assert job['result']['failed_pages'] == []
+    assert 'Sugar' not in docs.get_text(job['document_id'])
+    assert docs.get(job['document_id'])['page_count'] == 2
+    assert os.path.exists(docs.blob_path(digest)) and not os.path.exists(pdf_path)
+
+    pdf_path, _ = spool_upload(io.BytesIO(data), directory=str(tmp_path))
+    again = wait_for(jobs, runner.submit('pdf', 'Bio', pdf_path=pdf_path, pages='1-2', digest=digest))
+    assert again['document_id'] == job['document_id'] and again['result']['deduplicated']
+    assert again['total'] == 0 and not os.path.exists(pdf_path)
@@ -0,0 +1,35 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from models.keyphrase import extract_keyphrases, extract_keywords_batch
+from models.nlp_utils import extract_keywords, generate_study_tips
+
+TEXT = ("The Calvin cycle uses ATP. Carbon dioxide enters the Calvin cycle. "
+        "Plants absorb carbon dioxide through stomata. Light energy powers the light reactions. "
+        "The Calvin cycle makes glucose.")
+
+
+def test_recurring_phrases_beat_their_words():
+    phrases = extract_keyphrases(TEXT, 3)
+    assert phrases[:2] == ['calvin cycle', 'carbon dioxide']
+    assert 'cycle' not in phrases and 'calvin' not in phrases
+
+
+def test_one_off_ngrams_and_stopwords_are_not_phrases():
+    phrases = extract_keyphrases(TEXT, 10)
+    assert 'absorb carbon dioxide' not in phrases
+    assert all(w not in ('the', 'through') for p in phrases for w in p.split())
+
+
+def test_batch_matches_single_calls():
+    texts = [TEXT, "Mitosis divides the nucleus. Mitosis has four phases.", ""]
+    assert extract_keywords_batch(texts, 3) == [extract_keywords(t, 3) for t in texts]
+    assert extract_keywords_batch([""]) == [[]]
+
+
+def test_study_tips_use_keywords_and_default_subject():
+    tips = generate_study_tips(['calvin cycle', 'carbon dioxide', 'light'])
+    assert len(tips) == 5
+    assert 'General' in tips[0] and "'calvin cycle'" in tips[0]
+    assert any("'carbon dioxide' relates to 'light'" in t for t in tips)
+    assert generate_study_tips([], 'Biology')
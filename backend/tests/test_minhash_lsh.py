@@ -0,0 +1,35 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import numpy as np
+
+from models.minhash_lsh import LshIndex, NUM_PERM, question_shingles, question_signature, similarity
+
+SENTENCE = 'The light reactions take place in the thylakoid membranes of the chloroplast'
+
+
+def test_shingles_fill_the_blank():
+    a = question_shingles('The _____ reactions take place', 'light')
+    b = question_shingles('The light _____ take place', 'reactions')
+    assert a == b == {'the light', 'light reactions', 'reactions take', 'take place'}
+
+
+def test_signature_estimates_jaccard():
+    sig = question_signature(SENTENCE)
+    assert sig.shape == (NUM_PERM,) and sig.dtype == np.uint32
+    assert similarity(sig, question_signature(SENTENCE.upper() + '.')) == 1.0
+    near = question_signature(SENTENCE.replace('thylakoid', 'inner'))
+    assert 0.6 <= similarity(sig, near) < 1.0
+    assert similarity(sig, question_signature('Mitosis splits one cell into two daughter cells')) < 0.2
+
+
+def test_index_finds_near_duplicates_only():
+    index = LshIndex(capacity=2)
+    for i in range(50):
+        index.add(f'q{i}', question_signature(f'Unrelated sentence number {i} about topic {i * 7} here'))
+    index.add('target', question_signature(SENTENCE))
+    assert len(index) == 51 and 'target' in index
+    hits = index.query(question_signature(SENTENCE.replace('thylakoid', 'inner')), threshold=0.6)
+    assert [h for h, _ in hits] == ['target']
+    assert len(index.candidates(question_signature(SENTENCE))) < 10
+    assert index.query(question_signature('Completely different words entirely'), threshold=0.6) == []
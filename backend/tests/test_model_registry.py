@@ -0,0 +1,53 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from models.model_registry import ModelRegistry, dump_artifact
+
+
+def test_artifact_is_loaded_once(tmp_path, monkeypatch):
+    path = str(tmp_path / 'model.pkl')
+    dump_artifact({'weights': [1, 2]}, path)
+    calls = []
+
+    def loader(p):
+        calls.append(p)
+        import pickle
+        with open(p, 'rb') as f:
+            return pickle.load(f)
+
+    reg = ModelRegistry(check_interval=60)
+    reg.register('m', path, loader=loader)
+    first = reg.get('m')
+    assert reg.get('m') is first
+    assert len(calls) == 1
+    assert reg.versions()['m']['version'] == 1
+
+
+def test_changed_artifact_is_hot_swapped(tmp_path):
+    path = str(tmp_path / 'model.pkl')
+    dump_artifact('v1', path)
+    reg = ModelRegistry(check_interval=0)
+    reg.register('m', path)
+    assert reg.get('m') == 'v1'
+
+    # Rewriting identical bytes changes the mtime but not the hash: no reload.
+    dump_artifact('v1', path)
+    os.utime(path, ns=(1, 1))
+    assert reg.get('m') == 'v1'
+    assert reg.versions()['m']['version'] == 1
+
+    dump_artifact('v2', path)
+    assert reg.get('m') == 'v2'
+    assert reg.versions()['m']['version'] == 2
+
+
+def test_missing_artifact_is_trained(tmp_path):
+    a, b = str(tmp_path / 'a.pkl'), str(tmp_path / 'b.pkl')
+
+    def trainer():
+        dump_artifact('clf', a)
+        dump_artifact('vec', b)
+
+    reg = ModelRegistry()
+    reg.register('pair', (a, b), trainer=trainer)
+    assert reg.get('pair') == ('clf', 'vec')
@@ -0,0 +1,70 @@
+import os
+import sys
+import threading
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+from services.nlp_executor import NlpExecutor, PoolBusy, TaskTimeout, _run
+from services import nlp_tasks
+
+TEXT = ("Photosynthesis converts light energy into chemical energy in plants. "
+        "Chlorophyll in the chloroplast absorbs the light energy used by plants. "
+        "The Calvin cycle uses chemical energy to fix carbon dioxide into sugar. "
+        "Cellular respiration releases the energy stored in glucose molecules.")
+
+
+def test_inline_mode_runs_in_calling_process():
+    nlp = NlpExecutor(workers=0)
+    assert nlp.run(os.getpid) == os.getpid()
+    assert nlp.run(nlp_tasks.summarize, TEXT, 'Bio', 2)['summary']
+
+
+def test_pool_runs_tasks_and_recycles_workers():
+    nlp = NlpExecutor(workers=1, timeout=30, max_tasks_per_child=1)
+    try:
+        first, second = nlp.run(os.getpid), nlp.run(os.getpid)
+        assert os.getpid() not in (first, second)
+        assert first != second
+        questions = nlp.run(nlp_tasks.mcqs, TEXT, 2, 'Bio', seed=1)
+        assert len(questions) == 2 and questions[0]['subject'] == 'Bio'
+    finally:
+        nlp.shutdown()
+
+
+def test_timeout_interrupts_task_but_keeps_worker():
+    nlp = NlpExecutor(workers=1, timeout=0.5)
+    try:
+        with pytest.raises(TaskTimeout):
+            nlp.run(time.sleep, 5)
+        assert nlp.run(sum, [1, 2]) == 3
+        assert nlp.info()['timeouts'] == 1 and nlp.info()['restarts'] == 0
+    finally:
+        nlp.shutdown()
+
+
+def swallowing_sleep(seconds):
+    try:
+        time.sleep(seconds)
+    except Exception:
+        return []
+
+
+def test_timeout_is_not_swallowed_by_the_task():
+    start = time.time()
+    with pytest.raises(TaskTimeout):
+        _run(swallowing_sleep, (5,), {}, 0.2)
+    assert time.time() - start < 2
+
+
+def test_rejects_work_beyond_max_pending():
+    nlp = NlpExecutor(workers=1, timeout=3, max_pending=1)
+    try:
+        nlp.run(sum, [])  # start the worker
+        t = threading.Thread(target=nlp.run, args=(time.sleep, 1))
+        t.start()
+        time.sleep(0.2)
+        with pytest.raises(PoolBusy):
+            nlp.run(sum, [], timeout=0.1)
+        t.join()
+    finally:
+        nlp.shutdown()
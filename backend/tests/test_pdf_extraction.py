@@ -0,0 +1,65 @@
+import io
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+
+from services.pdf_extraction import (PdfExtractionError, extract_pdf, extract_pdf_stream, iter_pages,
+                                     parse_page_ranges, spool_upload)
+from tests.pdf_fixtures import make_pdf
+
+PAGES = [f'Page {i} covers topic number {i}' for i in range(1, 21)]
+
+
+@pytest.fixture
+def pdf_path(tmp_path):
+    path = tmp_path / 'notes.pdf'
+    path.write_bytes(make_pdf(PAGES))
+    return str(path)
+
+
+def test_parse_page_ranges():
+    assert parse_page_ranges(None, 4) == [0, 1, 2, 3]
+    assert parse_page_ranges('1-2, 4', 10) == [0, 1, 3]
+    assert parse_page_ranges('8-', 10) == [7, 8, 9]
+    assert parse_page_ranges('-2,2', 10) == [0, 1]
+    assert parse_page_ranges('3-50', 5) == [2, 3, 4]
+    for bad in ('0', '5-2', 'a', '1,,2'):
+        with pytest.raises(ValueError):
+            parse_page_ranges(bad, 10)
+
+
+def test_serial_and_parallel_extraction_agree(pdf_path):
+    serial = list(iter_pages(pdf_path, workers=1))
+    parallel = list(iter_pages(pdf_path, workers=2, chunk_pages=3))
+    assert [p.index for p in parallel] == list(range(len(PAGES)))
+    assert [p.text for p in parallel] == [p.text for p in serial]
+    assert all(PAGES[p.index] in p.text for p in serial)
+
+
+def test_extract_pdf_selects_pages_and_reports(pdf_path):
+    counts = []
+    assert len(list(iter_pages(pdf_path, '2-4', workers=1, on_count=counts.append))) == 3
+    assert counts == [3]
+    text, report = extract_pdf(pdf_path, '2,5', workers=1)
+    assert PAGES[1] in text and PAGES[4] in text and PAGES[0] not in text
+    assert report['pages'] == 2 and report['failed'] == []
+    assert [p['page'] for p in report['page_timings']] == [2, 5]
+
+
+def test_stream_extraction_removes_spool_file(tmp_path, monkeypatch):
+    import services.pdf_extraction as pdf_extraction
+    monkeypatch.setattr(pdf_extraction, 'spool_upload',
+                        lambda stream: spool_upload(stream, directory=str(tmp_path)))
+    text, report = extract_pdf_stream(io.BytesIO(make_pdf(['Cells divide by mitosis'])), workers=1)
+    assert 'mitosis' in text and report['pages'] == 1
+    assert os.listdir(tmp_path) == []
+
+
+def test_invalid_pdf(tmp_path):
+    path = tmp_path / 'bad.pdf'
+    path.write_bytes(b'not a pdf at all')
+    with pytest.raises(PdfExtractionError):
+        extract_pdf(str(path), workers=1)
+    from services.notes_service import parse_pdf
+    assert parse_pdf(io.BytesIO(b'not a pdf at all')) == ''
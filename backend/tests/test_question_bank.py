@@ -0,0 +1,119 @@
+import os
+import random
+import subprocess
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.question_bank import QuestionBank
+
+
+def make_questions(n, difficulty, prefix='q'):
+    return [{'question': f'{prefix} {i} _____ cells', 'answer': f'a{i}', 'options': [f'a{i}', 'b', 'c', 'd'],
+             'difficulty': difficulty, 'topic': 'Cells', 'source_sentence': i} for i in range(n)]
+
+
+def test_add_ignores_duplicates_and_marks_exhaustion(tmp_path):
+    bank = QuestionBank(str(tmp_path / 'db.sqlite'))
+    assert bank.add(make_questions(3, 'easy'), 'doc1', 'Bio') == 3
+    assert bank.source('doc1')['exhausted'] == 0
+    assert bank.add(make_questions(3, 'easy'), 'doc1', 'Bio') == 0
+    assert bank.source('doc1') == dict(bank.source('doc1'), rounds=2, exhausted=1)
+    assert not bank.needs_generation('doc1', 10)
+    assert bank.needs_generation('doc2', 1)
+
+
+def test_sample_prefers_difficulty_and_rotates(tmp_path):
+    bank = QuestionBank(str(tmp_path / 'db.sqlite'))
+    bank.add(make_questions(4, 'easy') + make_questions(4, 'medium', 'm'), 'doc1', 'Bio')
+    assert bank.counts(document_id='doc1') == {'easy': 4, 'medium': 4}
+    quiz = bank.sample(6, 'easy', document_id='doc1', rng=random.Random(0))
+    assert [q['difficulty'] for q in quiz] == ['easy'] * 4 + ['medium'] * 2
+    # The two medium questions not served yet come first.
+    second = bank.sample(2, 'medium', document_id='doc1')
+    assert [q['difficulty'] for q in second] == ['medium'] * 2
+    assert {q['id'] for q in second}.isdisjoint(q['id'] for q in quiz)
+    assert len(bank.sample(50, 'hard', document_id='doc1')) == 8
+
+
+def test_subject_and_topic_scope(tmp_path):
+    bank = QuestionBank(str(tmp_path / 'db.sqlite'))
+    bank.add(make_questions(2, 'easy'), 'doc1', 'Bio')
+    bank.add(make_questions(2, 'easy', 'x'), 'doc2', 'Chem')
+    assert {q['subject'] for q in bank.sample(10, subject='Bio')} == {'Bio'}
+    assert bank.sample(10, subject='Bio', topic='Other') == []
+    assert bank.counts(subject='Chem', topic='Cells') == {'easy': 2}
+
+
+def test_answers_update_usage_statistics(tmp_path):
+    bank = QuestionBank(str(tmp_path / 'db.sqlite'))
+    bank.add(make_questions(1, 'easy'), 'doc1', 'Bio')
+    q = bank.sample(1, document_id='doc1')[0]
+    answers = [{'question_id': q['id'], 'user_answer': 'a0', 'correct_answer': 'a0'},
+               {'question_id': q['id'], 'user_answer': 'b', 'correct_answer': 'a0'},
+               {'user_answer': 'x', 'correct_answer': 'y'}]
+    assert bank.record_answers(answers) == 2
+    assert bank.question_stats(q['id']) == {'times_served': 1, 'times_answered': 2, 'times_correct': 1}
+
+
+def test_bank_does_not_import_the_nlp_stack():
+    code = ('import sys; sys.path.insert(0, "."); import services.question_bank; '
+            'print(any(m in sys.modules for m in ("sklearn", "nltk", "numpy")))')
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                         cwd=os.path.join(os.path.dirname(__file__), '..'))
+    assert out.stdout.strip() == 'False', out.stderr
+
+
+def sentence_questions():
+    stem = 'Chlorophyll absorbs _____ mostly in the blue and red wavelengths of the spectrum'
+    return [{'question': stem, 'answer': 'light', 'options': ['light', 'b', 'c', 'd'], 'difficulty': 'easy'},
+            {'question': stem.replace('_____', 'light').replace('blue', '_____'), 'answer': 'blue',
+             'options': ['blue', 'b', 'c', 'd'], 'difficulty': 'easy'}]
+
+
+def test_near_duplicates_are_dropped_or_marked(tmp_path):
+    bank = QuestionBank(str(tmp_path / 'db.sqlite'))
+    # Two blanks cut from one sentence: the second is dropped.
+    assert bank.add(sentence_questions(), 'doc1', 'Bio') == 1
+    # The same sentence in other notes is kept for that document but marked.
+    assert bank.add(sentence_questions(), 'doc2', 'Bio') == 1
+    assert len(bank.sample(10, document_id='doc2')) == 1
+    assert len(bank.sample(10, subject='Bio')) == 1
+    # A fresh bank instance rebuilds its index from the stored signatures.
+    assert QuestionBank(str(tmp_path / 'db.sqlite')).add(sentence_questions(), 'doc3', 'Bio') == 1
+    assert bank.add(sentence_questions(), 'doc1', 'Bio') == 0
+
+
+def test_bulk_dedupe(tmp_path):
+    import sqlite3
+    bank = QuestionBank(str(tmp_path / 'db.sqlite'))
+    bank.add(make_questions(2, 'easy'), 'doc1', 'Bio')
+    # Rows written before signatures existed, including a near-duplicate pair.
+    conn = sqlite3.connect(str(tmp_path / 'db.sqlite'))
+    for qid, doc, stem in [('old1', 'doc9', 'Osmosis moves _____ across a membrane without energy'),
+                           ('old2', 'doc9', 'Osmosis moves water across a _____ without energy'),
+                           ('old3', 'doc8', 'Osmosis moves _____ across a membrane without energy')]:
+        conn.execute("INSERT INTO questions (id, subject, topic, difficulty, document_id, question, options, "
+                     "answer, times_served, created_at) VALUES (?, 'Bio', 'Cells', 'easy', ?, ?, '[]', ?, 2, 'x')",
+                     (qid, doc, stem, 'water' if stem.count('water') == 0 else 'membrane'))
+    conn.commit()
+    assert bank.dedupe(dry_run=True) == {'checked': 5, 'removed': 1, 'marked_duplicate': 1}
+    assert bank.dedupe() == {'checked': 5, 'removed': 1, 'marked_duplicate': 1}
+    assert bank.question_stats('old2') is None and bank.question_stats('old1')['times_served'] == 4
+    assert bank.dedupe() == {'checked': 4, 'removed': 0, 'marked_duplicate': 1}
+    assert len(bank.sample(10, subject='Bio')) == 3
+
+
+def test_forget_deletes_a_documents_questions(tmp_path):
+    bank = QuestionBank(str(tmp_path / 'db.sqlite'))
+    bank.add(sentence_questions(), 'doc1', 'Bio')
+    bank.add(sentence_questions(), 'doc2', 'Bio')
+    bank.add(make_questions(2, 'easy'), 'doc3', 'Bio')
+    assert bank.forget(['doc1']) == 1
+    assert bank.sample(10, document_id='doc1') == []
+    # doc2's copy of the question takes over from the one that went.
+    assert len(bank.sample(10, document_id='doc2')) == 1
+    assert len(bank.sample(10, subject='Bio')) == 3
+    assert bank.forget(['doc1']) == 0
+    # The question can be added again for a new document and is marked as doc2's copy.
+    assert bank.add(sentence_questions(), 'doc4', 'Bio') == 1
+    assert len(bank.sample(10, subject='Bio')) == 3
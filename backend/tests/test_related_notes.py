@@ -0,0 +1,184 @@
+import os
+import fcntl
+import random
+import sys
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import numpy as np
+
+from services.document_store import DocumentStore
+from services.related_notes import RelatedNotes, chunk_spans, fit_centroids, weigh
+
+TOPICS = {
+    'Biology': 'cell mitochondria photosynthesis chlorophyll enzyme protein membrane nucleus gene ribosome'.split(),
+    'Physics': 'force mass acceleration velocity momentum gravity friction newton inertia torque'.split(),
+    'History': 'empire treaty revolution monarchy parliament colony army battle dynasty senate'.split(),
+    'Chemistry': 'atom molecule covalent acid alkali reaction electron ion solution compound'.split(),
+}
+
+
+def make_index(tmp_path, **kwargs):
+    kwargs.setdefault('background', False)
+    return RelatedNotes(str(tmp_path / 'db.sqlite'), index_dir=str(tmp_path / 'related'), **kwargs)
+
+
+def topic_note(rng, words, sentences=3):
+    return ' '.join(' '.join(rng.choice(words) for _ in range(12)).capitalize() + '.' for _ in range(sentences))
+
+
+def fill(index, documents, per_topic, seed=0):
+    rng = random.Random(seed)
+    ids = {}
+    for subject, words in TOPICS.items():
+        for _ in range(per_topic):
+            text = topic_note(rng, words)
+            doc_id = documents.put(text, subject)
+            index.add_text('u1', subject, doc_id, text)
+            ids.setdefault(subject, []).append(doc_id)
+    return ids
+
+
+def test_chunks_are_runs_of_whole_sentences():
+    text = 'One two three. Four five six. Seven eight. Nine.'
+    spans = chunk_spans(text, words=4)
+    assert [text[a:b].strip() for a, b in spans] == ['One two three. Four five six.', 'Seven eight. Nine.']
+    assert spans[0][0] == 0 and spans[-1][1] == len(text)
+    assert chunk_spans('') == []
+
+
+def test_related_chunks_share_the_topic(tmp_path):
+    index = make_index(tmp_path)
+    documents = DocumentStore(str(tmp_path / 'db.sqlite'), blob_dir=str(tmp_path / 'blobs'))
+    ids = fill(index, documents, 3)
+    source = ids['Physics'][0]
+    assert index.add_text('u1', 'Physics', source, documents.get_text(source)) == 0
+
+    results = index.query('u1', documents.get_text(source), limit=2, exclude=source, documents=documents)
+    assert [r['subject'] for r in results] == ['Physics', 'Physics']
+    assert source not in {r['document_id'] for r in results}
+    assert all(r['text'] and r['text'] in documents.get_text(r['document_id']) for r in results)
+
+    results = index.query('u1', 'Which enzyme works in the mitochondria?', limit=10, documents=documents)
+    assert results and {r['subject'] for r in results} == {'Biology'}
+    assert index.query('u1', 'mitochondria enzyme', subject='History') == []
+    assert index.query('u1', 'the of and') == []
+
+
+def test_centroids_separate_clusters():
+    rng = np.random.default_rng(0)
+    vocabularies = rng.choice(1 << 18, size=(4, 30), replace=False)
+    rows = [np.unique(rng.choice(vocabularies[i % 4], 10)) for i in range(200)]
+    indptr = np.concatenate([[0], np.cumsum([len(r) for r in rows])])
+    indices = np.concatenate(rows).astype(np.uint32)
+    data = weigh(indptr, indices, np.ones(len(indices)), np.ones(1 << 18, dtype=np.float32))
+
+    centroids = fit_centroids(indptr, indices, data, 4)
+    labels = centroids.assign(indptr, indices, data)
+    assert sorted(len(set(labels[i::4])) for i in range(4)) == [1, 1, 1, 1]
+    assert len(set(labels)) == 4
+
+
+def test_clustered_index_prunes_without_losing_neighbours(tmp_path):
+    index = make_index(tmp_path, min_clustered=40, nprobe=2)
+    documents = DocumentStore(str(tmp_path / 'db.sqlite'), blob_dir=str(tmp_path / 'blobs'))
+    fill(index, documents, 10)
+    stats = index.stats()
+    assert stats['segments'] == 1 and stats['clustered_chunks'] == stats['chunks'] == 40
+    assert stats['clusters'] == 6
+
+    rng = random.Random(7)
+    for subject, words in TOPICS.items():
+        query = topic_note(rng, words, sentences=1)
+        pruned = index.query('u1', query, limit=5)
+        exhaustive = index.query('u1', query, limit=5, nprobe=stats['clusters'])
+        assert [r['subject'] for r in pruned] == [subject] * 5
+        assert pruned[0] == exhaustive[0]
+
+    # Notes added after clustering are sorted by the same centroids, and found through them.
+    text = 'Torque and inertia decide how a wheel turns; friction slows it.'
+    doc_id = documents.put(text, 'Physics')
+    assert index.add_text('u1', 'Physics', doc_id, text) == 1
+    rows = index._rows()
+    assert len(rows) == 2 and len({r['generation'] for r in rows}) == 1
+    assert index.query('u1', 'torque inertia wheel friction', limit=1)[0]['document_id'] == doc_id
+
+
+def test_small_segments_merge_by_tier(tmp_path):
+    index = make_index(tmp_path, merge_factor=4)
+    documents = DocumentStore(str(tmp_path / 'db.sqlite'), blob_dir=str(tmp_path / 'blobs'))
+    ids = fill(index, documents, 4)
+    assert index.stats() == {'segments': 1, 'chunks': 16, 'clustered_chunks': 0, 'clusters': 0}
+    assert sorted(os.listdir(tmp_path / 'related')) == [index._rows()[0]['name']]
+    results = index.query('u1', documents.get_text(ids['History'][1]), limit=3)
+    assert results[0]['document_id'] == ids['History'][1] and results[0]['score'] > 0.99
+
+
+def test_forgotten_documents_drop_out_then_are_rewritten_away(tmp_path):
+    index = make_index(tmp_path, min_clustered=40)
+    documents = DocumentStore(str(tmp_path / 'db.sqlite'), blob_dir=str(tmp_path / 'blobs'))
+    ids = fill(index, documents, 10)
+    gone = ids['Physics'][0]
+    text = documents.get_text(gone)
+    assert index.query('u1', text, limit=1)[0]['document_id'] == gone
+
+    # One chunk of forty: tombstoned, skipped by queries, not yet worth a rewrite.
+    assert index.forget([gone]) == 1 and not index.has_document('u1', gone)
+    results = index.query('u1', text, limit=5)
+    assert len(results) == 5 and gone not in {r['document_id'] for r in results}
+    assert index.stats()['chunks'] == 40 and index._tombstones()
+
+    # A quarter of the base gone: it is re-clustered without them.
+    index.forget(ids['History'])
+    assert index._tombstones() == {} and index.stats()['clustered_chunks'] == 29
+    assert all(r['subject'] != 'History' for r in index.query('u1', ' '.join(TOPICS['History']), limit=10))
+
+    # A forgotten document can be indexed again.
+    assert index.add_text('u1', 'Physics', gone, text) == 1
+    assert index.query('u1', text, limit=1)[0]['document_id'] == gone
+
+
+def test_users_only_see_their_own_notes(tmp_path):
+    index = make_index(tmp_path)
+    documents = DocumentStore(str(tmp_path / 'db.sqlite'), blob_dir=str(tmp_path / 'blobs'))
+    fill(index, documents, 2)
+    text = 'Torque and inertia decide how a wheel turns; friction slows it.'
+    doc_id = documents.put(text, 'Physics')
+    assert index.add_text('u2', 'Physics', doc_id, text) == 1
+    assert index.add_text('u2', 'Physics', doc_id, text) == 0
+    assert {r['document_id'] for r in index.query('u2', 'torque inertia friction', limit=5)} == {doc_id}
+    assert doc_id not in {r['document_id'] for r in index.query('u1', 'torque inertia friction', limit=5)}
+    assert index.query('u3', 'torque inertia friction') == []
+
+
+def test_legacy_documents_belong_to_the_default_user(tmp_path):
+    from services.sqlite_db import SqliteDatabase
+    SqliteDatabase(str(tmp_path / 'db.sqlite'), 'CREATE TABLE related_documents (document_id TEXT PRIMARY KEY, '
+                   'subject TEXT NOT NULL, chunks INTEGER NOT NULL, indexed_at TEXT NOT NULL);').connect().execute(
+        "INSERT INTO related_documents VALUES ('d1', 'Bio', 1, '2024-01-01')")
+    index = make_index(tmp_path)
+    assert index.has_document('default', 'd1') and not index.has_document('u1', 'd1')
+
+
+class RecordingPool:
+    def __init__(self):
+        self.calls = []
+
+    def run(self, fn, *args, timeout=None):
+        self.calls.append(fn.__name__)
+
+
+def test_maintenance_goes_to_the_pool_one_process_at_a_time(tmp_path):
+    pool = RecordingPool()
+    index = make_index(tmp_path, background=True, merge_factor=2, nlp=pool)
+    documents = DocumentStore(str(tmp_path / 'db.sqlite'), blob_dir=str(tmp_path / 'blobs'))
+    fill(index, documents, 1)
+    deadline = time.time() + 5
+    while not pool.calls and time.time() < deadline:
+        time.sleep(0.01)
+    assert 'maintain_related' in pool.calls
+    assert index.stats()['segments'] == 4  # nothing merged in this (web) process
+
+    with open(str(tmp_path / 'related') + '.lock', 'w') as held:
+        fcntl.flock(held, fcntl.LOCK_EX)
+        assert index.maintain() == 0
+    assert index.maintain() == 3 and index.stats()['segments'] == 1  # 4 -> 2 -> 1 by tier
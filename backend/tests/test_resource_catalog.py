@@ -0,0 +1,72 @@
+import json
+import os
+import sys
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from models.model_registry import ModelRegistry
+from services.resource_catalog import ResourceIndex, read_catalog
+
+CSV = """subject,title,url,type,topic,min_accuracy,max_accuracy
+Biology,Cell Biology Primer,https://x/cells,article,cells membranes,0,0.6
+Biology,Advanced Genetics,https://x/genetics,article,genetics,0.6,1
+Biology,Genetics Basics,https://x/genetics-basics,youtube,genetics,,
+Chemistry,Organic Chemistry,https://x/organic,article,,,
+General,Khan Academy,https://x/khan,article,,,
+General,Study Skills,https://x/skills,article,,0,0.4
+"""
+
+
+def index(tmp_path, text=CSV, name='resources.csv'):
+    path = tmp_path / name
+    path.write_text(text)
+    return ResourceIndex.load(str(path))
+
+
+def titles(results):
+    return [r['title'] for r, _ in results]
+
+
+def test_topics_and_accuracy_band_rank_results(tmp_path):
+    idx = index(tmp_path)
+    assert titles(idx.search('Biology genetics', accuracy=0.9, limit=2)) == ['Advanced Genetics', 'Genetics Basics']
+    low = idx.search('Biology genetics', accuracy=0.3, limit=10)
+    assert 'Advanced Genetics' not in titles(low)
+    assert titles(low)[-2:] == ['Khan Academy', 'Study Skills'] and low[-1][1] == 0.0
+    assert titles(idx.search('Biology cells', accuracy=0.3))[0] == 'Cell Biology Primer'
+
+
+def test_unknown_subject_falls_back_to_general(tmp_path):
+    idx = index(tmp_path)
+    assert titles(idx.search('Astronomy', accuracy=0.9)) == ['Khan Academy']
+    assert ResourceIndex().search('Biology') == []
+
+
+def test_jsonl_catalog_and_bad_rows(tmp_path):
+    rows = [{'subject': 'Physics', 'title': 'Optics', 'url': 'https://x/optics', 'max_accuracy': 'n/a'},
+            {'subject': 'Physics', 'title': 'No url'}]
+    path = tmp_path / 'catalog.jsonl'
+    path.write_text('\n'.join(json.dumps(r) for r in rows))
+    resources = read_catalog(str(path))
+    assert len(resources) == 1 and resources[0]['max_accuracy'] == 1.0 and resources[0]['type'] == 'web'
+
+
+def test_common_terms_only_rescore_candidates():
+    resources = [{'id': str(i), 'title': f'lesson {i}', 'url': f'https://x/{i}', 'type': 'web', 'subject': 'Math',
+                  'topic': 'algebra' if i % 50 == 0 else '', 'description': '', 'min_accuracy': 0.0,
+                  'max_accuracy': 1.0} for i in range(5000)]
+    idx = ResourceIndex(resources)
+    results = idx.search('math algebra', limit=5)
+    assert all(r['topic'] == 'algebra' for r, _ in results)
+    assert len(idx.search('math lesson', limit=5)) == 5
+
+
+def test_registry_reloads_edited_catalog(tmp_path):
+    path = tmp_path / 'resources.csv'
+    path.write_text(CSV)
+    registry = ModelRegistry(check_interval=0)
+    registry.register('resources', str(path), loader=ResourceIndex.load)
+    assert len(registry.get('resources')) == 6
+    time.sleep(0.01)
+    path.write_text(CSV + 'Physics,Optics,https://x/optics,article,,,\n')
+    assert titles(registry.get('resources').search('Physics')) == ['Optics', 'Khan Academy']
@@ -0,0 +1,57 @@
+import os
+import sys
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from services.result_cache import ResultCache, cache_key
+from models.quiz_model import generate_mcqs
+
+TEXT = ("Mitochondria produce most of the cell's ATP through respiration. "
+        "Ribosomes translate messenger RNA into chains of amino acids. "
+        "The nucleus stores genetic information as chromosomes of DNA. "
+        "Lysosomes digest worn out organelles and foreign material.")
+
+
+def test_key_ignores_whitespace_but_not_params():
+    assert cache_key('mcqs', 'a  b\n c', n=5) == cache_key('mcqs', ' a b c ', n=5)
+    assert cache_key('mcqs', 'a b c', n=5) != cache_key('mcqs', 'a b c', n=6)
+    assert cache_key('mcqs', 'a b c', n=5) != cache_key('summarize', 'a b c', n=5)
+
+
+def test_memory_lru_ttl_and_counters():
+    cache = ResultCache(max_entries=2, ttl=60)
+    calls = []
+    value = cache.get_or_compute('k1', lambda: calls.append(1) or {'x': [1]})
+    value['x'].append(2)  # callers get copies
+    assert cache.get_or_compute('k1', lambda: calls.append(1)) == {'x': [1]}
+    assert len(calls) == 1
+    cache.set('k2', 2)
+    cache.set('k3', 3)
+    assert cache.get('k1') is None  # evicted as least recently used
+    cache.set('short', 1, ttl=-1)
+    assert cache.get('short') is None
+    info = cache.info()
+    assert info['memory_hits'] == 1 and info['evictions'] == 2 and info['entries'] == 1
+
+
+def test_empty_results_are_not_stored():
+    cache = ResultCache()
+    assert cache.get_or_compute('k', lambda: []) == []
+    assert cache.get('k') is None
+    assert cache.get_or_compute('k', lambda: [1]) == [1]
+    assert cache.get('k') == [1]
+
+
+def test_disk_tier_is_shared_and_bounded(tmp_path):
+    a = ResultCache(disk_dir=str(tmp_path), max_disk_bytes=10_000)
+    a.set('k' * 64, 'hello')
+    b = ResultCache(disk_dir=str(tmp_path))
+    assert b.get('k' * 64) == 'hello'
+    assert b.info()['disk_hits'] == 1
+    for i in range(50):
+        a.set(f'{i:064d}', 'x' * 1000)
+    size = sum(os.path.getsize(os.path.join(r, f)) for r, _, fs in os.walk(tmp_path) for f in fs)
+    assert size <= 10_000
+
+
+def test_seeded_mcqs_are_reproducible():
+    assert generate_mcqs(TEXT, 2, seed=7) == generate_mcqs(TEXT, 2, seed=7)
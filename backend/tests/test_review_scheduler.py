@@ -0,0 +1,65 @@
+import os
+import sys
+from datetime import datetime, timedelta
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.review_scheduler import CORRECT_GRADE, WRONG_GRADE, ReviewScheduler, answer_grade, new_card, sm2
+from services.schedule_service import generate_study_schedule_csv
+
+NOW = datetime(2024, 3, 1, 9, 0)
+
+
+def answer(qid, ok):
+    return {'question_id': qid, 'question': f'{qid}?', 'user_answer': 'a' if ok else 'b', 'correct_answer': 'a',
+            'topic': 'Cells'}
+
+
+def test_sm2_intervals_and_lapses():
+    state = new_card()
+    intervals = []
+    for _ in range(4):
+        state = sm2(state, 5)
+        intervals.append(state['interval'])
+    assert intervals[:2] == [1.0, 6.0] and intervals[3] > intervals[2] > 6.0
+    lapsed = sm2(state, 1)
+    assert lapsed['interval'] == 1.0 and lapsed['repetitions'] == 0 and lapsed['lapses'] == 1
+    assert lapsed['ease'] < state['ease'] and sm2(dict(new_card(), ease=1.3), 0)['ease'] == 1.3
+
+
+def test_answer_grades_are_clamped_or_fall_back_to_correctness():
+    assert [answer_grade(dict(answer('q', True), grade=g)) for g in (3, '2', 9, -1, 4.6)] == [3, 2, 5, 0, 5]
+    for bad in (None, 'great', [], True, float('nan'), float('inf')):
+        assert answer_grade(dict(answer('q', True), grade=bad)) == CORRECT_GRADE
+        assert answer_grade(dict(answer('q', False), grade=bad)) == WRONG_GRADE
+
+
+def test_quiz_answers_create_cards_that_come_due(tmp_path):
+    reviews = ReviewScheduler(str(tmp_path / 'db.sqlite'))
+    assert reviews.record_answers('u1', 'Bio', [answer('q1', True), answer('q2', False)], now=NOW) == 2
+    assert reviews.due('u1', now=NOW) == []
+    due = reviews.due('u1', now=NOW + timedelta(days=1, minutes=1))
+    assert [c['item_id'] for c in due] == ['q1', 'q2'] and due[0]['question'] == 'q1?'
+    assert reviews.due('u1', subject='Chem', now=NOW + timedelta(days=2)) == []
+    # A correct answer in a quiz before the card is due leaves its schedule alone; a miss resets it.
+    assert reviews.record_answers('u1', 'Bio', [answer('q1', True), answer('q2', False)], now=NOW) == 1
+    assert reviews.due_count('u1', until=NOW + timedelta(days=1, minutes=1)) == 2
+
+
+def test_reviews_move_cards_between_day_buckets(tmp_path):
+    reviews = ReviewScheduler(str(tmp_path / 'db.sqlite'))
+    for user in ('u1', 'u2'):
+        reviews.record_answers(user, 'Bio', [answer('q1', True), answer('q2', True)], now=NOW)
+    tomorrow = NOW.date() + timedelta(days=1)
+    assert reviews.load(day=tomorrow) == {'due_today': 4, 'forecast': {}}
+    card = reviews.review('u1', 'q1', 5, now=NOW + timedelta(days=1))
+    assert card['interval'] == 6.0 and card['question'] == 'q1?'
+    assert reviews.load(day=tomorrow, days=7) == {'due_today': 3,
+                                                   'forecast': {(tomorrow + timedelta(days=6)).isoformat(): 1}}
+    assert reviews.review('u1', 'missing', 5) is None
+
+
+def test_schedule_starts_with_due_reviews():
+    rows = generate_study_schedule_csv('Bio', 4, {'Cells': 0.7}, due_reviews=120).splitlines()
+    assert rows[1] == 'Session 1,Bio,120 due reviews,Spaced Review,1.0,High'
+    assert rows[2].startswith('Session 2,Bio,Cells,Intensive Review')
+    assert generate_study_schedule_csv('Bio', 4, {'Cells': 0.7}).splitlines()[1].startswith('Session 1,Bio,Cells')
@@ -0,0 +1,163 @@
+import fcntl
+import os
+import random
+import sys
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import numpy as np
+
+from services.document_store import DocumentStore
+from services import search_index
+from services.search_index import SearchIndex, Segment, decode_varints, encode_varints, snippet
+
+NOTES = {
+    'photo': "Photosynthesis converts light energy into chemical energy. Chlorophyll absorbs red and blue light.",
+    'resp': "Cellular respiration releases energy stored in glucose. It happens in the mitochondria.",
+    'mitosis': "Mitosis divides one cell into two identical cells. Chromosomes line up at the metaphase plate.",
+}
+
+
+def make_index(tmp_path, **kwargs):
+    kwargs.setdefault('background', False)
+    return SearchIndex(str(tmp_path / 'db.sqlite'), index_dir=str(tmp_path / 'search'), **kwargs)
+
+
+def test_varints_round_trip():
+    values = np.array([0, 1, 127, 128, 16383, 16384, 2 ** 35, 2 ** 64 - 1], dtype=np.uint64)
+    encoded = encode_varints(values)
+    assert len(encoded) == 1 + 1 + 1 + 2 + 2 + 3 + 6 + 10
+    assert (decode_varints(encoded) == values).all()
+
+
+def test_search_ranks_and_snippets_stored_notes(tmp_path):
+    index = make_index(tmp_path)
+    documents = DocumentStore(str(tmp_path / 'db.sqlite'), blob_dir=str(tmp_path / 'blobs'))
+    ids = {}
+    for name, text in NOTES.items():
+        ids[name] = documents.put(text, 'Bio')
+        assert index.add_text('u1', 'Bio', ids[name], text) == 1
+    assert index.add_text('u1', 'Bio', ids['photo'], NOTES['photo']) == 0
+
+    results = index.search('u1', 'light energy', documents=documents)
+    assert [r['document_id'] for r in results] == [ids['photo'], ids['resp']]
+    assert results[0]['snippet'].startswith('Photosynthesis converts light energy')
+    assert results[1]['snippet'] == NOTES['resp']
+    assert index.search('u1', 'the and of') == []
+    assert index.search('u2', 'light') == [] and index.search('u1', 'light', subject='Chem') == []
+
+
+def test_merges_keep_results_identical(tmp_path):
+    merged = make_index(tmp_path / 'a', merge_factor=3)
+    flat = make_index(tmp_path / 'b', merge_factor=1000)
+    rng = random.Random(3)
+    words = [f'term{i}' for i in range(200)]
+    for i in range(20):
+        doc = (f'{i:064x}', rng.choices(words, k=rng.randint(3, 40)))
+        merged.add('u1', 'Bio', [doc])
+        flat.add('u1', 'Bio', [doc])
+    assert merged.stats('u1', 'Bio')['segments'] < 6 and flat.stats('u1', 'Bio')['segments'] == 20
+    assert merged.stats('u1', 'Bio')['tokens'] == flat.stats('u1', 'Bio')['tokens']
+    for query in ('term1 term2', 'term199', 'term7 term70 term150'):
+        assert merged.search('u1', query) == flat.search('u1', query)
+    assert merged.merge('u1', 'Bio', force=True) == 1
+    assert len(os.listdir(merged.partition_dir('u1', 'Bio'))) == 1
+    assert merged.search('u1', 'term1 term2') == flat.search('u1', 'term1 term2')
+
+
+def test_background_merge_and_segment_layout(tmp_path):
+    index = make_index(tmp_path, merge_factor=2, background=True)
+    for name, text in NOTES.items():
+        index.add_text('u1', 'Bio', name, text)
+    deadline = time.time() + 5
+    while index.stats('u1', 'Bio')['segments'] > 2 and time.time() < deadline:
+        time.sleep(0.01)
+    assert index.stats('u1', 'Bio') == {'segments': 2, 'documents': 3, 'tokens': 28}
+    [name] = [r['name'] for r in index._segment_rows('u1', 'Bio') if r['docs'] == 2]
+    segment = Segment(os.path.join(index.partition_dir('u1', 'Bio'), name))
+    assert isinstance(segment.postings, np.memmap) and segment.find('energy') >= 0 and segment.find('zzz') == -1
+
+
+class RecordingPool:
+    def __init__(self):
+        self.calls = []
+
+    def run(self, fn, *args, timeout=None):
+        self.calls.append((fn.__name__,) + args)
+
+
+def test_merges_go_to_the_pool_one_process_at_a_time(tmp_path):
+    pool = RecordingPool()
+    index = make_index(tmp_path, merge_factor=2, background=True, nlp=pool)
+    for name, text in NOTES.items():
+        index.add_text('u1', 'Bio', name, text)
+    deadline = time.time() + 5
+    while not pool.calls and time.time() < deadline:
+        time.sleep(0.01)
+    assert pool.calls[0] == ('merge_search', 'u1', 'Bio')
+    assert index.stats('u1', 'Bio')['segments'] == 3  # nothing merged in this (web) process
+
+    with open(index.partition_dir('u1', 'Bio') + '.lock', 'w') as held:
+        fcntl.flock(held, fcntl.LOCK_EX)
+        assert index.merge('u1', 'Bio') == 0
+    assert index.merge('u1', 'Bio') == 1 and index.stats('u1', 'Bio')['segments'] == 2
+
+
+def test_streamed_merge_matches_a_segment_written_at_once(tmp_path):
+    rng = random.Random(5)
+    words = [f'term{i}' for i in range(50)]
+    docs = [(f'{i:064x}', rng.choices(words, k=rng.randint(1, 30))) for i in range(12)]
+    index = make_index(tmp_path / 'a', merge_factor=1000)
+    for doc in docs:
+        index.add('u1', 'Bio', [doc])
+    index.merge('u1', 'Bio', force=True)
+    whole = make_index(tmp_path / 'b')
+    whole.add('u1', 'Bio', docs)
+    [merged], [written] = (i._open_partition('u1', 'Bio', i._segment_rows('u1', 'Bio')) for i in (index, whole))
+    for array in ('doc_ids', 'lengths', 'terms', 'term_offsets', 'df', 'postings', 'offsets'):
+        assert (np.asarray(getattr(merged, array)) == np.asarray(getattr(written, array))).all(), array
+
+
+def test_evicted_documents_leave_results_and_segments(tmp_path, monkeypatch):
+    monkeypatch.setattr(search_index, 'PURGE_SHARE', 2)  # keep the tombstones until the forced merge
+    index = make_index(tmp_path, merge_factor=4)
+    documents = DocumentStore(str(tmp_path / 'db.sqlite'), blob_dir=str(tmp_path / 'blobs'),
+                              on_evict=index.forget)
+    ids = []
+    for i in range(10):
+        text = f'Enzyme number {i} catalyses reaction {i}. ' + 'Enzymes lower activation energy. ' * (10 - i)
+        ids.append(documents.put(text, 'Bio'))
+        index.add_text('u1', 'Bio', ids[-1], text)
+    # The best matches (most mentions) are the oldest, so they are evicted first.
+    assert [r['document_id'] for r in index.search('u1', 'enzymes', limit=3)] == ids[:3]
+    documents.gc(max_bytes=documents.usage()['document_bytes'] // 2)
+    live = [d for d in ids if documents.get_text(d) is not None]
+    assert 0 < len(live) < 10 and not index.has_document('u1', 'Bio', ids[0])
+
+    results = index.search('u1', 'enzymes', limit=3, documents=documents)
+    assert [r['document_id'] for r in results] == live[:3]
+    assert [r['document_id'] for r in index.search('u1', 'enzymes', limit=3)] == live[:3]
+    assert {r['document_id'] for r in index.search('u1', 'enzymes', limit=10)} == set(live)
+
+    # Merging drops the tombstoned postings, and terms only they used.
+    assert index._tombstones('u1', 'Bio')
+    index.merge('u1', 'Bio', force=True)
+    assert index._tombstones('u1', 'Bio') == {} and index.stats('u1', 'Bio')['documents'] == len(live)
+    assert [r['document_id'] for r in index.search('u1', 'enzymes', limit=3)] == live[:3]
+    segment = index._open_partition('u1', 'Bio', index._segment_rows('u1', 'Bio'))[0]
+    assert segment.find('0') == -1 and len(segment) == len(live)
+
+    # Without the override a segment that lost that many documents is rewritten straight away.
+    monkeypatch.setattr(search_index, 'PURGE_SHARE', 0.2)
+    index.forget(live[:2])
+    assert index._tombstones('u1', 'Bio') == {} and index.stats('u1', 'Bio')['documents'] == len(live) - 2
+
+    # An evicted document can come back.
+    text = 'Enzyme number 0 catalyses reaction 0. ' + 'Enzymes lower activation energy. ' * 10
+    assert index.add_text('u1', 'Bio', ids[0], text) == 1
+    assert index.search('u1', 'enzymes', limit=1)[0]['document_id'] == ids[0]
+
+
+def test_snippet_picks_the_best_passage():
+    text = "Intro sentence. Enzymes lower activation energy. Unrelated closing remark about ribosomes."
+    assert snippet(text, ['enzymes', 'energy'], max_chars=60) == 'Enzymes lower activation energy. Unrelated closing remark...'
+    assert snippet(text, ['ribosomes']) == 'Unrelated closing remark about ribosomes.'
@@ -0,0 +1,36 @@
+import os
+import sys
+import zipfile
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from models import nlp_resources
+from import_report import parse_importtime
+
+
+def test_stop_words_fall_back_to_bundled_list(monkeypatch, tmp_path):
+    monkeypatch.setattr(nlp_resources, 'search_paths', lambda: [str(tmp_path)])
+    assert nlp_resources.missing_resources() == ['stopwords']
+    words = nlp_resources.load_stop_words()
+    assert 'the' in words and 'photosynthesis' not in words
+
+
+def test_stop_words_read_from_nltk_zip_without_nltk(monkeypatch, tmp_path):
+    os.makedirs(tmp_path / 'corpora')
+    with zipfile.ZipFile(tmp_path / 'corpora' / 'stopwords.zip', 'w') as zf:
+        zf.writestr('stopwords/english', 'the\nand\n')
+    monkeypatch.setenv('NLTK_DATA', str(tmp_path))
+    monkeypatch.setattr(nlp_resources, 'NLTK_DATA_DIR', str(tmp_path / 'vendored'))
+    assert nlp_resources.missing_resources() == []
+    assert nlp_resources.load_stop_words() == frozenset({'the', 'and'})
+
+
+def test_importtime_output_is_summarised_per_package():
+    lines = [
+        'import time: self [us] | cumulative | imported package',
+        'import time:       100 |        100 |     numpy.core',
+        'import time:        50 |        150 |   numpy',
+        'import time:        20 |        170 | app',
+        'BOOT_TIMINGS [1, 2]',
+    ]
+    per_package, top_level = parse_importtime(lines)
+    assert per_package == {'numpy': 150, 'app': 20}
+    assert top_level == [('app', 170)]
@@ -0,0 +1,43 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import numpy as np
+from scipy.sparse import csr_matrix
+from models.document_analysis import analyze_document
+from models.summarization_engine import lexrank, select_sentences, summary_length
+from models.summarizer_model import summarize_text
+
+TEXT = ("Photosynthesis converts light energy into chemical energy in plants. "
+        "Photosynthesis converts light energy into chemical energy in green plants. "
+        "Chlorophyll in the chloroplast absorbs the light energy used by plants. "
+        "The Calvin cycle uses chemical energy to fix carbon dioxide into sugar. "
+        "Many students enjoy football on weekends.")
+
+
+def test_lexrank_prefers_central_nodes():
+    # Node 0 is linked to everyone, the others only to node 0.
+    S = csr_matrix(np.array([[0, 1, 1, 1], [1, 0, 0, 0], [1, 0, 0, 0], [1, 0, 0, 0]], dtype=float))
+    p = lexrank(S)
+    assert abs(p.sum() - 1) < 1e-6
+    assert p[0] > p[1] and np.allclose(p[1:], p[1])
+
+
+def test_mmr_avoids_near_duplicate_sentences():
+    picks = select_sentences(analyze_document(TEXT), 2)
+    assert picks != [0, 1]
+    assert 4 not in picks
+
+
+def test_chunked_mode_returns_requested_length():
+    text = ' '.join(f"Topic {i % 7} covers enzyme kinetics number {i} in detail." for i in range(700))
+    analysis = analyze_document(text)
+    picks = select_sentences(analysis, 5, chunk_size=100)
+    assert len(picks) == 5 and picks == sorted(picks)
+    assert len(select_sentences(analysis, 140, chunk_size=100)) == 140
+
+
+def test_ratio_controls_summary_length():
+    assert summary_length(100, 3, ratio=0.1) == 10
+    assert summary_length(100, 3) == 3
+    assert summarize_text(TEXT, ratio=0.4).count('.') == 2
+    assert summarize_text("One sentence only.", 3) == "One sentence only."
@@ -0,0 +1,74 @@
+import os
+import random
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+
+from models import topic_model
+from models.topic_model import assign_topics, fit_topic_model, topic_labels, update_topic_model
+
+TOPICS = {
+    'Biology': 'cell mitochondria photosynthesis chlorophyll enzyme protein membrane nucleus gene ribosome'.split(),
+    'Physics': 'force mass acceleration velocity momentum gravity friction newton inertia torque'.split(),
+    'History': 'empire treaty revolution monarchy parliament colony army battle dynasty senate'.split(),
+    'Chemistry': 'atom molecule covalent acid alkali reaction electron ion solution compound'.split(),
+}
+MUSIC = 'melody harmony rhythm tempo chord octave symphony orchestra sonata scale'.split()
+
+
+def notes(per_topic, seed=0):
+    rng = random.Random(seed)
+    return [' '.join(rng.choice(words) for _ in range(15)) + '.' for words in TOPICS.values()
+            for _ in range(per_topic)]
+
+
+@pytest.fixture
+def paths(tmp_path, monkeypatch):
+    for name, file in (('KMEANS_PATH', 'kmeans.pkl'), ('TFIDF_PATH', 'tfidf.pkl'), ('STATE_PATH', 'state.json')):
+        monkeypatch.setattr(topic_model, name, str(tmp_path / file))
+    monkeypatch.setattr(topic_model, 'training_texts', lambda: [])
+
+
+def test_questions_are_labelled_in_one_batch():
+    model = fit_topic_model(notes(30), n_topics=4)
+    labels = topic_labels(*model)
+    assert len(set(labels)) == 4
+    for label in labels:
+        words = [w.lower() for w in label.split(' / ')]
+        assert any(set(words) <= set(vocabulary) for vocabulary in TOPICS.values())
+
+    questions = ['Why does friction reduce the velocity of a mass?', 'Which treaty ended the battle for the colony?',
+                 'How are covalent bonds formed between atoms?', 'Something unrelated entirely.']
+    topics = assign_topics(questions, model=model)
+    assert topics[3] == 'General'
+    assert len(set(topics[:3])) == 3 and 'General' not in topics[:3]
+    assert assign_topics(['Gravity and inertia explain torque.'], model=model) == [topics[0]]
+    assert assign_topics([]) == []
+
+    # A vectorizer from another fit (one file of a rebuild replaced, not yet the other) labels nothing.
+    other = fit_topic_model(notes(30, seed=5), n_topics=4)
+    assert assign_topics(questions, model=(model[0], other[1])) == ['General'] * 4
+
+
+def test_trainer_folds_new_notes_in_and_rebuilds_when_grown(paths):
+    state = update_topic_model(notes(25), '2024-01-01', n_topics=4)
+    assert state['chunks'] == state['rebuilt_chunks'] == 100 and len(state['topics']) == 4
+    names = state['topics']
+
+    # A few new notes update the clusters in place, keeping vocabulary and topic count.
+    state = update_topic_model(notes(5, seed=1), '2024-02-01')
+    assert state['chunks'] == 120 and state['rebuilt_chunks'] == 100
+    assert topic_model.read_state()['trained_through'] == '2024-02-01'
+    assert state['topics'] == names
+
+    # Doubling the corpus refits everything on the full corpus; the same topics keep their names.
+    corpus = notes(30) + notes(30, seed=2)
+    state = update_topic_model(notes(30, seed=2), '2024-03-01', corpus=lambda: corpus, n_topics=4)
+    assert state['chunks'] == state['rebuilt_chunks'] == 240
+    assert sorted(state['topics']) == sorted(names)
+
+    # A rebuild that finds a new subject names only that cluster afresh.
+    corpus += [' '.join(random.Random(i).choice(MUSIC) for _ in range(15)) for i in range(60)]
+    state = update_topic_model([], '2024-04-01', rebuild=True, corpus=lambda: corpus, n_topics=5)
+    assert set(names) < set(state['topics']) and len(set(state['topics'])) == 5
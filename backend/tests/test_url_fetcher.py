@@ -0,0 +1,102 @@
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+
+from services.url_fetcher import FetchError, HttpCache, UrlFetcher, main_text, truncate
+
+ARTICLE = """<html><head><title>Cells</title><script>var x = 1;</script></head><body>
+<nav><a href="/">Home</a> <a href="/about">About</a> <a href="/contact">Contact us today please</a></nav>
+<article><h1>Cell division</h1>
+<p>Mitosis is the process by which one cell divides into two identical daughter cells.</p>
+<p>During prophase the chromosomes condense and the nuclear envelope breaks down &amp; disappears.</p>
+<ul><li><a href="/a">Related article one</a></li><li><a href="/b">Related article two</a></li></ul>
+<p>Cytokinesis finally splits the cytoplasm so that each daughter cell has its own nucleus.</p>
+</article>
+<footer>Copyright 2024 Example Science Site, all rights reserved worldwide.</footer>
+</body></html>"""
+
+
+class Handler(BaseHTTPRequestHandler):
+    hits = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        Handler.hits.append((self.path, self.headers.get('If-None-Match')))
+        if self.path == '/article':
+            if self.headers.get('If-None-Match') == '"v1"':
+                self.send_response(304)
+                self.end_headers()
+                return
+            body = ARTICLE.encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('ETag', '"v1"')
+        elif self.path == '/fresh':
+            body = b'Fresh plain text notes about osmosis.'
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain')
+            self.send_header('Cache-Control', 'max-age=60')
+        elif self.path == '/big':
+            body = b'x' * 5000
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain')
+        else:
+            body = b'missing'
+            self.send_response(404)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    Handler.hits = []
+    yield f'http://127.0.0.1:{httpd.server_address[1]}'
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_main_text_drops_boilerplate():
+    text = main_text(ARTICLE)
+    assert text.splitlines()[0] == 'Cell division'
+    assert 'Mitosis is the process' in text and 'breaks down & disappears' in text
+    for noise in ('var x', 'Contact us', 'Related article', 'Copyright'):
+        assert noise not in text
+
+
+def test_truncate_at_word_boundary():
+    assert truncate('alpha beta gamma', 12) == 'alpha beta'
+    assert truncate('alpha', 100) == 'alpha'
+
+
+def test_conditional_get_reuses_cached_body(server, tmp_path):
+    fetcher = UrlFetcher(HttpCache(str(tmp_path)))
+    first = fetcher.fetch_text(server + '/article')
+    second = UrlFetcher(HttpCache(str(tmp_path))).fetch(server + '/article')
+    assert second.from_cache and second.body == ARTICLE.encode()
+    assert Handler.hits == [('/article', None), ('/article', '"v1"')]
+    assert 'Cytokinesis' in first
+
+
+def test_fresh_entries_skip_the_network(server, tmp_path):
+    fetcher = UrlFetcher(HttpCache(str(tmp_path)))
+    assert fetcher.fetch_text(server + '/fresh') == 'Fresh plain text notes about osmosis.'
+    assert fetcher.fetch(server + '/fresh').from_cache
+    assert len(Handler.hits) == 1 and fetcher.stats['fresh_hits'] == 1
+
+
+def test_size_cap_and_errors(server, tmp_path):
+    fetcher = UrlFetcher(HttpCache(str(tmp_path)), max_bytes=1000)
+    with pytest.raises(FetchError):
+        fetcher.fetch(server + '/big')
+    with pytest.raises(FetchError):
+        fetcher.fetch(server + '/missing')
+    with pytest.raises(FetchError):
+        fetcher.fetch('file:///etc/passwd')
@@ -0,0 +1,47 @@
+"""Fold newly stored notes into the topic model that labels generated questions.
+
+Notes stored since the last run are cut into chunks of whole sentences and
+added to the existing clusters with ``MiniBatchKMeans.partial_fit``.  Once
+the corpus has doubled since the vocabulary was fitted (or with
+``--rebuild``), vocabulary and clusters are refitted on every stored note.
+Workers pick up the new model files without a restart.
+
+    python train_topics.py
+    python train_topics.py --rebuild [--topics 12]
+"""
+import argparse
+import json
+import sys
+
+from models.topic_model import read_state, update_topic_model
+from services.document_store import get_document_store
+from services.related_notes import chunk_spans
+
+CHUNK_WORDS = 60
+
+
+def note_chunks(texts):
+    for text in texts:
+        for start, end in chunk_spans(text, words=CHUNK_WORDS):
+            yield text[start:end].strip()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rebuild', action='store_true', help='refit vocabulary and clusters on every note')
+    parser.add_argument('--topics', type=int, default=None, help='number of topics for a rebuild')
+    args = parser.parse_args(argv)
+
+    documents = get_document_store()
+    since = read_state()['trained_through']
+    new = list(documents.iter_texts(since))
+    trained_through = new[-1][0] if new else since
+    state = update_topic_model(note_chunks(text for _, text in new), trained_through, rebuild=args.rebuild,
+                               corpus=lambda: note_chunks(text for _, text in documents.iter_texts()),
+                               n_topics=args.topics)
+    print(json.dumps({'documents': len(new), 'chunks': state['chunks'], 'topics': state['topics']}))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())